@@ -0,0 +1,55 @@
+"""Throughput of sequential ``LLMClient.ask`` vs. ``LLMPool.ask_many``.
+
+Usage::
+
+    python benchmarks/bench_bulk_ask.py --model models/finetuned-mistral.gguf -n 20 --pool 4
+
+The prompt cache is bypassed by making every question unique, so the
+numbers measure generation only.
+"""
+
+from pathlib import Path
+import argparse
+import sys
+import time
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+from ask_llm import LLMClient, LLMPool  # noqa: E402
+
+
+def _prompts(n: int) -> list[str]:
+    stamp = int(time.time())
+    return [f"Kod {100 + i} ne demek? ({stamp}-{i})" for i in range(n)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--model", required=True, help="Path to GGUF model")
+    parser.add_argument("-n", type=int, default=20, help="Number of prompts")
+    parser.add_argument("--pool", type=int, default=4, help="Number of contexts")
+    parser.add_argument("--max-tokens", type=int, default=64)
+    args = parser.parse_args()
+
+    client = LLMClient(args.model)
+    start = time.perf_counter()
+    for prompt in _prompts(args.n):
+        client.ask(prompt, max_tokens=args.max_tokens)
+    sequential = time.perf_counter() - start
+    del client
+
+    pool = LLMPool(args.model, size=args.pool)
+    start = time.perf_counter()
+    first = None
+    for _ in pool.ask_many(_prompts(args.n), max_tokens=args.max_tokens):
+        first = first or time.perf_counter() - start
+    pooled = time.perf_counter() - start
+    pool.close()
+
+    print(f"sequential: {sequential:.1f}s  {args.n / sequential:.2f} prompt/s")
+    print(f"pool x{args.pool}:   {pooled:.1f}s  {args.n / pooled:.2f} prompt/s  (first result {first:.1f}s)")
+    print(f"speed-up:   {sequential / pooled:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""Per-call ``Template`` + ``pdfkit`` vs. the shared ``pdf_render`` service.
+
+Usage::
+
+    python benchmarks/bench_pdf_render.py -n 200 --workers 4
+
+Template rendering is always measured; the PDF part needs wkhtmltopdf and
+is skipped with a note when it is not installed.
+"""
+
+from pathlib import Path
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+import jinja2  # noqa: E402
+import pdfkit  # noqa: E402
+
+import pdf_render  # noqa: E402
+from proforma_engine import QUOTE_TEMPLATE  # noqa: E402
+
+
+def _quotes(n: int) -> list[dict]:
+    return [
+        {
+            "kalemler": [{"urun": f"kamera{j}", "adet": i % 5 + 1, "tutar": 100.0 * j} for j in range(20)],
+            "toplam": 19000.0,
+        }
+        for i in range(n)
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("-n", type=int, default=200, help="Number of quotes")
+    parser.add_argument("--workers", type=int, default=pdf_render.PDF_WORKERS, help="wkhtmltopdf processes")
+    args = parser.parse_args()
+    quotes = _quotes(args.n)
+
+    start = time.perf_counter()
+    for quote in quotes:
+        jinja2.Template(QUOTE_TEMPLATE).render(**quote)
+    per_call = time.perf_counter() - start
+    start = time.perf_counter()
+    for quote in quotes:
+        pdf_render.render("proforma", **quote)
+    cached = time.perf_counter() - start
+    print(f"html per-call: {per_call * 1000:.1f} ms  registry: {cached * 1000:.1f} ms  ({per_call / cached:.1f}x)")
+
+    if not shutil.which("wkhtmltopdf"):
+        print("wkhtmltopdf not found, PDF benchmark skipped")
+        return
+    with tempfile.TemporaryDirectory() as tmp:
+        start = time.perf_counter()
+        for i, quote in enumerate(quotes):
+            html = jinja2.Template(QUOTE_TEMPLATE).render(**quote)
+            pdfkit.from_string(html, os.path.join(tmp, f"seq{i}.pdf"))
+        sequential = time.perf_counter() - start
+
+        pdf_render.PDF_WORKERS = args.workers
+        jobs = [("proforma", os.path.join(tmp, f"pool{i}.pdf"), q) for i, q in enumerate(quotes)]
+        start = time.perf_counter()
+        errors = [error for _, error in pdf_render.render_pdfs(jobs) if error]
+        pooled = time.perf_counter() - start
+
+    print(f"pdf per-call:  {sequential:.1f}s  {args.n / sequential:.1f} pdf/s")
+    print(f"pdf pool x{args.workers}:  {pooled:.1f}s  {args.n / pooled:.1f} pdf/s  ({len(errors)} failed)")
+    print(f"speed-up:      {sequential / pooled:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
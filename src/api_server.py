@@ -1,18 +1,26 @@
 """Simple FastAPI server exposing the LLM as an HTTP endpoint."""
 
-from fastapi import FastAPI, HTTPException, Header, UploadFile, File, WebSocket
+from fastapi import FastAPI, HTTPException, Header, UploadFile, File, WebSocket, WebSocketDisconnect
+from fastapi.responses import JSONResponse, StreamingResponse
 from pydantic import BaseModel
 import os
 import asyncio
+import json
+import threading
+import time
 from fastapi.middleware import Middleware
 from slowapi import Limiter
 from slowapi.util import get_remote_address
 from slowapi.middleware import SlowAPIMiddleware
 from prometheus_fastapi_instrumentator import Instrumentator
-from prometheus_client import Counter, Histogram
+from prometheus_client import Counter, Gauge, Histogram
 
-from ask_llm import LLMClient
+from ask_llm import LLMError, LLMPool, answer_cache, answer_version, retrieval_prompt
+from fault_matcher import fault_answer, get_matcher
+from text_normalize import cache_key
+from inference_queue import BULK, INTERACTIVE, QueueFullError
 from config import load_config
+import doc_search
 from fastapi.openapi.utils import get_openapi
 from jose import JWTError, jwt
 
@@ -28,15 +36,29 @@ Instrumentator().instrument(app).expose(app)
 # Prometheus custom counter and histogram
 REQUEST_COUNT = Counter("api_requests", "Total API requests", ["endpoint"])
 LLM_RESPONSE_TIME = Histogram("llm_response_seconds", "LLM response time")
+LLM_QUEUE_DEPTH = Gauge("llm_queue_depth", "Prompts waiting for a model context")
+LLM_QUEUE_WAIT = Histogram("llm_queue_wait_seconds", "Time prompts wait for a model context")
+LLM_FIRST_TOKEN_TIME = Histogram("llm_first_token_seconds", "Time to the first streamed token")
+LLM_REJECTED = Counter("llm_rejected", "Prompts rejected because the queue was full")
+PROMPT_CACHE_EVENTS = Counter("prompt_cache_events", "Answer cache hits, misses and evictions", ["tier", "event"])
+PROMPT_CACHE_ENTRIES = Gauge("prompt_cache_memory_entries", "Answers held in the in-memory cache")
+PROMPT_CACHE_BYTES = Gauge("prompt_cache_memory_bytes", "Size of the answers held in the in-memory cache")
 
 # Default model path can be overridden when starting the server
 MODEL_PATH = "models/finetuned-mistral.gguf"
-llm_client: LLMClient | None = None
+llm_client: LLMPool | None = None
 API_TOKEN = os.environ.get("API_TOKEN")
 JWT_SECRET = os.getenv("JWT_SECRET")
 if not JWT_SECRET:
     raise RuntimeError("JWT_SECRET environment variable not set")
 CFG = load_config()
+# Poll docs/ for changed manuals every N seconds (0 disables the watcher)
+DOCS_WATCH_INTERVAL = float(os.getenv("DOCS_WATCH_INTERVAL", "0"))
+# Seconds the answer version (model file + docs index) is reused before it
+# is recomputed off the event loop
+VERSION_CHECK_INTERVAL = 1.0
+_version: tuple[float, str] | None = None
+_docs_watch_stop = threading.Event()
 
 
 def verify_token(token: str) -> bool:
@@ -68,8 +90,115 @@ class Query(BaseModel):
 
 @app.on_event("startup")
 def _load_model() -> None:
-    global llm_client
-    llm_client = LLMClient(MODEL_PATH)
+    global llm_client, _version
+    llm_client = LLMPool(MODEL_PATH, on_wait=LLM_QUEUE_WAIT.observe)
+    # Load the document index and fault codes now rather than on the event
+    # loop later
+    _version = (time.monotonic(), answer_version(MODEL_PATH))
+    get_matcher()
+    LLM_QUEUE_DEPTH.set_function(llm_client.scheduler.depth)
+    answer_cache.on_event = lambda tier, event, count: PROMPT_CACHE_EVENTS.labels(tier=tier, event=event).inc(count)
+    PROMPT_CACHE_ENTRIES.set_function(lambda: len(answer_cache.memory))
+    PROMPT_CACHE_BYTES.set_function(lambda: answer_cache.memory.size_bytes)
+    if DOCS_WATCH_INTERVAL > 0:
+        threading.Thread(
+            target=doc_search.watch_docs,
+            args=(DOCS_WATCH_INTERVAL, _docs_watch_stop),
+            daemon=True,
+        ).start()
+
+
+@app.on_event("shutdown")
+def _stop_docs_watch() -> None:
+    _docs_watch_stop.set()
+    if llm_client is not None:
+        llm_client.close()
+
+
+@app.exception_handler(QueueFullError)
+async def _queue_full(request, exc: QueueFullError) -> JSONResponse:
+    LLM_REJECTED.inc()
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "Server busy"},
+        headers={"Retry-After": str(exc.retry_after)},
+    )
+
+
+# Requests go through three stages: cache lookup, retrieval and generation.
+# Known fault codes and memory-tier cache hits are answered on the event loop; SQLite lookups and
+# document retrieval run in the default thread pool; only generation
+# occupies a model context of the inference scheduler.
+
+
+async def _answer_version() -> str:
+    """``answer_version`` of the served model, recomputed in a worker thread
+    (it stats the GGUF and may reopen the docs index) at most every
+    ``VERSION_CHECK_INTERVAL`` seconds."""
+    global _version
+    now = time.monotonic()
+    if _version is None or now - _version[0] >= VERSION_CHECK_INTERVAL:
+        _version = (now, await asyncio.to_thread(answer_version, MODEL_PATH))
+    return _version[1]
+
+
+async def _cached(prompt: str) -> tuple[str | None, str, str]:
+    """Cache stage: return the cached answer (or ``None``), key and version.
+
+    A known fault code is answered from ``fault_knowledge.json`` directly.
+    """
+    key, version = cache_key(prompt), await _answer_version()
+    cached = fault_answer(prompt) or answer_cache.peek(key, version)
+    if cached is None:
+        cached = await asyncio.to_thread(answer_cache.get, key, version)
+    return cached, key, version
+
+
+async def _answer(prompt: str) -> str:
+    """Serve ``prompt`` from the cache or queue it as an interactive request."""
+    assert llm_client is not None
+    cached, key, version = await _cached(prompt)
+    if cached:
+        return cached
+    full_prompt = await asyncio.to_thread(retrieval_prompt, prompt)
+    with LLM_RESPONSE_TIME.time():
+        answer = await asyncio.wrap_future(llm_client.submit_generate(full_prompt, priority=INTERACTIVE))
+    answer_cache.set(key, answer, version, question=prompt)
+    return answer
+
+
+async def _stream_answer(prompt: str):
+    """Yield pieces of the answer to ``prompt`` as they are generated."""
+    assert llm_client is not None
+    cached, key, version = await _cached(prompt)
+    if cached:
+        yield cached
+        return
+    full_prompt = await asyncio.to_thread(retrieval_prompt, prompt)
+    loop = asyncio.get_running_loop()
+    pieces: asyncio.Queue = asyncio.Queue()
+    stop = threading.Event()
+
+    def on_token(piece: str) -> bool:
+        if stop.is_set():
+            return False
+        loop.call_soon_threadsafe(pieces.put_nowait, piece)
+        return True
+
+    started = loop.time()
+    done = asyncio.wrap_future(llm_client.submit_generate_stream(full_prompt, on_token, priority=INTERACTIVE))
+    done.add_done_callback(lambda _: pieces.put_nowait(None))
+    first = True
+    try:
+        while (piece := await pieces.get()) is not None:
+            if first:
+                LLM_FIRST_TOKEN_TIME.observe(loop.time() - started)
+                first = False
+            yield piece
+        answer_cache.set(key, (await done).strip(), version, question=prompt)
+    finally:
+        stop.set()
+        done.cancel()
 
 
 @app.post("/ask")
@@ -81,14 +210,96 @@ async def ask(query: Query, authorization: str | None = Header(default=None), x_
     token = token_parts[1] if len(token_parts) == 2 else ""
     if authorization and not verify_token(token):
         raise HTTPException(status_code=401, detail="Invalid token")
-    assert llm_client is not None
+    return {"answer": await _answer(query.prompt)}
+
+
+@app.post("/ask/stream")
+async def ask_stream(query: Query, authorization: str | None = Header(default=None), x_api_key: str | None = Header(default=None)) -> StreamingResponse:
+    """Stream the answer as server-sent events.
+
+    Every piece is sent as ``data: {"token": ...}``; the last event is
+    ``event: end`` with the full answer (or ``event: error``).
+    """
+    REQUEST_COUNT.labels(endpoint="ask_stream").inc()
+    if API_TOKEN and x_api_key != API_TOKEN and authorization != f"Bearer {API_TOKEN}":
+        raise HTTPException(status_code=401, detail="Unauthorized")
+    token_parts = authorization.split() if authorization else []
+    token = token_parts[1] if len(token_parts) == 2 else ""
+    if authorization and not verify_token(token):
+        raise HTTPException(status_code=401, detail="Invalid token")
+    pieces = _stream_answer(query.prompt)
+    # Surface a full queue as 503 before the response starts
+    try:
+        first = await pieces.__anext__()
+    except StopAsyncIteration:
+        first = ""
+
+    async def _events():
+        answer = [first]
+        try:
+            yield _sse({"token": first})
+            async for piece in pieces:
+                answer.append(piece)
+                yield _sse({"token": piece})
+        except LLMError as exc:
+            yield _sse({"detail": str(exc)}, event="error")
+            return
+        yield _sse({"answer": "".join(answer).strip()}, event="end")
+
+    return StreamingResponse(_events(), media_type="text/event-stream")
+
+
+def _sse(data: dict, event: str | None = None) -> str:
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+async def _timed(slot: asyncio.Future, prompt: str, key: str, version: str) -> str:
+    future = await slot
     with LLM_RESPONSE_TIME.time():
-        answer = await asyncio.to_thread(llm_client.ask, query.prompt)
-    return {"answer": answer}
+        answer = await asyncio.wrap_future(future)
+    answer_cache.set(key, answer, version, question=prompt)
+    return answer
+
+
+async def _feed(full_prompts: list[str], slots: list[asyncio.Future], start: int, window: int) -> None:
+    """Queue ``full_prompts[start:]`` one by one, each once the job
+    ``window`` places before it has finished."""
+    for i in range(start, len(full_prompts)):
+        if i >= window:
+            ahead = await slots[i - window]
+            await asyncio.wait([asyncio.wrap_future(ahead)])
+        while True:
+            try:
+                slots[i].set_result(llm_client.submit_generate(full_prompts[i], priority=BULK))
+                break
+            except QueueFullError as exc:
+                # Interactive traffic or other batches hold the queue
+                await asyncio.sleep(min(exc.retry_after, 1))
+
+
+def _stop_feeding(feeder: asyncio.Future | None, slots: list[asyncio.Future]) -> None:
+    """Cancel the feeder and every queued job of an abandoned batch."""
+    if feeder is not None:
+        feeder.cancel()
+    for slot in slots:
+        if slot.done() and not slot.cancelled():
+            slot.result().cancel()
+        else:
+            slot.cancel()
 
 
 @app.post("/bulk_ask")
-async def bulk_ask(queries: list[Query], authorization: str | None = Header(default=None), x_api_key: str | None = Header(default=None)) -> list[str]:
+async def bulk_ask(queries: list[Query], stream: bool = False, authorization: str | None = Header(default=None), x_api_key: str | None = Header(default=None)):
+    """Answer all queries concurrently on the context pool.
+
+    Uncached queries are queued behind interactive requests, at most the
+    queue's bulk capacity at a time; 503 is returned if not even that first
+    window fits.  Returns the
+    answers in request order, or with ``?stream=true`` one
+    ``{"index": i, "answer": ...}`` JSON line per query as soon as it
+    completes.
+    """
     REQUEST_COUNT.labels(endpoint="bulk_ask").inc()
     if API_TOKEN and x_api_key != API_TOKEN and authorization != f"Bearer {API_TOKEN}":
         raise HTTPException(status_code=401, detail="Unauthorized")
@@ -97,11 +308,68 @@ async def bulk_ask(queries: list[Query], authorization: str | None = Header(defa
     if authorization and not verify_token(token):
         raise HTTPException(status_code=401, detail="Invalid token")
     assert llm_client is not None
-    results = []
-    for q in queries:
-        with LLM_RESPONSE_TIME.time():
-            results.append(await asyncio.to_thread(llm_client.ask, q.prompt))
-    return results
+    keys = [cache_key(q.prompt) for q in queries]
+    version = await _answer_version()
+    faults = [fault_answer(q.prompt) for q in queries]
+    lookups = [key for key, fault in zip(keys, faults) if not fault]
+    found = iter(await asyncio.to_thread(answer_cache.get_many, lookups, version))
+    cached = [fault or next(found) for fault in faults]
+    misses = [(q.prompt, key) for q, key, hit in zip(queries, keys, cached) if not hit]
+    full_prompts = await asyncio.to_thread(lambda: [retrieval_prompt(prompt) for prompt, _ in misses])
+    # As many jobs as fit are admitted at once (503 if none do); the rest
+    # follow as our own jobs finish, so a batch larger than the queue runs
+    # with at most ``window`` of its jobs waiting
+    scheduler = llm_client.scheduler
+    window = max(1, scheduler.capacity(BULK))
+    admitted = min(len(full_prompts), window, scheduler.free(BULK))
+    if full_prompts and not admitted:
+        raise QueueFullError(scheduler.retry_after())
+    futures = llm_client.submit_generate_many(full_prompts[:admitted], priority=BULK)
+    loop = asyncio.get_running_loop()
+    slots = [loop.create_future() for _ in full_prompts]
+    for slot, future in zip(slots, futures):
+        slot.set_result(future)
+    feeder = None
+    if admitted < len(full_prompts):
+        feeder = asyncio.ensure_future(_feed(full_prompts, slots, admitted, window))
+    pending = iter(zip(slots, misses))
+    tasks = []
+    for hit in cached:
+        if hit:
+            tasks.append(_done(hit))
+        else:
+            slot, (prompt, key) = next(pending)
+            tasks.append(asyncio.ensure_future(_timed(slot, prompt, key, version)))
+    if not stream:
+        try:
+            return list(await asyncio.gather(*tasks))
+        finally:
+            _stop_feeding(feeder, slots)
+
+    async def _lines():
+        index_of = {task: i for i, task in enumerate(tasks)}
+        pending = set(tasks)
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    try:
+                        line = {"index": index_of[task], "answer": task.result()}
+                    except Exception as exc:
+                        line = {"index": index_of[task], "error": str(exc)}
+                    yield json.dumps(line, ensure_ascii=False) + "\n"
+        finally:
+            for task in pending:
+                task.cancel()
+            _stop_feeding(feeder, slots)
+
+    return StreamingResponse(_lines(), media_type="application/x-ndjson")
+
+
+def _done(result: str) -> asyncio.Future:
+    future = asyncio.get_running_loop().create_future()
+    future.set_result(result)
+    return future
 
 
 @app.post("/transcribe")
@@ -123,10 +391,26 @@ async def speak_text(query: Query) -> None:
 
 @app.websocket("/ws")
 async def websocket_endpoint(websocket: WebSocket):
+    """Answer every text message with ``{"token": ...}`` frames as they are
+    generated, followed by ``{"done": true, "answer": ...}``."""
     await websocket.accept()
     assert llm_client is not None
     while True:
-        data = await websocket.receive_text()
+        try:
+            data = await websocket.receive_text()
+        except WebSocketDisconnect:
+            return
         REQUEST_COUNT.labels(endpoint="ws").inc()
-        response = await asyncio.to_thread(llm_client.ask, data)
-        await websocket.send_text(response)
+        answer = []
+        try:
+            async for piece in _stream_answer(data):
+                answer.append(piece)
+                await websocket.send_json({"token": piece})
+        except QueueFullError as exc:
+            LLM_REJECTED.inc()
+            await websocket.send_json({"error": "busy", "retry_after": exc.retry_after})
+            continue
+        except LLMError as exc:
+            await websocket.send_json({"error": str(exc)})
+            continue
+        await websocket.send_json({"done": True, "answer": "".join(answer).strip()})
@@ -1,77 +1,443 @@
 """Interface to a local Llama.cpp model (e.g. Mistral 7B GGUF)."""
 
 from pathlib import Path
-from typing import Optional
+from typing import Callable, Iterator, Optional
+from concurrent.futures import FIRST_COMPLETED, Future, as_completed, wait
+import hashlib
 import logging
+import pickle
+import time
 
 
 class LLMError(Exception):
     """Custom error for LLM related problems."""
 
 
-from doc_search import search as search_docs
+from doc_search import get_index, search as search_docs
 
 from config import load_config
-from prompt_cache import PromptCache
+from inference_queue import BULK, INTERACTIVE, InferenceScheduler, QueueFullError
+from prompt_cache import NEAR_DUPLICATE, MinHashIndex, TieredCache
+from text_normalize import cache_key
 
 from llama_cpp import Llama
 import os
 
 CFG = load_config()
+ROOT_DIR = Path(__file__).resolve().parent.parent
 DEFAULT_MODEL_PATH = CFG.get("models", {}).get("llm", "models/finetuned-mistral.gguf")
+# Number of ranked document passages given to the model as context
+CONTEXT_PASSAGES = 3
 
-# Prompt cache backed by SQLite
-_PROMPT_CACHE: dict[str, str] = {}
-_cache_db = PromptCache()
+# Number of llama.cpp contexts kept by ``LLMPool``
+POOL_SIZE = int(os.getenv("LLAMA_POOL_SIZE", "2"))
+# "thread": contexts in this process, "process": one worker process each
+POOL_MODE = os.getenv("LLAMA_POOL_MODE", "thread")
+# Prompts allowed to wait for a context before new ones are rejected
+QUEUE_SIZE = int(os.getenv("LLM_QUEUE_SIZE", "64"))
+
+# Few-shot examples opening every prompt.  They come first so that each
+# prompt starts with the same tokens and their KV state can be reused.
+FEW_SHOT_PREFIX = (
+    "Soru: Kod 135 ne demek?\nCevap: Yangin butonundan gelen hatali surekli sinyal.\n\n"
+    "Soru: Kod 227 ne anlama gelir?\nCevap: Alarm paneli ile iletisim kaybi.\n\n"
+)
+# Saved llama.cpp states of the evaluated prefix, one file per model/n_ctx
+STATE_DIR = ROOT_DIR / CFG.get("paths", {}).get("llm_state", "llm_state")
+
+# Answers cached in memory (bounded LRU) and in SQLite, keyed by the
+# normalised prompt and tagged with ``answer_version``
+answer_cache = TieredCache(near=MinHashIndex() if NEAR_DUPLICATE else None)
+_FINGERPRINTS: dict[tuple, str] = {}
+
+
+def model_fingerprint(model_path: str | Path) -> str:
+    """Short hash identifying the content of a GGUF file.
+
+    Only the size and the first and last MiB are hashed, which tells
+    different models and fine-tunes apart without reading gigabytes.  The
+    result is remembered until the file's size or mtime changes.
+    """
+    path = Path(model_path)
+    try:
+        stat = path.stat()
+    except OSError:
+        return path.name
+    key = (str(path), stat.st_size, stat.st_mtime_ns)
+    if key not in _FINGERPRINTS:
+        digest = hashlib.sha1(str(stat.st_size).encode("utf-8"))
+        with open(path, "rb") as fh:
+            digest.update(fh.read(1 << 20))
+            fh.seek(max(0, stat.st_size - (1 << 20)))
+            digest.update(fh.read(1 << 20))
+        _FINGERPRINTS[key] = digest.hexdigest()[:16]
+    return _FINGERPRINTS[key]
+
+
+def answer_version(model_path: str | Path = DEFAULT_MODEL_PATH) -> str:
+    """Tag of cached answers: the model and the document index behind them.
+
+    Swapping the GGUF or changing ``docs/`` changes the tag, so older
+    answers stop being served without wiping the cache.
+    """
+    return f"{model_fingerprint(model_path)}:{get_index().version}"
+
+
+def cached_answer(prompt: str, model_path: str | Path = DEFAULT_MODEL_PATH) -> str | None:
+    """Return a previously generated answer for ``prompt`` if there is one."""
+    return answer_cache.get(cache_key(prompt), answer_version(model_path))
+
+
+def cached_answers(prompts: list[str], model_path: str | Path = DEFAULT_MODEL_PATH) -> list[str | None]:
+    """``cached_answer`` for many prompts with one SQLite lookup."""
+    return answer_cache.get_many([cache_key(p) for p in prompts], answer_version(model_path))
+
+
+def build_prompt(question: str, context: str = "") -> str:
+    """Lay out the prompt: static few-shot prefix, context, then question."""
+    prompt = FEW_SHOT_PREFIX
+    if context:
+        prompt += f"Bilgi: {context}\n\n"
+    return prompt + f"Soru: {question}\nCevap:"
+
+
+def retrieval_prompt(question: str) -> str:
+    """Build the prompt for ``question`` with the best document passages."""
+    context = "\n".join(hit.text for hit in search_docs(question, k=CONTEXT_PASSAGES))
+    return build_prompt(question, context)
 
 
 class LLMClient:
     """A thin wrapper around ``llama_cpp.Llama`` for question answering."""
 
-    def __init__(self, model_path: str = DEFAULT_MODEL_PATH, n_ctx: int = 2048):
+    def __init__(
+        self,
+        model_path: str = DEFAULT_MODEL_PATH,
+        n_ctx: int = 2048,
+        n_threads: int | None = None,
+        prefix_cache: bool = True,
+    ):
         self.model_path = Path(model_path)
         self.n_ctx = n_ctx
-        n_threads = int(os.getenv("LLAMA_THREADS", "4"))
+        n_threads = n_threads or int(os.getenv("LLAMA_THREADS", "4"))
         self._llm = Llama(model_path=str(self.model_path), n_ctx=n_ctx, n_threads=n_threads)
+        self._prefix_tokens: list[int] = []
+        self._prefix_state = None
+        if prefix_cache:
+            self._prime_prefix()
+
+    def _prefix_state_path(self) -> Path:
+        stat = self.model_path.stat()
+        key = f"{self.model_path.name}:{stat.st_size}:{stat.st_mtime_ns}:{self.n_ctx}:{FEW_SHOT_PREFIX}"
+        return STATE_DIR / f"{self.model_path.stem}-{hashlib.sha1(key.encode('utf-8')).hexdigest()[:16]}.state"
+
+    def _load_prefix_state(self, path: Path):
+        try:
+            with open(path, "rb") as fh:
+                state = pickle.load(fh)
+            if state.input_ids[: state.n_tokens].tolist() == self._prefix_tokens:
+                return state
+        except FileNotFoundError:
+            pass
+        except Exception as exc:
+            logging.warning("Ignoring unusable prefix state %s: %s", path, exc)
+        return None
+
+    def _prime_prefix(self) -> None:
+        """Evaluate ``FEW_SHOT_PREFIX`` once and keep its KV state.
+
+        The state is saved under ``STATE_DIR`` so later processes (and the
+        other contexts of a pool) restore it instead of evaluating the prefix
+        again.  Failures only disable the optimisation.
+        """
+        try:
+            self._prefix_tokens = self._llm.tokenize(FEW_SHOT_PREFIX.encode("utf-8"))
+            path = self._prefix_state_path()
+            state = self._load_prefix_state(path)
+            if state is not None:
+                self._llm.load_state(state)
+            else:
+                self._llm.reset()
+                self._llm.eval(self._prefix_tokens)
+                state = self._llm.save_state()
+                path.parent.mkdir(parents=True, exist_ok=True)
+                tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+                with open(tmp, "wb") as fh:
+                    pickle.dump(state, fh)
+                tmp.replace(path)
+            self._prefix_state = state
+        except Exception as exc:
+            logging.warning("Prefix KV cache disabled: %s", exc)
+            self._prefix_tokens = []
+            self._prefix_state = None
+
+    def _restore_prefix(self) -> None:
+        """Make sure the context begins with the evaluated few-shot prefix.
+
+        llama.cpp keeps the tokens of the previous prompt and only evaluates
+        the part of a new prompt after their longest common prefix, so the
+        saved state is loaded only when the context lost the prefix.
+        """
+        if self._prefix_state is None:
+            return
+        n = len(self._prefix_tokens)
+        if self._llm.n_tokens >= n and self._llm.input_ids[:n].tolist() == self._prefix_tokens:
+            return
+        self._llm.load_state(self._prefix_state)
+
+    def _build_prompt(self, question: str, context: str = "") -> str:
+        return build_prompt(question, context)
 
-    def _build_prompt(self, question: str) -> str:
-        examples = (
-            "Soru: Kod 135 ne demek?\nCevap: Yangin butonundan gelen hatali surekli sinyal.\n\n"
-            "Soru: Kod 227 ne anlama gelir?\nCevap: Alarm paneli ile iletisim kaybi.\n\n"
-        )
-        return examples + f"Soru: {question}\nCevap:"
+    def _full_prompt(self, prompt: str) -> str:
+        return retrieval_prompt(prompt)
 
     def ask(self, prompt: str, max_tokens: int = 256) -> str:
-        cached = _PROMPT_CACHE.get(prompt) or _cache_db.get(prompt)
+        version = answer_version(self.model_path)
+        cached = answer_cache.get(cache_key(prompt), version)
         if cached:
-            _PROMPT_CACHE[prompt] = cached
             return cached
 
-        context = search_docs(prompt)
-        base_prompt = self._build_prompt(prompt)
-        if context:
-            full_prompt = f"Bilgi: {context}\n\n" + base_prompt
-        else:
-            full_prompt = base_prompt
+        answer = self.generate(self._full_prompt(prompt), max_tokens=max_tokens)
+        answer_cache.set(cache_key(prompt), answer, version, question=prompt)
+        return answer
+
+    def generate(self, full_prompt: str, max_tokens: int = 256) -> str:
+        """Complete an already built prompt, without cache or retrieval."""
         try:
+            self._restore_prefix()
             response = self._llm(full_prompt, max_tokens=max_tokens, echo=False)
-            answer = response["choices"][0]["text"].strip()
+            return response["choices"][0]["text"].strip()
         except Exception as exc:
             logging.error("LLM failed: %s", exc, exc_info=True)
             raise LLMError(str(exc)) from exc
-        _PROMPT_CACHE[prompt] = answer
-        _cache_db.set(prompt, answer)
-        return answer
+
+    def ask_stream(self, prompt: str, max_tokens: int = 256) -> Iterator[str]:
+        """Yield the answer piece by piece as the model generates it.
+
+        A cached answer is yielded at once as a single piece.  The answer is
+        only cached when generation runs to completion.
+        """
+        version = answer_version(self.model_path)
+        cached = answer_cache.get(cache_key(prompt), version)
+        if cached:
+            yield cached
+            return
+
+        pieces = []
+        for text in self.generate_stream(self._full_prompt(prompt), max_tokens=max_tokens):
+            pieces.append(text)
+            yield text
+        answer_cache.set(cache_key(prompt), "".join(pieces).strip(), version, question=prompt)
+
+    def generate_stream(self, full_prompt: str, max_tokens: int = 256) -> Iterator[str]:
+        """Stream the completion of an already built prompt."""
+        first = True
+        try:
+            self._restore_prefix()
+            for chunk in self._llm(full_prompt, max_tokens=max_tokens, echo=False, stream=True):
+                text = chunk["choices"][0]["text"]
+                if first:
+                    text = text.lstrip()
+                if text:
+                    first = False
+                    yield text
+        except Exception as exc:
+            logging.error("LLM failed: %s", exc, exc_info=True)
+            raise LLMError(str(exc)) from exc
+
+
+class LLMPool:
+    """Several ``LLMClient`` contexts answering prompts concurrently.
+
+    Every context maps the same GGUF file, so the weights are shared through
+    the page cache and each extra context only costs its KV cache.  With
+    ``mode="process"`` every context lives in its own worker process (see
+    ``model_workers``), so generation is not limited by this process's GIL.
+    Each context is driven by its own worker thread of an
+    :class:`~inference_queue.InferenceScheduler`, which orders waiting
+    prompts by priority and rejects new ones when its queue is full.
+    Unless ``LLAMA_THREADS`` is set, the CPUs available to this process are
+    split evenly between the contexts.
+    """
+
+    def __init__(
+        self,
+        model_path: str = DEFAULT_MODEL_PATH,
+        size: int = POOL_SIZE,
+        n_ctx: int = 2048,
+        max_queue: int = QUEUE_SIZE,
+        on_wait: Callable[[float], None] | None = None,
+        mode: str = POOL_MODE,
+        reserve: int | None = None,
+    ):
+        from model_workers import RemoteClient, worker_threads
+
+        self.model_path = Path(model_path)
+        self.size = max(1, size)
+        n_threads = int(os.getenv("LLAMA_THREADS") or worker_threads(self.size))
+        client_cls = RemoteClient if mode == "process" else LLMClient
+        self._clients = [client_cls(model_path, n_ctx=n_ctx, n_threads=n_threads) for _ in range(self.size)]
+        self.scheduler = InferenceScheduler(self._clients, max_queue=max_queue, on_wait=on_wait, reserve=reserve)
+
+    def submit(self, prompt: str, max_tokens: int = 256, priority: int = INTERACTIVE) -> Future:
+        """Queue ``prompt`` and return a future for its answer.
+
+        Raises :class:`~inference_queue.QueueFullError` when saturated.
+        """
+        return self.scheduler.submit(_ask, prompt, max_tokens, priority=priority)
+
+    def submit_stream(
+        self,
+        prompt: str,
+        on_token: Callable[[str], bool | None],
+        max_tokens: int = 256,
+        priority: int = INTERACTIVE,
+    ) -> Future:
+        """Queue ``prompt`` and call ``on_token`` from the worker thread for
+        every generated piece; returning ``False`` from it stops generation.
+
+        The future resolves to the (possibly partial) answer.
+        """
+        return self.scheduler.submit(_ask_stream, prompt, on_token, max_tokens, priority=priority)
+
+    def submit_generate(self, full_prompt: str, max_tokens: int = 256, priority: int = INTERACTIVE) -> Future:
+        """Queue an already built prompt (see ``retrieval_prompt``); the
+        context only generates, without cache lookup or retrieval."""
+        return self.scheduler.submit(_generate, full_prompt, max_tokens, priority=priority)
+
+    def submit_generate_many(
+        self, full_prompts: list[str], max_tokens: int = 256, priority: int = INTERACTIVE
+    ) -> list[Future]:
+        """Queue all ``full_prompts`` or, if they do not fit, none of them."""
+        jobs = [(_generate, (full_prompt, max_tokens)) for full_prompt in full_prompts]
+        return self.scheduler.submit_many(jobs, priority=priority)
+
+    def submit_generate_stream(
+        self,
+        full_prompt: str,
+        on_token: Callable[[str], bool | None],
+        max_tokens: int = 256,
+        priority: int = INTERACTIVE,
+    ) -> Future:
+        """``submit_stream`` for an already built prompt."""
+        return self.scheduler.submit(_generate_stream, full_prompt, on_token, max_tokens, priority=priority)
+
+    def ask(self, prompt: str, max_tokens: int = 256, priority: int = INTERACTIVE) -> str:
+        """Answer ``prompt``, waiting for a free context unless it is cached."""
+        cached = cached_answer(prompt, self.model_path)
+        if cached:
+            return cached
+        return self.submit(prompt, max_tokens, priority).result()
+
+    def ask_many(self, prompts: list[str], max_tokens: int = 256) -> Iterator[tuple[int, str]]:
+        """Yield ``(index, answer)`` pairs in completion order.
+
+        At most the bulk capacity of the queue is waiting at a time; the
+        next prompt is queued whenever one finishes.
+        """
+        futures: dict[Future, int] = {}
+        window = max(1, self.scheduler.capacity(BULK))
+        queued = 0
+        while queued < len(prompts) or futures:
+            while queued < len(prompts) and len(futures) < window:
+                try:
+                    futures[self.submit(prompts[queued], max_tokens, priority=BULK)] = queued
+                except QueueFullError:
+                    # Other work holds the queue; wait for our own jobs first
+                    if futures:
+                        break
+                    time.sleep(0.1)
+                    continue
+                queued += 1
+            done, _ = wait(futures, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield futures.pop(future), future.result()
+
+    def close(self) -> None:
+        self.scheduler.close()
+        for client in self._clients:
+            if hasattr(client, "close"):
+                client.close()
+
+
+def _ask(client: LLMClient, prompt: str, max_tokens: int) -> str:
+    return client.ask(prompt, max_tokens=max_tokens)
+
+
+def _ask_stream(client: LLMClient, prompt: str, on_token: Callable[[str], bool | None], max_tokens: int) -> str:
+    return _forward(client.ask_stream(prompt, max_tokens=max_tokens), on_token)
+
+
+def _generate(client: LLMClient, full_prompt: str, max_tokens: int) -> str:
+    return client.generate(full_prompt, max_tokens=max_tokens)
+
+
+def _generate_stream(
+    client: LLMClient, full_prompt: str, on_token: Callable[[str], bool | None], max_tokens: int
+) -> str:
+    return _forward(client.generate_stream(full_prompt, max_tokens=max_tokens), on_token)
+
+
+def _forward(stream: Iterator[str], on_token: Callable[[str], bool | None]) -> str:
+    pieces = []
+    try:
+        for piece in stream:
+            pieces.append(piece)
+            if on_token(piece) is False:
+                break
+    finally:
+        stream.close()
+    return "".join(pieces)
+
+
+def prewarm(model_path: str, top_n: int, pool_size: int = POOL_SIZE) -> int:
+    """Answer the ``top_n`` most served cached prompts with ``model_path``.
+
+    Meant to run in the background with a new model before the server is
+    switched over: the answers are cached under the new model's version, so
+    the running server keeps using the old ones until the cut-over.
+    Returns the number of prompts answered.
+    """
+    prompts = answer_cache.store.top_prompts(top_n)
+    missing = [p for p, hit in zip(prompts, cached_answers(prompts, model_path)) if not hit]
+    if not missing:
+        return 0
+    pool = LLMPool(model_path, size=pool_size, max_queue=len(missing), reserve=0)
+    answered = 0
+    try:
+        futures = [pool.submit(p, priority=BULK) for p in missing]
+        for future in as_completed(futures):
+            try:
+                future.result()
+            except LLMError as exc:
+                logging.warning("Prewarm prompt failed: %s", exc)
+                continue
+            answered += 1
+            if answered % 50 == 0:
+                logging.info("Prewarmed %d/%d prompts", answered, len(missing))
+    finally:
+        pool.close()
+        answer_cache.store.flush()
+    return answered
 
 
 def main():
     import argparse
 
     parser = argparse.ArgumentParser(description="Ask the local LLM")
-    parser.add_argument("prompt", help="Question to ask")
+    parser.add_argument("prompt", nargs="?", help="Question to ask")
     parser.add_argument("--model", required=True, help="Path to GGUF model")
+    parser.add_argument(
+        "--prewarm", type=int, metavar="N", help="Cache answers of the N most asked prompts for --model"
+    )
     args = parser.parse_args()
 
+    if args.prewarm:
+        logging.basicConfig(level=logging.INFO)
+        print(f"{prewarm(args.model, args.prewarm)} prompts prewarmed")
+        return
+    if not args.prompt:
+        parser.error("prompt is required unless --prewarm is given")
     client = LLMClient(args.model)
     print(client.ask(args.prompt))
 
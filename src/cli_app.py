@@ -1,19 +1,71 @@
-"""Minimal command line assistant demo."""
+"""Minimal command line assistant demo.
+
+Heavy modules (llama.cpp, torch, speech and PDF libraries) are imported only
+by the subcommands that need them, so ``--recommend`` or ``--spec`` start
+quickly; ``--profile-startup`` prints how long each import took.
+"""
+
+from __future__ import annotations
 
 import argparse
+import builtins
 import json
 import logging
 import os
+import signal
+import sys
+import time
 from pathlib import Path
+from typing import TYPE_CHECKING
+
+
+class ImportProfiler:
+    """Record how long every module imported while active took to load."""
+
+    def __init__(self):
+        self.records: list[tuple[int, str, float]] = []
+        self._depth = 0
+        self._import = builtins.__import__
+
+    def _timed_import(self, name, globals=None, locals=None, fromlist=(), level=0):
+        if level or name in sys.modules:
+            return self._import(name, globals, locals, fromlist, level)
+        index = len(self.records)
+        self.records.append((self._depth, name, 0.0))
+        self._depth += 1
+        start = time.perf_counter()
+        try:
+            return self._import(name, globals, locals, fromlist, level)
+        finally:
+            self._depth -= 1
+            self.records[index] = (self._depth, name, time.perf_counter() - start)
+
+    def start(self) -> None:
+        builtins.__import__ = self._timed_import
+
+    def stop(self) -> None:
+        builtins.__import__ = self._import
+
+    def report(self, min_seconds: float = 0.001, max_depth: int = 2) -> str:
+        lines = [
+            f"{seconds * 1000:9.1f} ms  {'  ' * depth}{name}"
+            for depth, name, seconds in self.records
+            if seconds >= min_seconds and depth < max_depth
+        ]
+        total = sum(seconds for depth, _, seconds in self.records if depth == 0)
+        return "\n".join(["Import times (inclusive):", *lines, f"{total * 1000:9.1f} ms  total"])
 
-from config import load_config
 
-from speech_client import transcribe, transcribe_mic
-from ask_llm import LLMClient
-from api_client import ask_cloud
-from voice_response import speak
-from proforma_engine import create_quote, quote_to_pdf
-from invoice_parser import InvoiceParser
+# Started before the project imports below so they show up in the report
+_PROFILER = ImportProfiler() if "--profile-startup" in sys.argv else None
+if _PROFILER is not None:
+    _PROFILER.start()
+
+from config import load_config  # noqa: E402
+from fault_matcher import FaultMatcher, FaultStore, get_matcher  # noqa: E402
+
+if TYPE_CHECKING:
+    from ask_llm import LLMClient
 
 
 CFG = load_config()
@@ -32,18 +84,32 @@ KNOWLEDGE_PATH = Path(__file__).resolve().parent.parent / CFG.get(
 ).get("fault_db", "fault_knowledge.json")
 
 
-def load_fault_db():
-    if not KNOWLEDGE_PATH.exists():
-        return {}
-    with KNOWLEDGE_PATH.open("r", encoding="utf-8") as fh:
-        return {entry["code"]: entry["description"] for entry in json.load(fh)}
+def load_fault_db() -> FaultMatcher | FaultStore:
+    return get_matcher(KNOWLEDGE_PATH)
+
+
+class LazyLLM:
+    """Loads the ``LLMClient`` on the first question that needs the model."""
+
+    def __init__(self, model_path: str):
+        self.model_path = model_path
+        self._client: LLMClient | None = None
 
+    def ask(self, prompt: str) -> str:
+        if self._client is None:
+            from ask_llm import LLMClient
 
-def handle_query(query: str, llm: LLMClient, faults: dict) -> tuple[str, dict | None]:
-    for code, desc in faults.items():
-        if code in query:
-            return desc, None
+            self._client = LLMClient(self.model_path)
+        return self._client.ask(prompt)
+
+
+def handle_query(query: str, llm: LLMClient | LazyLLM, faults: FaultMatcher | FaultStore) -> tuple[str, dict | None]:
+    fault = faults.match(query)
+    if fault:
+        return fault.description, None
     if query.lower().startswith("proforma"):
+        from proforma_engine import create_quote
+
         request = query[len("proforma"):].strip()
         try:
             quote = create_quote(request)
@@ -55,10 +121,12 @@ def handle_query(query: str, llm: LLMClient, faults: dict) -> tuple[str, dict |
     return llm.ask(query), None
 
 
-def get_answer(query: str, llm: LLMClient, faults: dict) -> tuple[str, dict | None]:
+def get_answer(query: str, llm: LLMClient | LazyLLM, faults: FaultMatcher | FaultStore) -> tuple[str, dict | None]:
     if query.startswith("derin analiz") or len(query) > 200:
         print("\u2601\ufe0f Karma\u015f\u0131k sorgu i\u00e7in bulut API kullan\u0131l\u0131yor...")
         try:
+            from api_client import ask_cloud
+
             return ask_cloud(query), None
         except Exception as exc:
             print(f"Bulut API hatas\u0131: {exc}. Yerel model kullan\u0131l\u0131yor...")
@@ -80,7 +148,7 @@ def main():
     parser.add_argument("--email", help="PDF dosyasini bu adrese gonder")
     parser.add_argument(
         "--parse-invoice",
-        help="Resim veya PDF faturayi isleyip JSON cikti verir",
+        help="Resim veya PDF faturayi (ya da klasordeki tum faturalari) isleyip JSON cikti verir",
     )
     parser.add_argument(
         "--recommend",
@@ -97,14 +165,76 @@ def main():
         default=CFG.get("paths", {}).get("invoice_templates"),
         help="invoice2data sablon klasoru (PDF icin)",
     )
+    parser.add_argument(
+        "--daemon",
+        action="store_true",
+        help="Modeli, ariza katalogunu ve dokuman indeksini bellekte tutup Unix soketinden sorgu yanitla",
+    )
+    parser.add_argument(
+        "--no-daemon",
+        action="store_true",
+        help="Calisan daemon'a baglanma, modeli bu islemde yukle",
+    )
+    parser.add_argument(
+        "--profile-startup",
+        action="store_true",
+        help="Modul yukleme surelerini komut bitince stderr'e yazdir",
+    )
     args = parser.parse_args()
 
+    global _PROFILER
+    if not args.profile_startup:
+        return run(args)
+    if _PROFILER is None:
+        _PROFILER = ImportProfiler()
+        _PROFILER.start()
+    try:
+        return run(args)
+    finally:
+        _PROFILER.stop()
+        print(_PROFILER.report(), file=sys.stderr)
+
+
+def serve_daemon(model_path: str) -> None:
+    """Keep the model, fault catalogue and document index resident."""
+    import cli_daemon
+    from ask_llm import LLMClient
+    from doc_search import get_index
+
     faults = load_fault_db()
-    llm = LLMClient(args.model)
+    llm = LLMClient(model_path)
+    get_index()
+    # Exit through the normal path so the socket is removed and caches flushed
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    print(f"Daemon hazir: {cli_daemon.socket_path()}")
+    try:
+        cli_daemon.serve(model_path, lambda query: get_answer(query, llm, faults))
+    except KeyboardInterrupt:
+        pass
+
+
+def run(args: argparse.Namespace) -> None:
+    model_path = str(Path(args.model).resolve())
+    if args.daemon:
+        serve_daemon(model_path)
+        return
 
     if args.parse_invoice:
+        from invoice_parser import InvoiceParser
+
         print(f"'{args.parse_invoice}' dosyasi isleniyor...")
         parser_cls = InvoiceParser(templates_dir=args.templates)
+        source = Path(args.parse_invoice)
+        if source.is_dir():
+            # One JSON line per invoice, in file name order
+            files = sorted(p for p in source.iterdir() if p.is_file())
+            try:
+                for i, result in parser_cls.parse_many(files):
+                    data = {"hata": str(result)} if isinstance(result, Exception) else result
+                    print(json.dumps({"dosya": files[i].name, **data}, ensure_ascii=False, default=str))
+            finally:
+                parser_cls.close()
+            return
         data = parser_cls.parse_invoice(args.parse_invoice)
         print("\n--- Cikarilan Fatura Bilgileri ---")
         print(json.dumps(data, indent=2, ensure_ascii=False))
@@ -125,6 +255,9 @@ def main():
         print(json.dumps(reqs, indent=2, ensure_ascii=False))
         return
 
+    from speech_client import transcribe, transcribe_mic
+    from voice_response import speak
+
     if args.mic or not args.audio:
         text = transcribe_mic(lang=args.lang)
     else:
@@ -140,10 +273,19 @@ def main():
             sentry_sdk.add_breadcrumb(category="query", message=text)
         except Exception:
             pass
-    answer, quote = get_answer(text, llm, faults)
+    reply = None
+    if not args.no_daemon:
+        import cli_daemon
+
+        reply = cli_daemon.ask(text, model_path)
+    if reply is None:
+        reply = get_answer(text, LazyLLM(model_path), load_fault_db())
+    answer, quote = reply
     print(answer)
     logging.info("Answer: %s", answer)
     if args.pdf and quote:
+        from proforma_engine import quote_to_pdf
+
         quote_to_pdf(quote, args.pdf)
         print(f"PDF kaydedildi: {args.pdf}")
         if args.email:
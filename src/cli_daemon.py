@@ -0,0 +1,248 @@
+"""Resident ``cli_app`` backend reachable over a Unix socket.
+
+``cli_app --daemon`` loads the model, the fault catalogue and the document
+index once and then answers queries from later ``cli_app`` runs, which only
+transcribe, send the text and print/speak the reply.
+
+The socket and a 32-byte secret live in a directory that only the current
+user can write to; both ends refuse to use a socket, key or directory owned
+by someone else or writable by group/others.  Every exchange is one line of
+JSON each way (never pickles): the daemon sends a nonce, the client answers
+with its request and an HMAC of that nonce under the shared key, and the
+reply carries an HMAC of the client's nonce, so neither side trusts a peer
+that cannot read the key file.  Sockets time out, so a stuck client cannot
+hold the daemon.
+"""
+
+from __future__ import annotations
+
+from pathlib import Path
+from typing import Callable
+import hashlib
+import hmac
+import json
+import logging
+import os
+import secrets
+import socket
+import stat
+import tempfile
+
+from config import load_config
+
+CFG = load_config()
+# Seconds the daemon waits for a client to send its request or read a reply
+REQUEST_TIMEOUT = 5.0
+# Seconds a client waits for an answer (model generation included)
+ANSWER_TIMEOUT = 600.0
+# Longest accepted JSON line
+MAX_MESSAGE = 1 << 20
+
+
+class UnsafeSocketError(RuntimeError):
+    """The socket, key or their directory could be controlled by another user."""
+
+
+def socket_path() -> Path:
+    """Socket used by the daemon: ``CLI_SOCKET``, ``paths.cli_socket`` or
+    ``cli.sock`` in a private per-user directory under ``$XDG_RUNTIME_DIR``
+    (or the temp directory)."""
+    configured = os.getenv("CLI_SOCKET") or CFG.get("paths", {}).get("cli_socket")
+    if configured:
+        return Path(configured).expanduser()
+    runtime_dir = os.getenv("XDG_RUNTIME_DIR") or tempfile.gettempdir()
+    return Path(runtime_dir) / f"matriks-cli-{os.getuid()}" / "cli.sock"
+
+
+def _check_private(path: Path, secret: bool = False) -> None:
+    """Raise unless ``path`` is ours and not writable (``secret``: not
+    accessible at all) by group or others.  Symlinks are rejected."""
+    st = os.lstat(path)
+    if stat.S_ISLNK(st.st_mode):
+        raise UnsafeSocketError(f"{path} is a symlink")
+    if st.st_uid != os.getuid():
+        raise UnsafeSocketError(f"{path} belongs to uid {st.st_uid}")
+    if st.st_mode & (0o077 if secret else 0o022):
+        raise UnsafeSocketError(f"{path} is accessible to other users ({oct(st.st_mode & 0o777)})")
+
+
+def _private_dir(path: Path) -> None:
+    """Create the socket directory (mode 0700) or verify an existing one."""
+    try:
+        path.parent.mkdir(mode=0o700, parents=True)
+    except FileExistsError:
+        pass
+    _check_private(path.parent)
+
+
+def _key_path(path: Path) -> Path:
+    return path.with_name(path.name + ".key")
+
+
+def _read_key(path: Path) -> bytes | None:
+    key_path = _key_path(path)
+    try:
+        _check_private(key_path, secret=True)
+        return key_path.read_bytes()
+    except FileNotFoundError:
+        return None
+
+
+def _create_key(path: Path) -> bytes:
+    key_path = _key_path(path)
+    key_path.unlink(missing_ok=True)
+    key = secrets.token_bytes(32)
+    fd = os.open(key_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    with os.fdopen(fd, "wb") as fh:
+        fh.write(key)
+    return key
+
+
+def _mac(key: bytes, nonce: str) -> str:
+    return hmac.new(key, nonce.encode("ascii"), hashlib.sha256).hexdigest()
+
+
+def _send(sock_file, message: dict) -> None:
+    sock_file.write(json.dumps(message, ensure_ascii=False).encode("utf-8") + b"\n")
+    sock_file.flush()
+
+
+def _recv(sock_file) -> dict:
+    line = sock_file.readline(MAX_MESSAGE + 1)
+    if not line.endswith(b"\n"):
+        raise ValueError("Truncated or oversized message")
+    message = json.loads(line)
+    if not isinstance(message, dict):
+        raise ValueError("Message is not a JSON object")
+    return message
+
+
+def _connect(path: Path, timeout: float) -> socket.socket | None:
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.settimeout(timeout)
+    try:
+        sock.connect(str(path))
+    except (FileNotFoundError, ConnectionRefusedError):
+        sock.close()
+        return None
+    return sock
+
+
+def ask(query: str, model_path: str, path: Path | None = None) -> tuple[str, dict | None] | None:
+    """Return ``(answer, quote)`` from a running daemon, or ``None`` when no
+    trusted daemon is listening or it serves a different model."""
+    path = path or socket_path()
+    try:
+        if not path.exists():
+            return None
+        _check_private(path.parent)
+        _check_private(path)
+        key = _read_key(path)
+    except (UnsafeSocketError, OSError) as exc:
+        logging.warning("Not using CLI daemon socket: %s", exc)
+        return None
+    if key is None:
+        return None
+    # The daemon may still be serving another client or generating
+    sock = _connect(path, ANSWER_TIMEOUT)
+    if sock is None:
+        return None
+    client_nonce = secrets.token_hex(16)
+    try:
+        with sock, sock.makefile("rwb") as fh:
+            challenge = _recv(fh)
+            _send(fh, {
+                "mac": _mac(key, str(challenge.get("nonce", ""))),
+                "nonce": client_nonce,
+                "method": "ask",
+                "model": str(model_path),
+                "query": query,
+            })
+            reply = _recv(fh)
+    except (OSError, ValueError) as exc:
+        logging.warning("CLI daemon connection failed: %s", exc)
+        return None
+    if not hmac.compare_digest(str(reply.get("mac", "")), _mac(key, client_nonce)):
+        logging.warning("CLI daemon reply failed authentication")
+        return None
+    if "result" in reply:
+        answer, quote = reply["result"]
+        return answer, quote
+    logging.info("CLI daemon declined the query: %s", reply.get("error"))
+    return None
+
+
+def serve(
+    model_path: str,
+    handler: Callable[[str], tuple[str, dict | None]],
+    path: Path | None = None,
+) -> None:
+    """Answer queries with ``handler`` until interrupted.
+
+    Connections are served one at a time: the model context is not
+    thread-safe and a laptop has a single technician asking questions.
+    """
+    path = path or socket_path()
+    _private_dir(path)
+    sock = _connect(path, REQUEST_TIMEOUT)
+    if sock is not None:
+        sock.close()
+        raise RuntimeError(f"A CLI daemon is already listening on {path}")
+    # Left behind by a daemon that was killed
+    path.unlink(missing_ok=True)
+    key = _create_key(path)
+
+    listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    umask = os.umask(0o177)
+    try:
+        listener.bind(str(path))
+    finally:
+        os.umask(umask)
+    listener.listen()
+    logging.info("CLI daemon listening on %s", path)
+    try:
+        while True:
+            try:
+                conn, _ = listener.accept()
+            except OSError as exc:
+                logging.warning("CLI daemon accept failed: %s", exc)
+                continue
+            conn.settimeout(REQUEST_TIMEOUT)
+            try:
+                with conn, conn.makefile("rwb") as fh:
+                    _handle(fh, key, str(model_path), handler)
+            except OSError as exc:
+                # Client went away; closing the buffered file flushes to it
+                logging.warning("CLI daemon connection dropped: %s", exc)
+    finally:
+        listener.close()
+        path.unlink(missing_ok=True)
+        _key_path(path).unlink(missing_ok=True)
+
+
+def _handle(fh, key: bytes, model_path: str, handler: Callable[[str], tuple[str, dict | None]]) -> None:
+    nonce = secrets.token_hex(16)
+    try:
+        _send(fh, {"nonce": nonce})
+        request = _recv(fh)
+    except (OSError, ValueError) as exc:
+        logging.warning("Malformed CLI daemon request: %s", exc)
+        return
+    if not hmac.compare_digest(str(request.get("mac", "")), _mac(key, nonce)):
+        logging.warning("Rejected unauthenticated CLI daemon request")
+        return
+    reply: dict = {"mac": _mac(key, str(request.get("nonce", "")))}
+    if request.get("method") != "ask":
+        reply["error"] = f"Unknown method: {request.get('method')}"
+    elif request.get("model") != model_path:
+        reply["error"] = f"Daemon serves {model_path}, not {request.get('model')}"
+    else:
+        try:
+            reply["result"] = list(handler(str(request.get("query", ""))))
+        except Exception as exc:
+            logging.exception("CLI daemon query failed")
+            reply["error"] = str(exc)
+    try:
+        _send(fh, reply)
+    except (OSError, TypeError, ValueError) as exc:
+        logging.warning("CLI daemon reply failed: %s", exc)
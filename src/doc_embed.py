@@ -0,0 +1,276 @@
+from __future__ import annotations
+
+"""Optional dense-embedding retrieval for ``doc_search``.
+
+Chunk vectors are computed once with a local embedding model (llama.cpp
+embeddings from a GGUF file, or a sentence-transformers model when that
+package is installed), normalised and stored as a float16 ``.npy`` matrix
+that is memory-mapped for search.  Small stores are searched brute force;
+large ones get an IVF layer (spherical k-means centroids plus inverted
+lists) so only the ``nprobe`` closest lists are scanned.  Everything runs on
+CPU without network access.
+"""
+
+from pathlib import Path
+import hashlib
+import json
+import logging
+import shutil
+import threading
+
+import numpy as np
+
+from config import load_config
+from doc_search import index_lock
+
+CFG = load_config()
+ROOT_DIR = Path(__file__).resolve().parent.parent
+VECTORS_DIR = ROOT_DIR / CFG.get("paths", {}).get("doc_vectors", "doc_vectors")
+RETRIEVAL = CFG.get("retrieval", {})
+
+STORE_FORMAT = 1
+# Stores with at least this many vectors are searched through IVF lists
+IVF_MIN_VECTORS = 50_000
+IVF_PROBES = int(RETRIEVAL.get("ivf_probes", 8))
+BATCH_SIZE = 32
+# Rows multiplied at once when scanning the float16 matrix
+SCAN_BLOCK = 8192
+
+
+class LlamaEmbedder:
+    """Sentence embeddings from a GGUF model through llama.cpp.
+
+    The weights are memory-mapped, so sharing the GGUF already loaded by
+    ``LLMClient`` costs no extra RAM for the weights themselves.
+    """
+
+    def __init__(self, model_path: str, n_ctx: int = 512):
+        from llama_cpp import Llama
+        import os
+
+        self.name = f"llama:{Path(model_path).name}"
+        n_threads = int(os.getenv("LLAMA_THREADS", "4"))
+        self._llm = Llama(
+            model_path=str(model_path), n_ctx=n_ctx, n_threads=n_threads, embedding=True, verbose=False
+        )
+
+    def embed(self, texts: list[str]) -> np.ndarray:
+        vectors = []
+        for vec in self._llm.embed(texts):
+            vec = np.asarray(vec, dtype=np.float32)
+            # Models without a pooling layer return one vector per token
+            vectors.append(vec.mean(axis=0) if vec.ndim == 2 else vec)
+        return np.stack(vectors)
+
+
+class SentenceTransformerEmbedder:
+    """Embeddings from a local sentence-transformers model."""
+
+    def __init__(self, model_name: str):
+        from sentence_transformers import SentenceTransformer
+
+        self.name = f"st:{model_name}"
+        self._model = SentenceTransformer(model_name, device="cpu")
+
+    def embed(self, texts: list[str]) -> np.ndarray:
+        return np.asarray(self._model.encode(texts, batch_size=BATCH_SIZE), dtype=np.float32)
+
+
+_EMBEDDER = None
+_EMBEDDER_FAILED = False
+# Serialises embedding calls (a llama.cpp context is not thread-safe) and
+# store resyncs between the API's retrieval threads
+_LOCK = threading.RLock()
+
+
+def get_embedder():
+    """Return the configured embedder, or ``None`` when unavailable."""
+    with _LOCK:
+        return _load_embedder()
+
+
+def _load_embedder():
+    global _EMBEDDER, _EMBEDDER_FAILED
+    if _EMBEDDER is not None or _EMBEDDER_FAILED:
+        return _EMBEDDER
+    backend = RETRIEVAL.get("embedding_backend", "llama")
+    try:
+        if backend == "sentence-transformers":
+            _EMBEDDER = SentenceTransformerEmbedder(RETRIEVAL["embedding_model"])
+        else:
+            model = RETRIEVAL.get("embedding_model") or CFG.get("models", {}).get(
+                "llm", "models/finetuned-mistral.gguf"
+            )
+            _EMBEDDER = LlamaEmbedder(str(ROOT_DIR / model))
+    except Exception as exc:
+        logging.warning("Dense retrieval disabled, embedder unavailable: %s", exc)
+        _EMBEDDER_FAILED = True
+    return _EMBEDDER
+
+
+def _normalise(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def _kmeans(vectors: np.ndarray, n_lists: int, iterations: int = 10) -> tuple[np.ndarray, np.ndarray]:
+    """Spherical k-means; returns unit centroids and the list of every row."""
+    rng = np.random.default_rng(0)
+    centroids = np.asarray(vectors[rng.choice(len(vectors), n_lists, replace=False)], dtype=np.float32)
+    assign = np.empty(len(vectors), dtype=np.int64)
+    for _ in range(iterations):
+        for start in range(0, len(vectors), SCAN_BLOCK):
+            block = np.asarray(vectors[start:start + SCAN_BLOCK], dtype=np.float32)
+            assign[start:start + SCAN_BLOCK] = np.argmax(block @ centroids.T, axis=1)
+        sums = np.zeros_like(centroids)
+        for start in range(0, len(vectors), SCAN_BLOCK):
+            block = np.asarray(vectors[start:start + SCAN_BLOCK], dtype=np.float32)
+            np.add.at(sums, assign[start:start + SCAN_BLOCK], block)
+        empty = ~sums.any(axis=1)
+        sums[empty] = centroids[empty]
+        centroids = _normalise(sums)
+    return centroids, assign
+
+
+class VectorStore:
+    """Float16 chunk vectors aligned with the chunk ids of a ``DocIndex``."""
+
+    def __init__(self, store_dir: Path = VECTORS_DIR):
+        self.store_dir = Path(store_dir)
+        meta = json.loads((self.store_dir / "meta.json").read_text(encoding="utf-8"))
+        if meta.get("format") != STORE_FORMAT:
+            raise ValueError(f"Unsupported vector store format: {meta.get('format')}")
+        self.model = meta["model"]
+        self.vectors = np.load(self.store_dir / "vectors.npy", mmap_mode="r")
+        self.digests = np.load(self.store_dir / "digests.npy", mmap_mode="r")
+        self.centroids = None
+        if (self.store_dir / "centroids.npy").exists():
+            self.centroids = np.load(self.store_dir / "centroids.npy")
+            self.list_indptr = np.load(self.store_dir / "list_indptr.npy", mmap_mode="r")
+            self.list_ids = np.load(self.store_dir / "list_ids.npy", mmap_mode="r")
+
+    def __len__(self) -> int:
+        return len(self.vectors)
+
+    def search(self, query: np.ndarray, n: int, nprobe: int = IVF_PROBES) -> tuple[np.ndarray, np.ndarray]:
+        """Return up to ``n`` chunk ids and cosine scores, best first."""
+        query = _normalise(np.asarray(query, dtype=np.float32))
+        if self.centroids is not None:
+            probes = np.argsort(-(self.centroids @ query))[:nprobe]
+            ids = np.sort(np.concatenate(
+                [self.list_ids[self.list_indptr[c]:self.list_indptr[c + 1]] for c in probes]
+            ))
+        else:
+            ids = np.arange(len(self))
+        scores = np.empty(len(ids), dtype=np.float32)
+        for start in range(0, len(ids), SCAN_BLOCK):
+            rows = ids[start:start + SCAN_BLOCK]
+            block = self.vectors[rows] if self.centroids is not None else self.vectors[start:start + SCAN_BLOCK]
+            scores[start:start + SCAN_BLOCK] = np.asarray(block, dtype=np.float32) @ query
+        if len(scores) > n:
+            top = np.argpartition(-scores, n - 1)[:n]
+        else:
+            top = np.arange(len(scores))
+        top = top[np.lexsort((ids[top], -scores[top]))]
+        return ids[top], scores[top]
+
+
+def _chunk_digests(index) -> np.ndarray:
+    digests = np.empty((len(index), 20), dtype=np.uint8)
+    for pid, text in enumerate(index.passages()):
+        digests[pid] = np.frombuffer(hashlib.sha1(text.encode("utf-8")).digest(), dtype=np.uint8)
+    return digests
+
+
+def sync_store(index, embedder, store_dir: Path = VECTORS_DIR) -> VectorStore:
+    """Make the vector store match ``index``, embedding only new chunks.
+
+    Vectors are keyed by the SHA-1 of the chunk text, so chunks that merely
+    moved because other files changed are reused rather than re-embedded.
+    """
+    store_dir = Path(store_dir)
+    with index_lock(store_dir):
+        return _sync_store(index, embedder, store_dir)
+
+
+def _sync_store(index, embedder, store_dir: Path) -> VectorStore:
+    digests = _chunk_digests(index)
+    old: VectorStore | None = None
+    try:
+        old = VectorStore(store_dir)
+        if old.model != embedder.name:
+            old = None
+    except (OSError, ValueError, KeyError):
+        pass
+    if old is not None and np.array_equal(old.digests, digests):
+        return old
+
+    known = {bytes(d): row for row, d in enumerate(old.digests)} if old is not None else {}
+    missing = [pid for pid, d in enumerate(digests) if bytes(d) not in known]
+    fresh: dict[int, np.ndarray] = {}
+    for start in range(0, len(missing), BATCH_SIZE):
+        batch = missing[start:start + BATCH_SIZE]
+        vectors = _normalise(embedder.embed([index.passage(pid) for pid in batch]))
+        fresh.update(zip(batch, vectors))
+    if fresh:
+        dim = len(next(iter(fresh.values())))
+    elif old is not None:
+        dim = old.vectors.shape[1]
+    else:
+        dim = 0
+
+    tmp_dir = store_dir.with_name(store_dir.name + ".tmp")
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    tmp_dir.mkdir(parents=True)
+    vectors = np.lib.format.open_memmap(tmp_dir / "vectors.npy", mode="w+", dtype=np.float16, shape=(len(index), dim))
+    for pid, d in enumerate(digests):
+        row = known.get(bytes(d))
+        vectors[pid] = old.vectors[row] if row is not None else fresh[pid]
+    vectors.flush()
+    np.save(tmp_dir / "digests.npy", digests)
+    if len(index) >= IVF_MIN_VECTORS:
+        centroids, assign = _kmeans(vectors, int(np.sqrt(len(index))))
+        list_indptr = np.zeros(len(centroids) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(assign, minlength=len(centroids)), out=list_indptr[1:])
+        np.save(tmp_dir / "centroids.npy", centroids)
+        np.save(tmp_dir / "list_indptr.npy", list_indptr)
+        np.save(tmp_dir / "list_ids.npy", np.argsort(assign, kind="stable").astype(np.int64))
+    del vectors
+    meta = {"format": STORE_FORMAT, "model": embedder.name}
+    (tmp_dir / "meta.json").write_text(json.dumps(meta), encoding="utf-8")
+
+    old_dir = store_dir.with_name(store_dir.name + ".old")
+    shutil.rmtree(old_dir, ignore_errors=True)
+    if store_dir.exists():
+        store_dir.rename(old_dir)
+    tmp_dir.rename(store_dir)
+    shutil.rmtree(old_dir, ignore_errors=True)
+    logging.info("Embedded %d of %d chunks into %s", len(missing), len(index), store_dir)
+    return VectorStore(store_dir)
+
+
+_STORE: VectorStore | None = None
+_STORE_INDEX = None
+
+
+def dense_search(index, question: str, n: int) -> list[tuple[int, float]] | None:
+    """Return ``(chunk id, cosine)`` pairs for ``question`` or ``None``.
+
+    ``None`` means dense retrieval is not available (no embedding backend).
+    The store is synced lazily whenever ``index`` changes.
+    """
+    global _STORE, _STORE_INDEX
+    with _LOCK:
+        embedder = get_embedder()
+        if embedder is None:
+            return None
+        if _STORE is None or _STORE_INDEX is not index:
+            _STORE = sync_store(index, embedder, VECTORS_DIR)
+            _STORE_INDEX = index
+        store = _STORE
+        if not len(store):
+            return []
+        query = embedder.embed([question])[0]
+    # The memory-mapped store is only read, so searches run in parallel
+    ids, scores = store.search(query, n)
+    return list(zip(ids.tolist(), scores.tolist()))
@@ -1,55 +1,590 @@
 from __future__ import annotations
 
-"""Simple text-based document search for retrieval-augmented answers."""
+"""Simple text-based document search for retrieval-augmented answers.
 
+Every ``.txt`` file under ``DOCS_DIR`` is split into paragraph-sized chunks
+which are stored in an on-disk inverted index (term -> posting list of chunk
+ids with term counts and precomputed BM25 term weights, plus the token count
+of every chunk).  The index is built once, memory-mapped on first use and
+rebuilt with ``python src/doc_search.py --rebuild``.  Words are folded the
+Turkish way (see ``text_normalize``) and a character trigram index shortlists
+chunks for the fuzzy fallback used on misspelt questions.  A manifest of
+per-file mtime and SHA-256 lets ``update_index`` re-tokenize only the files
+that were added or changed.
+"""
+
+from dataclasses import dataclass
 from pathlib import Path
 from difflib import SequenceMatcher
 from collections import Counter
+import hashlib
+import json
+import logging
+import shutil
+import threading
+from contextlib import contextmanager
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows
+    fcntl = None
+
 from config import load_config
+from text_normalize import fold, words
 
 CFG = load_config()
-DOCS_DIR = Path(__file__).resolve().parent.parent / CFG.get("paths", {}).get("docs_dir", "docs")
+ROOT_DIR = Path(__file__).resolve().parent.parent
+DOCS_DIR = ROOT_DIR / CFG.get("paths", {}).get("docs_dir", "docs")
+INDEX_DIR = ROOT_DIR / CFG.get("paths", {}).get("doc_index", "doc_index")
+
+INDEX_FORMAT = 4
+# Chunks are paragraphs, split further so that none exceeds this many words
+CHUNK_WORDS = 120
+BM25_K1 = 1.2
+BM25_B = 0.75
+# Chunks shortlisted by trigram overlap before exact fuzzy matching
+FUZZY_SHORTLIST = 20
+# Fuzzy matches are fused in when the best BM25 hit holds less than this
+# IDF-weighted fraction of the question's terms (e.g. most are misspelt)
+FUZZY_COVERAGE = 0.5
+# Question words that say nothing about the topic (folded), ignored when
+# measuring coverage: "aku degisimi nasil yapilir bana anlatir misin"
+FILLER_WORDS = frozenset(
+    "acaba ama anlat anlatin anlatir anlatirmisin bana ben beni bir biz bize bu "
+    "da de diye gerek gerekir hangi icin ile ise kac ki lutfen mi midir miyim mu "
+    "mudur misin misiniz musun ne neden nedir nasil nerede niye o olur sen siz "
+    "soyle soyler soyleyin su ve ya yapilir yapmali yapmaliyim yapayim".split()
+)
+# "lexical", "dense" or "hybrid", see ``search``
+RETRIEVAL_MODE = CFG.get("retrieval", {}).get("mode", "lexical")
+# Candidates taken from each retriever before hybrid fusion
+FUSION_DEPTH = 50
+RRF_K = 60
 
 
 def _vec(text: str) -> Counter:
-    words = [w.lower() for w in text.split()]
-    return Counter(words)
+    return Counter(words(text))
+
 
+def _trigrams(text: str) -> Counter:
+    """Character trigrams of the folded words of ``text``, padded with spaces."""
+    grams: Counter = Counter()
+    for word in words(text):
+        padded = f" {word} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
 
-def _jaccard(a: Counter, b: Counter) -> float:
-    intersection = sum((a & b).values())
-    union = sum((a | b).values())
-    return intersection / union if union else 0.0
+
+def _chunk(text: str) -> list[str]:
+    """Split ``text`` into paragraphs of at most ``CHUNK_WORDS`` words."""
+    chunks: list[str] = []
+    for paragraph in text.split("\n\n"):
+        lines: list[str] = []
+        size = 0
+        for line in paragraph.splitlines():
+            line = line.strip()
+            n = len(line.split())
+            if not n:
+                continue
+            if lines and size + n > CHUNK_WORDS:
+                chunks.append("\n".join(lines))
+                lines, size = [], 0
+            while n > CHUNK_WORDS:
+                tokens = line.split()
+                chunks.append(" ".join(tokens[:CHUNK_WORDS]))
+                line = " ".join(tokens[CHUNK_WORDS:])
+                n -= CHUNK_WORDS
+            lines.append(line)
+            size += n
+        if lines:
+            chunks.append("\n".join(lines))
+    return chunks
 
 
-def search(question: str) -> str | None:
-    """Return a relevant line from the docs using simple vector similarity."""
-    query_vec = _vec(question)
-    best_line: str | None = None
-    best_score = 0.0
-    for path in DOCS_DIR.glob("**/*.txt"):
+def _scan_sources(docs_dir: Path) -> dict[str, tuple[int, int]]:
+    """Return ``{relative path: (mtime_ns, size)}`` for the docs directory."""
+    sources = {}
+    for path in sorted(docs_dir.glob("**/*.txt")):
         try:
-            text = path.read_text(encoding="utf-8")
+            stat = path.stat()
         except OSError:
             continue
-        for line in text.splitlines():
-            score = _jaccard(query_vec, _vec(line))
-            if score > best_score:
-                best_score = score
-                best_line = line.strip()
-    if best_score < 0.1:
-        # Fallback to fuzzy matching
-        query = question.lower()
-        best_line = None
-        best_score = 0.0
-        for path in DOCS_DIR.glob("**/*.txt"):
-            try:
-                text = path.read_text(encoding="utf-8")
-            except OSError:
+        sources[path.relative_to(docs_dir).as_posix()] = (stat.st_mtime_ns, stat.st_size)
+    return sources
+
+
+@dataclass
+class Passage:
+    """A ranked chunk of a document."""
+
+    text: str
+    score: float
+    source: str
+
+
+class DocIndex:
+    """Memory-mapped inverted index over the chunks of the docs directory."""
+
+    def __init__(self, index_dir: Path = INDEX_DIR):
+        self.index_dir = Path(index_dir)
+        meta = json.loads((self.index_dir / "meta.json").read_text(encoding="utf-8"))
+        if meta.get("format") != INDEX_FORMAT:
+            raise ValueError(f"Unsupported index format: {meta.get('format')}")
+        self.manifest = json.loads((self.index_dir / "manifest.json").read_text(encoding="utf-8"))
+        self.terms = meta["vocab"]
+        self.vocab = {term: row for row, term in enumerate(self.terms)}
+        self.grams = meta["grams"]
+        self.gram_rows = {gram: row for row, gram in enumerate(self.grams)}
+        self.indptr = self._load("indptr")
+        self.indices = self._load("indices")
+        self.counts = self._load("counts")
+        self.weights = self._load("weights")
+        self.norms = self._load("norms")
+        self.gram_indptr = self._load("gram_indptr")
+        self.gram_indices = self._load("gram_indices")
+        self.gram_counts = self._load("gram_counts")
+        self.gram_norms = self._load("gram_norms")
+        self.offsets = self._load("offsets")
+        self.text = self._load("text")
+        self.stamp = (self.index_dir / "manifest.json").stat().st_mtime_ns
+        # Changes only when the indexed text or the way it is chunked changes
+        self.version = hashlib.sha256(json.dumps(
+            [INDEX_FORMAT, CHUNK_WORDS, sorted((rel, entry["sha256"]) for rel, entry in self.manifest.items())]
+        ).encode("utf-8")).hexdigest()[:16]
+        self._paths = list(self.manifest)
+        self._starts = np.array([entry["start"] for entry in self.manifest.values()], dtype=np.int64)
+
+    def _load(self, name: str) -> np.ndarray:
+        return np.load(self.index_dir / f"{name}.npy", mmap_mode="r")
+
+    def __len__(self) -> int:
+        return len(self.norms)
+
+    def passage(self, pid: int) -> str:
+        start, end = int(self.offsets[pid]), int(self.offsets[pid + 1])
+        return self.text[start:end].tobytes().decode("utf-8")
+
+    def passages(self):
+        for pid in range(len(self)):
+            yield self.passage(pid)
+
+    def source(self, pid: int) -> str:
+        """Return the docs-relative path of the file chunk ``pid`` came from."""
+        return self._paths[int(np.searchsorted(self._starts, pid, side="right")) - 1]
+
+    def bm25_scores(self, query: Counter) -> tuple[np.ndarray, np.ndarray]:
+        """Return candidate chunk ids and their BM25 score for ``query``.
+
+        This is the product of the sparse query vector (query term counts
+        times IDF) with the term x chunk weight matrix: only the posting lists
+        of the query terms are touched and chunks sharing no term with the
+        query are not returned.
+        """
+        ids, contrib = [], []
+        for term, q_count in query.items():
+            row = self.vocab.get(term)
+            if row is None:
                 continue
-            for line in text.splitlines():
-                score = SequenceMatcher(None, query, line.lower()).ratio()
-                if score > best_score:
-                    best_score = score
-                    best_line = line.strip()
-    return best_line
+            start, end = self.indptr[row], self.indptr[row + 1]
+            ids.append(self.indices[start:end])
+            contrib.append(self.weights[start:end] * (self.idf(term) * q_count))
+        if not ids:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float64)
+        candidates, inverse = np.unique(np.concatenate(ids), return_inverse=True)
+        return candidates, np.bincount(inverse, weights=np.concatenate(contrib))
+
+    def idf(self, term: str) -> float:
+        """BM25 inverse document frequency of ``term`` (highest if unseen)."""
+        row = self.vocab.get(term)
+        df = 0 if row is None else int(self.indptr[row + 1] - self.indptr[row])
+        return float(np.log1p((len(self) - df + 0.5) / (df + 0.5)))
+
+    def trigram_scores(self, query: Counter) -> tuple[np.ndarray, np.ndarray]:
+        """Return candidate chunk ids and their trigram Dice coefficient."""
+        ids, shared = [], []
+        for gram, q_count in query.items():
+            row = self.gram_rows.get(gram)
+            if row is None:
+                continue
+            start, end = self.gram_indptr[row], self.gram_indptr[row + 1]
+            ids.append(self.gram_indices[start:end])
+            shared.append(np.minimum(self.gram_counts[start:end], q_count))
+        if not ids:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float64)
+        candidates, inverse = np.unique(np.concatenate(ids), return_inverse=True)
+        overlap = np.bincount(inverse, weights=np.concatenate(shared))
+        return candidates, 2 * overlap / (sum(query.values()) + self.gram_norms[candidates])
+
+
+def _file_hash(path: Path) -> str:
+    digest = hashlib.sha256()
+    with path.open("rb") as fh:
+        for block in iter(lambda: fh.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _read_chunks(path: Path) -> list[str]:
+    try:
+        text = path.read_text(encoding="utf-8")
+    except (OSError, UnicodeDecodeError) as exc:
+        logging.warning("Skipping %s: %s", path, exc)
+        return []
+    return _chunk(text)
+
+
+def _bm25_weights(indices: np.ndarray, counts: np.ndarray, norms: np.ndarray) -> np.ndarray:
+    """Saturated term frequency of every posting, the per-chunk half of BM25."""
+    if not len(norms):
+        return np.empty(0, dtype=np.float32)
+    length = norms[indices] / max(float(norms.mean()), 1.0)
+    tf = counts.astype(np.float32)
+    return (tf * (BM25_K1 + 1) / (tf + BM25_K1 * (1 - BM25_B + BM25_B * length))).astype(np.float32)
+
+
+def _merge_postings(old, remap: np.ndarray, postings: dict[str, list[tuple[int, int]]]):
+    """Combine the surviving postings of ``old`` with freshly tokenized ones.
+
+    ``old`` is ``(terms, indptr, indices, counts)`` of the current index or
+    ``None``; ``remap`` maps its chunk ids to new ids (-1 for dropped chunks).
+    Returns the same four fields for the merged, term-sorted CSR layout.
+    """
+    vocab = set(postings)
+    rows = np.empty(0, dtype=np.int64)
+    cols = np.empty(0, dtype=np.int64)
+    counts = np.empty(0, dtype=np.int32)
+    if old is not None and len(old[2]):
+        terms, old_indptr, old_indices, old_counts = old
+        rows = np.repeat(np.arange(len(terms)), np.diff(old_indptr))
+        cols = remap[old_indices]
+        keep = cols >= 0
+        rows, cols, counts = rows[keep], cols[keep], np.asarray(old_counts)[keep]
+        vocab.update(terms[row] for row in np.unique(rows))
+    vocab = sorted(vocab)
+    row_of = {term: row for row, term in enumerate(vocab)}
+    if len(rows):
+        rows = np.array([row_of.get(term, -1) for term in terms], dtype=np.int64)[rows]
+
+    new_rows, new_cols, new_counts = [], [], []
+    for term, plist in postings.items():
+        new_rows.extend([row_of[term]] * len(plist))
+        new_cols.extend(p for p, _ in plist)
+        new_counts.extend(c for _, c in plist)
+    rows = np.concatenate([rows, np.array(new_rows, dtype=np.int64)])
+    cols = np.concatenate([cols, np.array(new_cols, dtype=np.int64)])
+    counts = np.concatenate([counts, np.array(new_counts, dtype=np.int32)])
+    order = np.lexsort((cols, rows))
+    indptr = np.zeros(len(vocab) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(rows, minlength=len(vocab)), out=indptr[1:])
+    return vocab, indptr, cols[order].astype(np.int32), counts[order]
+
+
+def _write_index(index_dir: Path, meta: dict, manifest: dict, arrays: dict[str, np.ndarray]) -> None:
+    """Write a complete index next to ``index_dir`` and swap it into place."""
+    tmp_dir = index_dir.with_name(index_dir.name + ".tmp")
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    tmp_dir.mkdir(parents=True)
+    for name, array in arrays.items():
+        np.save(tmp_dir / f"{name}.npy", array)
+    (tmp_dir / "meta.json").write_text(json.dumps(meta, ensure_ascii=False), encoding="utf-8")
+    (tmp_dir / "manifest.json").write_text(json.dumps(manifest, ensure_ascii=False, indent=1), encoding="utf-8")
+
+    old_dir = index_dir.with_name(index_dir.name + ".old")
+    shutil.rmtree(old_dir, ignore_errors=True)
+    if index_dir.exists():
+        index_dir.rename(old_dir)
+    tmp_dir.rename(index_dir)
+    shutil.rmtree(old_dir, ignore_errors=True)
+
+
+@contextmanager
+def index_lock(path: Path):
+    """Hold an exclusive lock on ``<path>.lock`` across processes."""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path.with_name(path.name + ".lock"), "w") as fh:
+        if fcntl is not None:
+            fcntl.flock(fh, fcntl.LOCK_EX)
+        yield
+
+
+def update_index(docs_dir: Path = DOCS_DIR, index_dir: Path = INDEX_DIR, rebuild: bool = False) -> DocIndex:
+    """Bring the on-disk index in line with ``docs_dir``.
+
+    Files whose mtime and size match the manifest are taken as unchanged,
+    others are hashed and only re-tokenized when their content differs.  The
+    postings of unchanged files are carried over from the current index
+    without reading the files again; removed files are simply dropped.
+    Concurrent updates from several processes are serialised by a lock file.
+    """
+    with index_lock(index_dir):
+        return _update_index(Path(docs_dir), Path(index_dir), rebuild)
+
+
+def _update_index(docs_dir: Path, index_dir: Path, rebuild: bool) -> DocIndex:
+    old: DocIndex | None = None
+    if not rebuild:
+        try:
+            old = DocIndex(index_dir)
+        except (OSError, ValueError, KeyError) as exc:
+            logging.info("Building document index: %s", exc)
+    manifest = old.manifest if old is not None else {}
+
+    new_manifest: dict[str, dict] = {}
+    changed: set[str] = set()
+    for rel, (mtime_ns, size) in _scan_sources(docs_dir).items():
+        entry = manifest.get(rel)
+        if entry and (entry["mtime_ns"], entry["size"]) == (mtime_ns, size):
+            new_manifest[rel] = entry
+            continue
+        try:
+            digest = _file_hash(docs_dir / rel)
+        except OSError as exc:
+            logging.warning("Skipping %s: %s", rel, exc)
+            continue
+        new_manifest[rel] = {"mtime_ns": mtime_ns, "size": size, "sha256": digest}
+        if entry and entry["sha256"] == digest:
+            new_manifest[rel].update(start=entry["start"], end=entry["end"])
+        else:
+            changed.add(rel)
+    if old is not None and new_manifest == manifest:
+        return old
+
+    remap = np.full(len(old) if old is not None else 0, -1, dtype=np.int64)
+    text_parts, length_parts, norm_parts, gram_norm_parts = [], [], [], []
+    postings: dict[str, list[tuple[int, int]]] = {}
+    gram_postings: dict[str, list[tuple[int, int]]] = {}
+    pid = 0
+    for rel, entry in new_manifest.items():
+        start = pid
+        if rel in changed:
+            encoded = []
+            norms, gram_norms = [], []
+            for chunk in _read_chunks(docs_dir / rel):
+                for vec, plists, lengths in ((_vec(chunk), postings, norms), (_trigrams(chunk), gram_postings, gram_norms)):
+                    lengths.append(sum(vec.values()))
+                    for term, count in vec.items():
+                        plists.setdefault(term, []).append((pid, count))
+                encoded.append(chunk.encode("utf-8"))
+                pid += 1
+            text_parts.append(np.frombuffer(b"".join(encoded), dtype=np.uint8))
+            length_parts.append(np.array([len(b) for b in encoded], dtype=np.int64))
+            norm_parts.append(np.array(norms, dtype=np.int32))
+            gram_norm_parts.append(np.array(gram_norms, dtype=np.int32))
+        else:
+            old_start, old_end = entry["start"], entry["end"]
+            remap[old_start:old_end] = np.arange(pid, pid + old_end - old_start)
+            text_parts.append(old.text[old.offsets[old_start]:old.offsets[old_end]])
+            length_parts.append(np.diff(old.offsets[old_start:old_end + 1]))
+            norm_parts.append(old.norms[old_start:old_end])
+            gram_norm_parts.append(old.gram_norms[old_start:old_end])
+            pid += old_end - old_start
+        new_manifest[rel] = {**entry, "start": start, "end": pid}
+
+    if old is not None:
+        old_words = (old.terms, old.indptr, old.indices, old.counts)
+        old_grams = (old.grams, old.gram_indptr, old.gram_indices, old.gram_counts)
+    else:
+        old_words = old_grams = None
+    vocab, indptr, indices, counts = _merge_postings(old_words, remap, postings)
+    grams, gram_indptr, gram_indices, gram_counts = _merge_postings(old_grams, remap, gram_postings)
+
+    offsets = np.zeros(pid + 1, dtype=np.int64)
+    np.cumsum(np.concatenate([np.empty(0, dtype=np.int64)] + length_parts), out=offsets[1:])
+    norms = np.concatenate([np.empty(0, dtype=np.int32)] + norm_parts)
+    arrays = {
+        "indptr": indptr,
+        "indices": indices,
+        "counts": counts,
+        "weights": _bm25_weights(indices, counts, norms),
+        "norms": norms,
+        "gram_indptr": gram_indptr,
+        "gram_indices": gram_indices,
+        "gram_counts": gram_counts,
+        "gram_norms": np.concatenate([np.empty(0, dtype=np.int32)] + gram_norm_parts),
+        "offsets": offsets,
+        "text": np.concatenate([np.empty(0, dtype=np.uint8)] + text_parts),
+    }
+    meta = {"format": INDEX_FORMAT, "vocab": vocab, "grams": grams}
+    _write_index(index_dir, meta, new_manifest, arrays)
+    logging.info(
+        "Indexed %d chunks from %d files into %s (%d re-tokenized)",
+        pid, len(new_manifest), index_dir, len(changed),
+    )
+    return DocIndex(index_dir)
+
+
+def build_index(docs_dir: Path = DOCS_DIR, index_dir: Path = INDEX_DIR) -> DocIndex:
+    """Tokenize every chunk under ``docs_dir`` and write the index to ``index_dir``."""
+    return update_index(docs_dir, index_dir, rebuild=True)
+
+
+_INDEX: DocIndex | None = None
+
+
+def load_index(docs_dir: Path = DOCS_DIR, index_dir: Path = INDEX_DIR) -> DocIndex:
+    """Open the on-disk index, applying any changes made to the docs since."""
+    return update_index(docs_dir, index_dir)
+
+
+def _index_stamp(index_dir: Path = INDEX_DIR) -> int | None:
+    try:
+        return (index_dir / "manifest.json").stat().st_mtime_ns
+    except OSError:
+        return None
+
+
+def get_index() -> DocIndex:
+    """Return the process-wide index, loading it on first use.
+
+    If another process (the API server's docs watcher, ``--rebuild``) has
+    replaced the index on disk since, the new one is opened instead.
+    """
+    global _INDEX
+    if _INDEX is None:
+        _INDEX = load_index()
+    elif _index_stamp(_INDEX.index_dir) not in (None, _INDEX.stamp):
+        try:
+            _INDEX = DocIndex(_INDEX.index_dir)
+        except (OSError, ValueError, KeyError) as exc:
+            logging.warning("Could not reopen document index: %s", exc)
+    return _INDEX
+
+
+def reload_index() -> DocIndex:
+    """Rebuild the index from ``DOCS_DIR`` and swap it in."""
+    global _INDEX
+    _INDEX = build_index()
+    return _INDEX
+
+
+def refresh_index() -> bool:
+    """Re-index changed docs and swap the result in; return ``True`` if the
+    indexed text changed.
+
+    The current index object is kept while the manifest on disk is
+    untouched, so a no-op poll does not force ``doc_embed`` to resync.
+    """
+    global _INDEX
+    index = load_index()
+    if _INDEX is not None and index.stamp == _INDEX.stamp:
+        return False
+    changed = _INDEX is None or index.version != _INDEX.version
+    _INDEX = index
+    return changed
+
+
+def watch_docs(interval: float, stop: threading.Event) -> None:
+    """Poll ``DOCS_DIR`` every ``interval`` seconds until ``stop`` is set."""
+    while not stop.wait(interval):
+        try:
+            if refresh_index():
+                logging.info("Document index refreshed")
+        except Exception:
+            logging.exception("Document index refresh failed")
+
+
+def _lexical(question: str, index: DocIndex, n: int) -> list[tuple[int, float]]:
+    """Return the ``n`` best ``(chunk id, BM25 score)`` pairs, best first."""
+    candidates, scores = index.bm25_scores(_vec(question))
+    top = np.argpartition(-scores, n - 1)[:n] if len(scores) > n else np.arange(len(scores))
+    top = top[np.lexsort((candidates[top], -scores[top]))]
+    return [(int(candidates[i]), float(scores[i])) for i in top]
+
+
+def _fuzzy(question: str, index: DocIndex, n: int) -> list[tuple[int, float]]:
+    """Match misspelt questions: shortlist chunks by trigram overlap, then
+    rank only the shortlist with ``SequenceMatcher``."""
+    candidates, dice = index.trigram_scores(_trigrams(question))
+    if len(candidates) > FUZZY_SHORTLIST:
+        keep = np.argpartition(-dice, FUZZY_SHORTLIST - 1)[:FUZZY_SHORTLIST]
+        candidates = candidates[keep]
+    query = fold(question)
+    scored = []
+    for pid in sorted(int(c) for c in candidates):
+        scored.append((pid, SequenceMatcher(None, query, fold(index.passage(pid))).ratio()))
+    scored.sort(key=lambda item: (-item[1], item[0]))
+    return [(pid, score) for pid, score in scored[:n] if score > 0]
+
+
+def _weak(question: str, index: DocIndex, ranked: list[tuple[int, float]]) -> bool:
+    """Whether the best lexical hit misses most of the (IDF-weighted)
+    topical terms of ``question``."""
+    if not ranked:
+        return True
+    weights = {term: index.idf(term) for term in set(words(question)) - FILLER_WORDS}
+    matched = weights.keys() & set(words(index.passage(ranked[0][0])))
+    return sum(weights[term] for term in matched) < FUZZY_COVERAGE * sum(weights.values())
+
+
+def _fuse(*rankings: list[tuple[int, float]]) -> list[tuple[int, float]]:
+    """Reciprocal rank fusion; scores are comparable across retrievers."""
+    fused: dict[int, float] = {}
+    for ranking in rankings:
+        for rank, (pid, _) in enumerate(ranking):
+            fused[pid] = fused.get(pid, 0.0) + 1.0 / (RRF_K + rank + 1)
+    return sorted(fused.items(), key=lambda item: (-item[1], item[0]))
+
+
+def search(question: str, k: int | None = None, index: DocIndex | None = None, mode: str | None = None):
+    """Rank document chunks for ``question``.
+
+    ``mode`` is ``"lexical"`` (BM25), ``"dense"`` (embedding similarity, see
+    ``doc_embed``) or ``"hybrid"`` (both, fused by reciprocal rank) and
+    defaults to ``retrieval.mode`` in ``config.yaml``; dense modes fall back
+    to BM25 when no embedding backend is available.  With ``k`` given,
+    return up to ``k`` :class:`Passage` objects, best first.  Without it,
+    return the text of the best chunk (or ``None``).  When the best BM25 hit
+    covers few of the question's topical terms, fuzzy matches are fused in
+    (or used alone if BM25 found nothing).
+    """
+    if index is None:
+        index = get_index()
+    mode = mode or RETRIEVAL_MODE
+    limit = 1 if k is None else k
+    dense = None
+    if mode in ("dense", "hybrid"):
+        import doc_embed
+
+        dense = doc_embed.dense_search(index, question, limit if mode == "dense" else FUSION_DEPTH)
+    if mode == "dense" and dense is not None:
+        ranked = dense
+    else:
+        ranked = _lexical(question, index, limit if dense is None else FUSION_DEPTH)
+        if _weak(question, index, ranked):
+            # Likely misspelt: fuse in the closest fuzzy matches, or fall
+            # back to them when no term matched at all
+            fuzzy = _fuzzy(question, index, FUZZY_SHORTLIST)
+            ranked = _fuse(ranked, fuzzy) if ranked else fuzzy
+        if dense is not None:
+            ranked = _fuse(ranked, dense)
+    hits = [Passage(index.passage(pid), score, index.source(pid)) for pid, score in ranked[:limit]]
+    if k is None:
+        return hits[0].text if hits else None
+    return hits
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Search the local documents")
+    parser.add_argument("question", nargs="?", help="Question to search for")
+    parser.add_argument("-k", type=int, default=3, help="Number of passages to show")
+    parser.add_argument("--mode", choices=["lexical", "dense", "hybrid"], help="Retrieval mode")
+    parser.add_argument("--rebuild", action="store_true", help="Rebuild the document index")
+    args = parser.parse_args()
+
+    if args.rebuild:
+        index = reload_index()
+        print(f"{len(index)} parca indekslendi: {INDEX_DIR}")
+    if args.question:
+        for hit in search(args.question, k=args.k, mode=args.mode):
+            print(f"[{hit.score:.3f}] {hit.source}: {hit.text}")
+    elif not args.rebuild:
+        parser.error("question or --rebuild is required")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,379 @@
+"""Find known fault codes in a question before it reaches the LLM.
+
+Codes and their aliases from ``fault_knowledge.json`` are compiled into an
+Aho–Corasick automaton over folded words, so one pass over the question
+finds every code regardless of how many are known, and only whole words
+match ("135" does not match "1350").  Short alphanumeric codes are also
+looked up with spaces, dashes and leading zeros removed, so speech-to-text
+output such as "E 12", "kod 0135" or "kod135" still finds "E-12" and "135";
+two separate numbers ("zone 2 12", "1 35 dakika") are never joined.
+
+Large vendor catalogues are compiled once (``python src/fault_matcher.py
+--build``) into an indexed SQLite file keyed by brand and code.
+:class:`FaultStore` answers the same queries from that file by looking up
+the word n-grams of the question, so nothing is parsed at startup and the
+file is only opened (memory-mapped) on the first lookup.
+"""
+
+from __future__ import annotations
+
+from collections import deque
+from dataclasses import dataclass, field
+from functools import lru_cache
+from pathlib import Path
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+
+from config import load_config
+from text_normalize import fold, words
+
+CFG = load_config()
+ROOT_DIR = Path(__file__).resolve().parent.parent
+KNOWLEDGE_PATH = ROOT_DIR / CFG.get("paths", {}).get("fault_db", "fault_knowledge.json")
+FAULT_INDEX_PATH = ROOT_DIR / CFG.get("paths", {}).get("fault_index", "fault_knowledge.db")
+FAULT_INDEX_FORMAT = 1
+# Codes up to this many characters are also matched in compact form
+COMPACT_MAX = 12
+_NON_ALNUM_RE = re.compile(r"[\W_]+")
+# Words that may be glued to a spoken code ("kod135")
+_MARKER_RE = re.compile(r"^(?:kod|code|hata|error|err|ariza|alarm)(\d\w*)$")
+
+
+@dataclass
+class FaultEntry:
+    code: str
+    description: str
+    aliases: list[str] = field(default_factory=list)
+    brand: str = ""
+
+
+def _read_entries(path: Path) -> list[FaultEntry]:
+    with open(path, "r", encoding="utf-8") as fh:
+        data = json.load(fh)
+    return [
+        FaultEntry(str(item["code"]), item["description"], list(item.get("aliases", [])), item.get("brand", ""))
+        for item in data
+    ]
+
+
+def _compact(text: str) -> str:
+    """``fold`` without separators and with leading zeros of numbers removed."""
+    return _NON_ALNUM_RE.sub("", fold(text)).lstrip("0") or "0"
+
+
+def _compact_keys(tokens: list[str]):
+    """Yield ``(start, compact form)`` for the parts of a question that may
+    be a code split or padded by speech-to-text: single words with a digit
+    ("0135", "e12", the code in "kod135"), then a letter prefix followed by
+    a word with a digit ("e 12")."""
+    for start, token in enumerate(tokens):
+        if any(c.isdigit() for c in token):
+            yield start, _compact(token)
+            marked = _MARKER_RE.match(token)
+            if marked:
+                yield start, _compact(marked.group(1))
+    for start in range(len(tokens) - 1):
+        prefix, rest = tokens[start], tokens[start + 1]
+        if prefix.isalpha() and any(c.isdigit() for c in rest):
+            yield start, _compact(prefix + rest)
+
+
+class FaultMatcher:
+    """Aho–Corasick automaton over the words of fault codes and aliases."""
+
+    def __init__(self, entries: list[FaultEntry]):
+        self.entries = entries
+        self._goto: list[dict[str, int]] = [{}]
+        # Longest pattern ending at each node (itself or via failure links):
+        # (entry index, pattern length in words), or None
+        self._out: list[tuple[int, int] | None] = [None]
+        self._compact: dict[str, int] = {}
+        for idx, entry in enumerate(entries):
+            for pattern in [entry.code, *entry.aliases]:
+                self._add(pattern, idx)
+            if any(c.isdigit() for c in entry.code) and len(entry.code) <= COMPACT_MAX:
+                self._compact.setdefault(_compact(entry.code), idx)
+        self._fail = self._link()
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def _add(self, pattern: str, idx: int) -> None:
+        tokens = words(pattern)
+        if not tokens:
+            return
+        node = 0
+        for token in tokens:
+            nxt = self._goto[node].get(token)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[node][token] = nxt
+                self._goto.append({})
+                self._out.append(None)
+            node = nxt
+        if self._out[node] is None:
+            self._out[node] = (idx, len(tokens))
+
+    def _link(self) -> list[int]:
+        fail = [0] * len(self._goto)
+        todo = deque(self._goto[0].values())
+        while todo:
+            node = todo.popleft()
+            for token, child in self._goto[node].items():
+                state = fail[node]
+                while state and token not in self._goto[state]:
+                    state = fail[state]
+                fail[child] = self._goto[state].get(token, 0)
+                if self._out[child] is None:
+                    self._out[child] = self._out[fail[child]]
+                todo.append(child)
+        return fail
+
+    def match(self, text: str) -> FaultEntry | None:
+        """Return the entry of the longest code in ``text`` (first on ties)."""
+        tokens = words(text)
+        best: tuple[int, int] | None = None  # (length, -start) of the best hit
+        best_idx = -1
+        state = 0
+        for pos, token in enumerate(tokens):
+            while state and token not in self._goto[state]:
+                state = self._fail[state]
+            state = self._goto[state].get(token, 0)
+            out = self._out[state]
+            if out is not None:
+                idx, length = out
+                key = (length, -(pos - length + 1))
+                if best is None or key > best:
+                    best, best_idx = key, idx
+        if best_idx >= 0:
+            return self.entries[best_idx]
+        # Codes split or padded by speech-to-text ("e 12", "0135")
+        for _, key in _compact_keys(tokens):
+            idx = self._compact.get(key)
+            if idx is not None:
+                return self.entries[idx]
+        return None
+
+    @classmethod
+    def from_json(cls, path: Path) -> "FaultMatcher":
+        if not Path(path).exists():
+            return cls([])
+        return cls(_read_entries(Path(path)))
+
+
+_SCHEMA = (
+    "CREATE TABLE meta (name TEXT PRIMARY KEY, value TEXT NOT NULL)",
+    "CREATE TABLE faults (id INTEGER PRIMARY KEY, brand TEXT NOT NULL, code TEXT NOT NULL, "
+    "description TEXT NOT NULL, UNIQUE (brand, code))",
+    # ``key`` is a folded word sequence, or "#" + compact code
+    "CREATE TABLE patterns (key TEXT NOT NULL, words INTEGER NOT NULL, fault_id INTEGER NOT NULL)",
+    "CREATE TABLE brands (key TEXT PRIMARY KEY)",
+)
+
+
+def build_fault_index(sources: list[Path], db_path: Path = FAULT_INDEX_PATH) -> int:
+    """Compile JSON fault catalogues into the SQLite file read by ``FaultStore``.
+
+    Entries are keyed by brand and code; a later source overrides an earlier
+    one.  The path and mtime of every source are stored so that
+    ``get_matcher`` can tell when the file is out of date.  Returns the
+    number of entries.
+    """
+    entries: dict[tuple[str, str], FaultEntry] = {}
+    stamps = []
+    for source in sources:
+        source = Path(source).resolve()
+        stamps.append((str(source), source.stat().st_mtime_ns))
+        for entry in _read_entries(source):
+            entries[(entry.brand, entry.code)] = entry
+    patterns = []
+    max_words = 1
+    for fault_id, entry in enumerate(entries.values()):
+        for alias in [entry.code, *entry.aliases]:
+            tokens = words(alias)
+            if tokens:
+                patterns.append((" ".join(tokens), len(tokens), fault_id))
+                max_words = max(max_words, len(tokens))
+        if any(c.isdigit() for c in entry.code) and len(entry.code) <= COMPACT_MAX:
+            patterns.append(("#" + _compact(entry.code), 0, fault_id))
+
+    db_path = Path(db_path)
+    tmp = db_path.with_name(db_path.name + ".tmp")
+    tmp.unlink(missing_ok=True)
+    conn = sqlite3.connect(tmp)
+    try:
+        for statement in _SCHEMA:
+            conn.execute(statement)
+        conn.executemany(
+            "INSERT INTO faults VALUES (?, ?, ?, ?)",
+            [(i, e.brand, e.code, e.description) for i, e in enumerate(entries.values())],
+        )
+        conn.executemany("INSERT INTO patterns VALUES (?, ?, ?)", patterns)
+        conn.execute("CREATE INDEX patterns_key ON patterns(key)")
+        conn.executemany(
+            "INSERT OR IGNORE INTO brands VALUES (?)",
+            [(" ".join(words(brand)),) for brand, _ in entries if brand],
+        )
+        conn.executemany(
+            "INSERT INTO meta VALUES (?, ?)",
+            [
+                ("format", str(FAULT_INDEX_FORMAT)),
+                ("max_words", str(max_words)),
+                ("sources", json.dumps(stamps)),
+            ],
+        )
+        conn.commit()
+    finally:
+        conn.close()
+    tmp.replace(db_path)
+    return len(entries)
+
+
+class FaultStore:
+    """Fault lookups served from a compiled SQLite catalogue.
+
+    The file is opened lazily, read-only and memory-mapped; each thread
+    keeps its own connection.  ``match`` checks every word n-gram of the
+    question (up to the longest pattern) with one indexed query and applies
+    the same rules as :class:`FaultMatcher`; when a code exists for several
+    brands, the brand named in the question wins.
+    """
+
+    def __init__(self, db_path: Path = FAULT_INDEX_PATH):
+        self.db_path = Path(db_path)
+        self._local = threading.local()
+        self._max_words: int | None = None
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(f"file:{self.db_path}?mode=ro", uri=True, check_same_thread=False)
+            conn.execute("PRAGMA mmap_size=268435456")
+            self._local.conn = conn
+            if self._max_words is None:
+                meta = dict(conn.execute("SELECT name, value FROM meta"))
+                if int(meta.get("format", 0)) != FAULT_INDEX_FORMAT:
+                    raise ValueError(f"Unsupported fault index format: {meta.get('format')}")
+                self._max_words = int(meta["max_words"])
+        return conn
+
+    def __len__(self) -> int:
+        return self._connect().execute("SELECT COUNT(*) FROM faults").fetchone()[0]
+
+    def get(self, code: str, brand: str = "") -> FaultEntry | None:
+        """Look up one entry by brand and code."""
+        row = self._connect().execute(
+            "SELECT code, description, brand FROM faults WHERE brand = ? AND code = ?", (brand, code)
+        ).fetchone()
+        return FaultEntry(row[0], row[1], brand=row[2]) if row else None
+
+    def match(self, text: str) -> FaultEntry | None:
+        """Return the entry of the longest code in ``text`` (first on ties)."""
+        conn = self._connect()
+        tokens = words(text)
+        # Candidate key -> rank of its position (compact keys after words)
+        first: dict[str, int] = {}
+        for size in range(self._max_words, 0, -1):
+            for start in range(len(tokens) - size + 1):
+                first.setdefault(" ".join(tokens[start:start + size]), start)
+        ngrams = list(first)
+        for rank, (_, key) in enumerate(_compact_keys(tokens)):
+            first.setdefault("#" + key, len(tokens) + rank)
+        rows = self._select(
+            conn,
+            "SELECT p.key, p.words, f.code, f.description, f.brand FROM patterns p "
+            "JOIN faults f ON f.id = p.fault_id WHERE p.key IN ({})",
+            list(first),
+        )
+        if not rows:
+            return None
+        named = {row[0] for row in self._select(conn, "SELECT key FROM brands WHERE key IN ({})", ngrams)}
+        _, _, code, description, brand = max(
+            rows,
+            key=lambda row: (row[1] > 0, row[1], -first[row[0]], " ".join(words(row[4])) in named, not row[4]),
+        )
+        return FaultEntry(code, description, brand=brand)
+
+    @staticmethod
+    def _select(conn: sqlite3.Connection, sql: str, keys: list[str]) -> list[tuple]:
+        rows = []
+        for start in range(0, len(keys), 500):
+            chunk = keys[start:start + 500]
+            rows += conn.execute(sql.format(",".join("?" * len(chunk))), chunk).fetchall()
+        return rows
+
+
+def _index_is_fresh(db_path: Path, source: Path) -> bool:
+    """Whether ``db_path`` was compiled from ``source`` and no catalogue it
+    was compiled from has changed since."""
+    try:
+        conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+        try:
+            row = conn.execute("SELECT value FROM meta WHERE name = 'sources'").fetchone()
+        finally:
+            conn.close()
+    except sqlite3.Error:
+        return False
+    if row is None:
+        return False
+    stamps = dict(json.loads(row[0]))
+    if source.exists() and str(source.resolve()) not in stamps:
+        return False
+    for path, mtime_ns in stamps.items():
+        try:
+            if os.stat(path).st_mtime_ns != mtime_ns:
+                return False
+        except OSError:
+            # A removed vendor catalogue is still in the index
+            continue
+    return True
+
+
+@lru_cache(maxsize=4)
+def get_matcher(path: Path = KNOWLEDGE_PATH, index_path: Path = FAULT_INDEX_PATH) -> FaultMatcher | FaultStore:
+    """Return the fault matcher, preferring the compiled catalogue.
+
+    Falls back to compiling ``path`` in memory when the SQLite index is
+    missing, was not compiled from ``path`` or any of its sources changed.
+    """
+    if _index_is_fresh(Path(index_path), Path(path)):
+        return FaultStore(Path(index_path))
+    if Path(index_path).exists():
+        logging.warning("%s is out of date for %s, run 'make faults'", index_path, path)
+    return FaultMatcher.from_json(Path(path))
+
+
+def fault_answer(text: str) -> str | None:
+    """Description of the known fault code mentioned in ``text``, if any."""
+    entry = get_matcher().match(text)
+    return entry.description if entry else None
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Look up or compile fault codes")
+    parser.add_argument("question", nargs="?", help="Text to look for a fault code in")
+    parser.add_argument("--build", nargs="*", metavar="JSON", help="Compile catalogues together with fault_db")
+    args = parser.parse_args()
+
+    if args.build is not None:
+        # The shipped file is always included and overrides vendor entries
+        sources = [Path(p) for p in args.build if Path(p).resolve() != KNOWLEDGE_PATH.resolve()]
+        if KNOWLEDGE_PATH.exists():
+            sources.append(KNOWLEDGE_PATH)
+        count = build_fault_index(sources)
+        print(f"{count} fault codes compiled into {FAULT_INDEX_PATH}")
+        return
+    if not args.question:
+        parser.error("question is required unless --build is given")
+    entry = get_matcher().match(args.question)
+    print(entry.description if entry else "Bilinen ariza kodu yok")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+"""Bounded priority queue feeding dedicated inference worker threads.
+
+Every worker thread owns one model context, so a ``Llama`` object is never
+used from two threads at once.  Jobs are taken lowest priority value first
+(interactive requests before bulk ones) and FIFO within a priority.  When
+the queue is full ``submit`` raises :class:`QueueFullError` instead of
+letting latency grow without bound.  Bulk jobs may not take the last
+``reserve`` slots, so interactive requests are still admitted while a large
+batch is waiting, and jobs cancelled before they start free their slot at
+once.
+"""
+
+from __future__ import annotations
+
+from concurrent.futures import Future
+from typing import Callable
+import itertools
+import logging
+import math
+import queue
+import threading
+import time
+
+INTERACTIVE = 0
+BULK = 10
+
+
+class QueueFullError(Exception):
+    """Raised when the inference queue cannot accept more work."""
+
+    def __init__(self, retry_after: int):
+        super().__init__(f"Inference queue full, retry after {retry_after}s")
+        self.retry_after = retry_after
+
+
+class InferenceScheduler:
+    """Run ``fn(context, *args)`` jobs on one worker thread per context."""
+
+    def __init__(
+        self,
+        contexts: list,
+        max_queue: int = 64,
+        on_wait: Callable[[float], None] | None = None,
+        reserve: int | None = None,
+    ):
+        self.workers = len(contexts)
+        self.max_queue = max_queue
+        # Slots only interactive jobs may use
+        self.reserve = min(max_queue - 1, max(1, max_queue // 8)) if reserve is None else reserve
+        # Admission is counted here; the queue itself is unbounded so that
+        # cancelled jobs can stay in it until a worker skips them
+        self._queue: queue.PriorityQueue = queue.PriorityQueue()
+        self._waiting: set[int] = set()
+        self._lock = threading.Lock()
+        self._seq = itertools.count()
+        self._on_wait = on_wait
+        self._stop = threading.Event()
+        # Exponentially weighted average job run time, used for Retry-After
+        self._service_time = 1.0
+        self._threads = [
+            threading.Thread(target=self._work, args=(ctx,), name=f"inference-{i}", daemon=True)
+            for i, ctx in enumerate(contexts)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def depth(self) -> int:
+        """Number of jobs waiting for a worker (cancelled ones excluded)."""
+        return len(self._waiting)
+
+    def capacity(self, priority: int = INTERACTIVE) -> int:
+        """Queue slots available to jobs of ``priority`` when idle."""
+        return self.max_queue - (self.reserve if priority > INTERACTIVE else 0)
+
+    def free(self, priority: int = INTERACTIVE) -> int:
+        """Queue slots jobs of ``priority`` could take right now."""
+        return max(0, self.capacity(priority) - self.depth())
+
+    def retry_after(self) -> int:
+        """Seconds until the current backlog is expected to drain."""
+        return max(1, math.ceil(self.depth() * self._service_time / max(self.workers, 1)))
+
+    def submit(self, fn: Callable, *args, priority: int = INTERACTIVE) -> Future:
+        """Queue ``fn`` and return a future for its result."""
+        return self.submit_many([(fn, args)], priority=priority)[0]
+
+    def submit_many(self, jobs: list[tuple[Callable, tuple]], priority: int = INTERACTIVE) -> list[Future]:
+        """Queue every ``(fn, args)`` job, or none of them if they do not
+        all fit in the free slots for ``priority``."""
+        if self._stop.is_set():
+            raise RuntimeError("Scheduler is closed")
+        now = time.monotonic()
+        with self._lock:
+            if len(jobs) > self.capacity(priority) - len(self._waiting):
+                raise QueueFullError(self.retry_after())
+            queued = [(next(self._seq), Future(), fn, args) for fn, args in jobs]
+            for seq, future, fn, args in queued:
+                self._waiting.add(seq)
+                self._queue.put_nowait((priority, seq, now, future, fn, args))
+        for seq, future, _, _ in queued:
+            # A job cancelled while waiting gives its slot back immediately
+            future.add_done_callback(lambda f, seq=seq: f.cancelled() and self._dequeued(seq))
+        return [future for _, future, _, _ in queued]
+
+    def _dequeued(self, seq: int) -> None:
+        with self._lock:
+            self._waiting.discard(seq)
+
+    def _work(self, ctx) -> None:
+        while not self._stop.is_set():
+            try:
+                _, seq, queued_at, future, fn, args = self._queue.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            self._dequeued(seq)
+            if not future.set_running_or_notify_cancel():
+                continue
+            started = time.monotonic()
+            if self._on_wait:
+                self._on_wait(started - queued_at)
+            try:
+                future.set_result(fn(ctx, *args))
+            except BaseException as exc:
+                logging.debug("Inference job failed: %s", exc)
+                future.set_exception(exc)
+            self._service_time = 0.8 * self._service_time + 0.2 * (time.monotonic() - started)
+
+    def close(self) -> None:
+        """Stop the workers and cancel jobs that have not started."""
+        self._stop.set()
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            item[3].cancel()
@@ -0,0 +1,145 @@
+"""Parsed invoices cached by the SHA-256 of the file bytes.
+
+Entries are keyed by ``(digest, version)`` where ``version`` describes the
+parser that produced them (engine, model, templates), so upgrading the model
+or editing invoice2data templates never serves stale results.  Results are
+pickled (invoice2data returns dates and decimals) and zlib-compressed in a
+SQLite database in WAL mode, shared safely by several processes.  The
+table is capped at ``cache_max_entries`` rows; entries of other parser
+versions go first, then the oldest.
+"""
+
+from __future__ import annotations
+
+from pathlib import Path
+from typing import Iterable
+import hashlib
+import logging
+import pickle
+import sqlite3
+import threading
+import time
+import zlib
+
+from config import load_config
+
+CFG = load_config()
+DB_PATH = Path(__file__).resolve().parent.parent / CFG.get("paths", {}).get("invoice_cache", "invoice_cache.db")
+# Bytes read per ``update`` while hashing a file
+HASH_CHUNK = 1 << 20
+# Host parameters per ``IN (...)`` lookup, below SQLite's default limit
+SQL_VARIABLES = 500
+MAX_ENTRIES = int(CFG.get("invoice_parser", {}).get("cache_max_entries", 50_000))
+# Inserted rows between two checks of the row limit
+PRUNE_EVERY = 256
+
+
+def file_digest(path: str | Path) -> bytes:
+    """SHA-256 of the file contents, read in ``HASH_CHUNK`` blocks."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as fh:
+        while block := fh.read(HASH_CHUNK):
+            digest.update(block)
+    return digest.digest()
+
+
+def tree_fingerprint(root: str | Path | None) -> str:
+    """Short hash of the names, sizes and mtimes of the files under ``root``."""
+    if not root or not Path(root).is_dir():
+        return "none"
+    entries = sorted(
+        (str(p.relative_to(root)), p.stat().st_size, p.stat().st_mtime_ns)
+        for p in Path(root).rglob("*")
+        if p.is_file()
+    )
+    return hashlib.sha256(repr(entries).encode("utf-8")).hexdigest()[:16]
+
+
+class InvoiceCache:
+    """``(digest, version) -> result`` store; every thread has its own
+    connection."""
+
+    def __init__(self, db_path: Path = DB_PATH, max_entries: int = MAX_ENTRIES):
+        self.db_path = Path(db_path)
+        self.max_entries = max_entries
+        self._inserts = 0
+        self._local = threading.local()
+        self._connections: list[sqlite3.Connection] = []
+        self._lock = threading.Lock()
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        conn = self._connect()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS results (digest BLOB NOT NULL, version TEXT NOT NULL, "
+            "result BLOB NOT NULL, created REAL NOT NULL, PRIMARY KEY (digest, version))"
+        )
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30, check_same_thread=False)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            with self._lock:
+                self._connections.append(conn)
+        return conn
+
+    def get_many(self, digests: Iterable[bytes], version: str) -> dict[bytes, dict]:
+        """Cached results for the ``digests`` found under ``version``."""
+        digests = list(dict.fromkeys(digests))
+        found: dict[bytes, dict] = {}
+        conn = self._connect()
+        for start in range(0, len(digests), SQL_VARIABLES):
+            part = digests[start:start + SQL_VARIABLES]
+            rows = conn.execute(
+                f"SELECT digest, result FROM results WHERE version = ? AND digest IN ({','.join('?' * len(part))})",
+                [version, *part],
+            )
+            for digest, blob in rows:
+                try:
+                    found[bytes(digest)] = pickle.loads(zlib.decompress(blob))
+                except Exception as exc:
+                    logging.warning("Unreadable invoice cache entry: %s", exc)
+        return found
+
+    def get(self, digest: bytes, version: str) -> dict | None:
+        return self.get_many([digest], version).get(digest)
+
+    def set_many(self, items: Iterable[tuple[bytes, dict]], version: str) -> None:
+        now = time.time()
+        rows = [(digest, version, zlib.compress(pickle.dumps(result)), now) for digest, result in items]
+        if not rows:
+            return
+        conn = self._connect()
+        with conn:
+            conn.executemany("INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?)", rows)
+        with self._lock:
+            before = self._inserts
+            self._inserts += len(rows)
+            due = self._inserts // PRUNE_EVERY > before // PRUNE_EVERY
+        if due:
+            self.prune(version)
+
+    def prune(self, version: str = "") -> int:
+        """Drop rows over ``max_entries``: those not of ``version`` first,
+        then the oldest.  Returns the number removed."""
+        conn = self._connect()
+        with conn:
+            (count,) = conn.execute("SELECT COUNT(*) FROM results").fetchone()
+            if count <= self.max_entries:
+                return 0
+            return conn.execute(
+                "DELETE FROM results WHERE rowid IN "
+                "(SELECT rowid FROM results ORDER BY version = ?, created, rowid LIMIT ?)",
+                (version, count - self.max_entries),
+            ).rowcount
+
+    def set(self, digest: bytes, version: str, result: dict) -> None:
+        self.set_many([(digest, result)], version)
+
+    def close(self) -> None:
+        with self._lock:
+            connections, self._connections = self._connections, []
+        for conn in connections:
+            conn.close()
+        self._local = threading.local()
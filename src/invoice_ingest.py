@@ -0,0 +1,324 @@
+"""Invoice ingestion service: inbox directory -> SQLite queue -> outbox JSON.
+
+``python src/invoice_ingest.py`` polls the inbox, enqueues every new file
+once its size has stopped changing, and parses queued files with a single
+:class:`~invoice_parser.InvoiceParser` whose ``parse_many`` spreads each
+batch over its Tesseract worker processes (or one Donut batch).  Results are
+written atomically to ``<outbox>/<file name>.json``; files that keep failing
+get ``<file name>.error.json`` after ``max_attempts`` tries.  The queue
+survives restarts, and a file is parsed again only if its size or mtime
+changes.  Throughput and backlog are exported as Prometheus metrics when
+``metrics_port`` is set, and ``--status`` prints them from the queue.
+"""
+
+from __future__ import annotations
+
+from pathlib import Path
+import json
+import logging
+import os
+import signal
+import sqlite3
+import sys
+import threading
+import time
+
+from config import load_config
+
+try:
+    from prometheus_client import Counter, Gauge, Histogram, start_http_server
+    METRICS_AVAILABLE = True
+except Exception:  # pragma: no cover - optional dependency
+    METRICS_AVAILABLE = False
+
+CFG = load_config()
+ROOT_DIR = Path(__file__).resolve().parent.parent
+SETTINGS = CFG.get("invoice_ingest", {})
+INBOX = ROOT_DIR / SETTINGS.get("inbox", "inbox")
+OUTBOX = ROOT_DIR / SETTINGS.get("outbox", "outbox")
+QUEUE_PATH = ROOT_DIR / CFG.get("paths", {}).get("invoice_queue", "invoice_queue.db")
+# Seconds between inbox scans when the queue is empty
+POLL_INTERVAL = float(SETTINGS.get("poll_interval", 2))
+# Files claimed from the queue per ``parse_many`` call
+CLAIM_BATCH = int(SETTINGS.get("batch_size", 32))
+MAX_ATTEMPTS = int(SETTINGS.get("max_attempts", 3))
+# 0 disables the Prometheus endpoint
+METRICS_PORT = int(SETTINGS.get("metrics_port", 0))
+
+if METRICS_AVAILABLE:
+    INGESTED = Counter("invoice_ingest_files", "Invoices taken off the queue", ["outcome"])
+    BACKLOG = Gauge("invoice_ingest_backlog", "Invoices waiting in the queue")
+    PARSE_SECONDS = Histogram("invoice_ingest_batch_seconds", "Time to parse one claimed batch")
+
+
+class InvoiceQueue:
+    """Persistent work queue of inbox files.
+
+    A file is identified by its path, size and mtime, so editing or
+    re-dropping it queues it again while unchanged files are never queued
+    twice.  Only one ingestion process should use a queue at a time.
+    """
+
+    def __init__(self, db_path: Path = QUEUE_PATH):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None, check_same_thread=False)
+        self._lock = threading.Lock()
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs (id INTEGER PRIMARY KEY, path TEXT NOT NULL, size INTEGER NOT NULL, "
+            "mtime_ns INTEGER NOT NULL, status TEXT NOT NULL DEFAULT 'pending', attempts INTEGER NOT NULL DEFAULT 0, "
+            "error TEXT, enqueued REAL NOT NULL, finished REAL, UNIQUE (path, size, mtime_ns))"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs(status, id)")
+
+    def recover(self) -> int:
+        """Requeue jobs left running by a process that died; those already
+        tried ``MAX_ATTEMPTS`` times (e.g. a file that crashes the parser)
+        are failed instead.  Returns the number requeued."""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            given_up = self._give_up("running")
+            requeued = self._conn.execute("UPDATE jobs SET status = 'pending' WHERE status = 'running'").rowcount
+            self._conn.execute("COMMIT")
+        if given_up:
+            logging.warning("Gave up on %d invoices that were being parsed when the service stopped", given_up)
+        return requeued
+
+    def _give_up(self, status: str) -> int:
+        return self._conn.execute(
+            "UPDATE jobs SET status = 'failed', error = COALESCE(error, 'Stopped while parsing'), finished = ? "
+            "WHERE status = ? AND attempts >= ?",
+            (time.time(), status, MAX_ATTEMPTS),
+        ).rowcount
+
+    def enqueue(self, files: list[tuple[str, int, int]]) -> int:
+        """Add ``(path, size, mtime_ns)`` entries; returns how many were new."""
+        now = time.time()
+        with self._lock:
+            before = self._conn.total_changes
+            self._conn.execute("BEGIN")
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO jobs (path, size, mtime_ns, enqueued) VALUES (?, ?, ?, ?)",
+                [(path, size, mtime, now) for path, size, mtime in files],
+            )
+            self._conn.execute("COMMIT")
+            return self._conn.total_changes - before
+
+    def claim(self, limit: int) -> list[tuple[int, str, int]]:
+        """Mark up to ``limit`` pending jobs running and return their
+        ``(id, path, attempt)``."""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            self._give_up("pending")
+            rows = self._conn.execute(
+                "SELECT id, path, attempts + 1 FROM jobs WHERE status = 'pending' ORDER BY id LIMIT ?", (limit,)
+            ).fetchall()
+            self._conn.executemany(
+                "UPDATE jobs SET status = 'running', attempts = attempts + 1 WHERE id = ?", [(r[0],) for r in rows]
+            )
+            self._conn.execute("COMMIT")
+        return rows
+
+    def finish(self, done: list[int], failed: list[tuple[int, str]]) -> None:
+        """Record a batch outcome; failed jobs are retried until their
+        ``MAX_ATTEMPTS``-th attempt."""
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN")
+            self._conn.executemany(
+                "UPDATE jobs SET status = 'done', error = NULL, finished = ? WHERE id = ?", [(now, i) for i in done]
+            )
+            self._conn.executemany(
+                "UPDATE jobs SET status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END, "
+                "error = ?, finished = ? WHERE id = ?",
+                [(MAX_ATTEMPTS, error, now, i) for i, error in failed],
+            )
+            self._conn.execute("COMMIT")
+
+    def known(self) -> set[tuple[str, int, int]]:
+        with self._lock:
+            return set(self._conn.execute("SELECT path, size, mtime_ns FROM jobs"))
+
+    def stats(self, window: float = 3600) -> dict:
+        """Job counts per status and files finished per minute over ``window``."""
+        with self._lock:
+            counts = dict(self._conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status"))
+            recent = self._conn.execute(
+                "SELECT COUNT(*) FROM jobs WHERE status IN ('done', 'failed') AND finished >= ?",
+                (time.time() - window,),
+            ).fetchone()[0]
+        counts = {status: counts.get(status, 0) for status in ("pending", "running", "done", "failed")}
+        return {**counts, "per_minute": round(recent / (window / 60), 2)}
+
+    def close(self) -> None:
+        self._conn.close()
+
+
+def _write_json(path: Path, data: dict) -> None:
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.write_text(json.dumps(data, ensure_ascii=False, indent=2, default=str), encoding="utf-8")
+    os.replace(tmp, path)
+
+
+class InvoiceIngestor:
+    """Moves invoices from ``inbox`` through the queue into ``outbox``."""
+
+    def __init__(self, inbox: Path = INBOX, outbox: Path = OUTBOX, queue: InvoiceQueue | None = None, parser=None):
+        self.inbox = Path(inbox)
+        self.outbox = Path(outbox)
+        self.queue = queue or InvoiceQueue()
+        self._parser = parser
+        # Sizes seen on the previous scan; a file is queued once it is stable
+        self._sizes: dict[str, tuple[int, int]] = {}
+        self._known = self.queue.known()
+        self.inbox.mkdir(parents=True, exist_ok=True)
+        self.outbox.mkdir(parents=True, exist_ok=True)
+
+    @property
+    def parser(self):
+        if self._parser is None:
+            from invoice_parser import InvoiceParser
+
+            self._parser = InvoiceParser(templates_dir=CFG.get("paths", {}).get("invoice_templates"))
+        return self._parser
+
+    def scan(self) -> int:
+        """Queue inbox files whose size and mtime did not change since the
+        previous scan (i.e. that are no longer being written)."""
+        sizes: dict[str, tuple[int, int]] = {}
+        stable = []
+        for entry in os.scandir(self.inbox):
+            if not entry.is_file() or entry.name.startswith("."):
+                continue
+            st = entry.stat()
+            sizes[entry.path] = (st.st_size, st.st_mtime_ns)
+            key = (entry.path, st.st_size, st.st_mtime_ns)
+            if key not in self._known and self._sizes.get(entry.path) == sizes[entry.path]:
+                stable.append(key)
+        self._sizes = sizes
+        added = self.queue.enqueue(stable) if stable else 0
+        self._known.update(stable)
+        if added:
+            logging.info("Queued %d new invoices", added)
+        return added
+
+    def process_batch(self) -> int:
+        """Parse one claimed batch; returns the number of jobs handled.
+
+        If the parser itself fails, every job of the batch without a result
+        yet counts as a failed attempt, so nothing is left ``running``.
+        """
+        jobs = self.queue.claim(CLAIM_BATCH)
+        if not jobs:
+            return 0
+        start = time.perf_counter()
+        done: list[int] = []
+        failed: list[tuple[int, str]] = []
+        given_up = 0
+        handled: set[int] = set()
+
+        def _fail(index: int, error: str) -> None:
+            nonlocal given_up
+            job_id, path, attempt = jobs[index]
+            failed.append((job_id, error))
+            handled.add(index)
+            if attempt >= MAX_ATTEMPTS:
+                given_up += 1
+                name = Path(path).name
+                try:
+                    _write_json(self.outbox / f"{name}.error.json", {"dosya": name, "hata": error})
+                except OSError as exc:
+                    logging.warning("Could not write error file for %s: %s", name, exc)
+
+        try:
+            for index, result in self.parser.parse_many([path for _, path, _ in jobs]):
+                if isinstance(result, Exception):
+                    _fail(index, str(result))
+                    continue
+                job_id, path, _ = jobs[index]
+                name = Path(path).name
+                _write_json(self.outbox / f"{name}.json", {"dosya": name, "sonuc": result})
+                done.append(job_id)
+                handled.add(index)
+        except Exception as exc:
+            logging.exception("Invoice batch failed")
+            for index in range(len(jobs)):
+                if index not in handled:
+                    _fail(index, f"{type(exc).__name__}: {exc}")
+        self.queue.finish(done, failed)
+        elapsed = time.perf_counter() - start
+        if METRICS_AVAILABLE:
+            INGESTED.labels("done").inc(len(done))
+            INGESTED.labels("retry").inc(len(failed) - given_up)
+            INGESTED.labels("failed").inc(given_up)
+            PARSE_SECONDS.observe(elapsed)
+        logging.info(
+            "Parsed %d invoices in %.1fs (%d failed, %d to retry)",
+            len(jobs), elapsed, given_up, len(failed) - given_up,
+        )
+        return len(jobs)
+
+    def _update_backlog(self) -> None:
+        if METRICS_AVAILABLE:
+            BACKLOG.set(self.queue.stats()["pending"])
+
+    def run(self, once: bool = False, stop: threading.Event | None = None) -> None:
+        """Scan and drain the queue until ``stop`` is set.
+
+        With ``once`` the inbox is scanned twice (to see stable sizes), the
+        queue drained, and the method returns.
+        """
+        stop = stop or threading.Event()
+        self.queue.recover()
+        if once:
+            self.scan()
+            self.scan()
+        while not stop.is_set():
+            self._update_backlog()
+            if self.process_batch():
+                # Keep draining but still notice new files between batches
+                if not once:
+                    self.scan()
+                continue
+            if once:
+                break
+            stop.wait(POLL_INTERVAL)
+            self.scan()
+        self._update_backlog()
+        if self._parser is not None and hasattr(self._parser, "close"):
+            self._parser.close()
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Fatura gelen kutusunu izleyip JSON sonuc uretir")
+    parser.add_argument("--inbox", default=str(INBOX), help="Izlenen klasor")
+    parser.add_argument("--outbox", default=str(OUTBOX), help="JSON sonuclarin yazildigi klasor")
+    parser.add_argument("--once", action="store_true", help="Mevcut dosyalari isle ve cik")
+    parser.add_argument("--status", action="store_true", help="Kuyruk durumunu yazdir")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+
+    queue = InvoiceQueue()
+    # Exit through the normal path; running jobs are requeued on next start
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    if args.status:
+        print(json.dumps(queue.stats(), ensure_ascii=False))
+        return
+    if METRICS_PORT and METRICS_AVAILABLE:
+        start_http_server(METRICS_PORT)
+        logging.info("Metrics on :%d/metrics", METRICS_PORT)
+    ingestor = InvoiceIngestor(Path(args.inbox), Path(args.outbox), queue)
+    try:
+        ingestor.run(once=args.once)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        queue.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""Tesseract OCR for invoice images, usable from worker processes.
+
+Kept apart from ``invoice_parser`` so that pool workers import only PIL and
+the Tesseract bindings, not torch and transformers.  With ``tesserocr``
+installed each worker keeps one Tesseract API instance resident; otherwise
+``pytesseract`` runs the ``tesseract`` binary per image.
+"""
+
+from __future__ import annotations
+
+from pathlib import Path
+import hashlib
+import importlib.util
+import os
+
+from PIL import Image
+import pytesseract
+
+# ``tesserocr`` is imported only where it is used: Tesseract's OpenMP
+# runtime reads ``OMP_THREAD_LIMIT`` when the library is loaded, so workers
+# must set it before the import
+TESSEROCR_AVAILABLE = importlib.util.find_spec("tesserocr") is not None
+
+_API = None
+
+
+def init_worker(lang: str) -> None:
+    """Pool initializer: one OCR thread per process, API kept resident."""
+    global _API
+    os.environ["OMP_THREAD_LIMIT"] = "1"
+    if TESSEROCR_AVAILABLE:
+        from tesserocr import PyTessBaseAPI
+
+        _API = PyTessBaseAPI(lang=lang)
+
+
+def ocr_image(image: Image.Image, lang: str) -> dict:
+    if _API is not None:
+        _API.SetImage(image)
+        text = _API.GetUTF8Text()
+    else:
+        text = pytesseract.image_to_string(image, lang=lang)
+    return {"text": text.strip()}
+
+
+def ocr_file(path: str, lang: str):
+    """OCR one file; errors are returned so one bad scan does not abort a
+    whole batch."""
+    try:
+        with Image.open(path) as image:
+            return ocr_image(image.convert("RGB"), lang)
+    except Exception as exc:
+        return exc
+
+
+def _tessdata_dirs() -> list[Path]:
+    dirs = [Path(p) for p in (os.getenv("TESSDATA_PREFIX"),) if p]
+    dirs += [d / "tessdata" for d in dirs]
+    if TESSEROCR_AVAILABLE:
+        try:
+            import tesserocr
+
+            dirs.append(Path(tesserocr.get_languages()[0]))
+        except Exception:
+            pass
+    for prefix in ("/usr/share", "/usr/local/share", "/opt/homebrew/share"):
+        dirs.append(Path(prefix) / "tessdata")
+        dirs += sorted(Path(prefix).glob("tesseract-ocr/*/tessdata"))
+    return dirs
+
+
+def traineddata_stamp(lang: str) -> str:
+    """Short hash of the size and mtime of each ``<lang>.traineddata`` used,
+    so replacing a language model invalidates cached results."""
+    stamps = []
+    for name in lang.split("+"):
+        for directory in _tessdata_dirs():
+            path = directory / f"{name}.traineddata"
+            if path.is_file():
+                st = path.stat()
+                stamps.append((str(path), st.st_size, st.st_mtime_ns))
+                break
+        else:
+            stamps.append((name, None, None))
+    return hashlib.sha256(repr(stamps).encode("utf-8")).hexdigest()[:12]
+
+
+def engine_version(lang: str) -> str:
+    """Identify the OCR engine and its language data for cache versioning."""
+    try:
+        if TESSEROCR_AVAILABLE:
+            import tesserocr
+
+            version = tesserocr.tesseract_version().splitlines()[0]
+        else:
+            version = f"tesseract {pytesseract.get_tesseract_version()}"
+    except Exception:
+        version = "tesseract unknown"
+    return f"{version}:{lang}@{traineddata_stamp(lang)}"
@@ -1,11 +1,21 @@
 import json
 import logging
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import lru_cache
+from itertools import islice
 from pathlib import Path
+from typing import Iterable, Iterator
 
 import torch
 from transformers import DonutProcessor, VisionEncoderDecoderModel
 from PIL import Image
-import pytesseract
+
+from config import load_config
+from invoice_cache import InvoiceCache, file_digest, tree_fingerprint
+from invoice_ocr import engine_version, init_worker, ocr_file
 
 try:
     from invoice2data import extract_data
@@ -14,75 +24,248 @@ try:
 except Exception:  # pragma: no cover - optional dependency
     INVOICE2DATA_AVAILABLE = False
 
+SETTINGS = load_config().get("invoice_parser", {})
+# Images decoded by one Donut ``generate`` call
+BATCH_SIZE = int(SETTINGS.get("batch_size", 8))
+# Run Donut on CPU instead of falling back to Tesseract
+DONUT_ON_CPU = bool(SETTINGS.get("donut_on_cpu", False))
+# Dynamic int8 quantisation of the Linear layers for the CPU path
+QUANTIZE_CPU = bool(SETTINGS.get("quantize_cpu", True))
+TESSERACT_LANG = SETTINGS.get("tesseract_lang", "eng")
+# Tesseract worker processes (0 = one per available CPU)
+TESSERACT_WORKERS = int(SETTINGS.get("tesseract_workers", 0))
+
+# Reuse earlier results for identical files (SHA-256 of the bytes)
+CACHE_RESULTS = bool(SETTINGS.get("cache", True))
+# Bump when parsing output changes so cached results are not reused
+PARSER_FORMAT = 1
+
+TASK_PROMPT = "<s_cord-v2>"
+# Spawn instead of fork: the parser may live in a threaded server process
+_MP = multiprocessing.get_context("spawn")
+
+
+def _available_cpus() -> int:
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:  # pragma: no cover - not available on macOS/Windows
+        return os.cpu_count() or 1
+
+
+@lru_cache(maxsize=2)
+def _load_donut(model_name: str, device: str, quantize: bool):
+    """Load Donut once per process; every ``InvoiceParser`` shares it."""
+    processor = DonutProcessor.from_pretrained(model_name)
+    model = VisionEncoderDecoderModel.from_pretrained(model_name)
+    model.eval()
+    if device == "cpu" and quantize:
+        model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+    model.to(device)
+    logging.info("Invoice parser ready with %s on %s%s", model_name, device, " (int8)" if quantize else "")
+    return processor, model
+
+
+@lru_cache(maxsize=1)
+def _shared_cache() -> InvoiceCache:
+    return InvoiceCache()
+
 
 class InvoiceParser:
-    """Extract structured info from invoice images using a Donut model."""
+    """Extract structured info from invoice images using a Donut model.
+
+    Donut runs on CUDA when available; on CPU it is used only if
+    ``donut_on_cpu`` is enabled (optionally int8-quantised), otherwise
+    Tesseract OCR is used.  :meth:`parse_many` batches images through Donut
+    or spreads Tesseract over a pool of worker processes.
+    """
 
-    def __init__(self, model_name="naver-clova-ix/donut-base", templates_dir: str | None = None):
-        self.use_donut = torch.cuda.is_available()
+    def __init__(
+        self,
+        model_name="naver-clova-ix/donut-base",
+        templates_dir: str | None = None,
+        donut_on_cpu: bool = DONUT_ON_CPU,
+        quantize: bool = QUANTIZE_CPU,
+        batch_size: int = BATCH_SIZE,
+        cache: InvoiceCache | bool = CACHE_RESULTS,
+    ):
+        self.device = "cuda" if torch.cuda.is_available() else "cpu"
+        self.use_donut = self.device == "cuda" or donut_on_cpu
+        self.batch_size = max(1, batch_size)
         self.templates = None
+        self._pool: ProcessPoolExecutor | None = None
         if INVOICE2DATA_AVAILABLE and templates_dir:
             try:
                 self.templates = read_templates(templates_dir)
             except Exception:
                 pass
         if self.use_donut:
-            self.processor = DonutProcessor.from_pretrained(model_name)
-            self.model = VisionEncoderDecoderModel.from_pretrained(model_name)
-            self.device = "cuda"
-            self.model.to(self.device)
-            logging.info(
-                "Invoice parser ready with %s on %s", model_name, self.device
+            if self.device == "cpu":
+                torch.set_num_threads(_available_cpus())
+            quantized = self.device == "cpu" and quantize
+            self.processor, self.model = _load_donut(model_name, self.device, quantized)
+            # Hub downloads carry their commit; a local checkpoint directory
+            # is identified by its files instead
+            revision = getattr(self.model.config, "_commit_hash", None) or tree_fingerprint(
+                model_name if Path(model_name).is_dir() else None
             )
+            engine = f"donut:{model_name}@{revision}{':int8' if quantized else ''}"
         else:
             logging.warning("CUDA not available, falling back to Tesseract")
-            self.device = "cpu"
+            engine = engine_version(TESSERACT_LANG)
+        templates = tree_fingerprint(templates_dir) if INVOICE2DATA_AVAILABLE else "none"
+        # Results are cached per parser configuration
+        self.version = f"{PARSER_FORMAT}|{engine}|{templates}"
+        self.cache = _shared_cache() if cache is True else cache or None
 
     def parse_invoice(self, image_path: str) -> dict:
         """Process an image or PDF file and return invoice info as JSON."""
-        path = Path(image_path)
-        if not path.exists():
-            raise FileNotFoundError(str(path))
-        if INVOICE2DATA_AVAILABLE and path.suffix.lower() == ".pdf":
+        _, result = next(self.parse_many([image_path]))
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    def parse_many(self, paths: Iterable[str]) -> Iterator[tuple[int, object]]:
+        """Yield ``(index, result)`` for every file in ``paths``, in order.
+
+        ``result`` is the parsed dict, or the exception raised for that file
+        (e.g. ``FileNotFoundError``).  Files are read lazily in chunks, so a
+        folder of any size is processed in bounded memory.
+        """
+        paths = iter(paths)
+        chunk_size = self.batch_size if self.use_donut else self.batch_size * self._workers()
+        start = 0
+        while True:
+            chunk = [Path(p) for p in islice(paths, chunk_size)]
+            if not chunk:
+                return
+            results = self._parse_chunk(chunk)
+            for offset, result in enumerate(results):
+                yield start + offset, result
+            start += len(chunk)
+
+    def _parse_chunk(self, chunk: list[Path]) -> list:
+        results: list = [None] * len(chunk)
+        digests: dict[int, bytes] = {}
+        for i, path in enumerate(chunk):
             try:
-                data = extract_data(str(path), templates=self.templates)
-                if data:
-                    return data
-            except Exception as e:  # pragma: no cover - optional dependency
-                logging.warning("invoice2data error: %s", e)
+                digests[i] = file_digest(path)
+            except OSError as exc:
+                results[i] = exc
+        if self.cache is not None:
+            cached = self.cache.get_many(digests.values(), self.version)
+            for i, digest in digests.items():
+                results[i] = cached.get(digest)
+        # Parse each distinct uncached file once
+        first: dict[bytes, int] = {}
+        duplicates: dict[int, int] = {}
+        for i, digest in digests.items():
+            if results[i] is None:
+                duplicates[i] = first.setdefault(digest, i)
+        todo = sorted(first.values())
+        self._parse_files(chunk, todo, results)
+        for i, j in duplicates.items():
+            if i != j:
+                results[i] = dict(results[j]) if isinstance(results[j], dict) else results[j]
+        if self.cache is not None:
+            self.cache.set_many(((digests[i], results[i]) for i in todo if isinstance(results[i], dict)), self.version)
+        return results
 
-        image = Image.open(image_path).convert("RGB")
+    def _parse_files(self, chunk: list[Path], todo: list[int], results: list) -> None:
+        images: list[int] = []
+        for i in todo:
+            path = chunk[i]
+            data = self._extract_pdf(path) if path.suffix.lower() == ".pdf" else None
+            if data:
+                results[i] = data
+            else:
+                images.append(i)
+        if not images:
+            return
         if self.use_donut:
-            task_prompt = "<s_cord-v2>"
-            decoder_input_ids = self.processor.tokenizer(
-                task_prompt, add_special_tokens=False, return_tensors="pt"
-            ).input_ids
+            parsed = self._donut_files([chunk[i] for i in images])
+        elif len(images) == 1:
+            parsed = [ocr_file(str(chunk[images[0]]), TESSERACT_LANG)]
+        else:
+            try:
+                parsed = list(self._tesseract_pool().map(
+                    ocr_file, [str(chunk[i]) for i in images], [TESSERACT_LANG] * len(images)
+                ))
+            except BrokenProcessPool as exc:
+                # A worker died (e.g. killed for memory); start a fresh pool
+                # for the next chunk and fail this one's images
+                logging.warning("Tesseract worker died, restarting the pool: %s", exc)
+                self._pool.shutdown(wait=False, cancel_futures=True)
+                self._pool = None
+                parsed = [exc] * len(images)
+        for i, result in zip(images, parsed):
+            results[i] = result
+
+    def _extract_pdf(self, path: Path) -> dict | None:
+        if not INVOICE2DATA_AVAILABLE:
+            return None
+        try:
+            return extract_data(str(path), templates=self.templates) or None
+        except Exception as e:  # pragma: no cover - optional dependency
+            logging.warning("invoice2data error: %s", e)
+            return None
 
-            pixel_values = self.processor(image, return_tensors="pt").pixel_values
+    def _donut_files(self, paths: list[Path]) -> list:
+        images, loaded, results = [], [], [None] * len(paths)
+        for i, path in enumerate(paths):
+            try:
+                with Image.open(path) as image:
+                    images.append(image.convert("RGB"))
+                loaded.append(i)
+            except Exception as exc:
+                results[i] = exc
+        if images:
+            try:
+                parsed = self._donut_batch(images)
+            except Exception as exc:
+                logging.warning("Donut batch failed: %s", exc)
+                parsed = [exc] * len(images)
+            for i, result in zip(loaded, parsed):
+                results[i] = result
+        return results
+
+    def _donut_batch(self, images: list[Image.Image]) -> list[dict]:
+        tokenizer = self.processor.tokenizer
+        decoder_input_ids = tokenizer(TASK_PROMPT, add_special_tokens=False, return_tensors="pt").input_ids
+        pixel_values = self.processor(images, return_tensors="pt").pixel_values
+        with torch.inference_mode():
             outputs = self.model.generate(
                 pixel_values.to(self.device),
-                decoder_input_ids=decoder_input_ids.to(self.device),
+                decoder_input_ids=decoder_input_ids.repeat(len(images), 1).to(self.device),
                 max_length=self.model.decoder.config.max_position_embeddings,
-                pad_token_id=self.processor.tokenizer.pad_token_id,
-                eos_token_id=self.processor.tokenizer.eos_token_id,
+                pad_token_id=tokenizer.pad_token_id,
+                eos_token_id=tokenizer.eos_token_id,
                 use_cache=True,
-                bad_words_ids=[[self.processor.tokenizer.unk_token_id]],
+                bad_words_ids=[[tokenizer.unk_token_id]],
                 return_dict_in_generate=True,
             )
+        return [
+            self._sequence_to_json(seq.replace(tokenizer.eos_token, "").replace(tokenizer.pad_token, "").strip())
+            for seq in self.processor.batch_decode(outputs.sequences)
+        ]
 
-            sequence = self.processor.batch_decode(outputs.sequences)[0]
-            sequence = (
-                sequence.replace(self.processor.tokenizer.eos_token, "")
-                .replace(self.processor.tokenizer.pad_token, "")
-                .strip()
+    def _workers(self) -> int:
+        return TESSERACT_WORKERS or _available_cpus()
+
+    def _tesseract_pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(
+                max_workers=self._workers(),
+                mp_context=_MP,
+                initializer=init_worker,
+                initargs=(TESSERACT_LANG,),
             )
+        return self._pool
 
-            result = self._sequence_to_json(sequence)
-            torch.cuda.empty_cache()
-            return result
-        else:
-            text = pytesseract.image_to_string(image, lang="eng")
-            return {"text": text.strip()}
+    def close(self) -> None:
+        """Stop the Tesseract worker processes, if any were started."""
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
 
     def _sequence_to_json(self, sequence: str) -> dict:
         try:
@@ -4,7 +4,7 @@ from __future__ import annotations
 
 from typing import Dict
 
-import jinja2
+from pdf_render import register_template, render
 
 REPORT_TEMPLATE = """
 Olay Sonrasi Sorumluluk Dagilimi
@@ -13,9 +13,9 @@ Olay Sonrasi Sorumluluk Dagilimi
 - **{{ key }}**: {{ value }}
 {% endfor %}
 """
+register_template("acil_durum", REPORT_TEMPLATE)
 
 
 def generate_emergency_report(details: Dict[str, str]) -> str:
     """Return a formatted text report."""
-    tpl = jinja2.Template(REPORT_TEMPLATE)
-    return tpl.render(details=details)
+    return render("acil_durum", details=details)
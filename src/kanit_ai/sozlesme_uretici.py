@@ -2,11 +2,9 @@
 
 from __future__ import annotations
 
-from pathlib import Path
 from typing import Iterable
 
-import jinja2
-import pdfkit
+from pdf_render import html_to_pdf, register_template, render, render_string
 
 DEFAULT_TEMPLATE = """
 <html><body>
@@ -16,12 +14,11 @@ DEFAULT_TEMPLATE = """
 </ol>
 </body></html>
 """
+register_template("sozlesme", DEFAULT_TEMPLATE)
 
 
 def create_contract(clauses: Iterable[str], output_pdf: str, template: str | None = None) -> None:
     """Create a PDF contract from clauses."""
-    tpl = jinja2.Template(template or DEFAULT_TEMPLATE)
-    html = tpl.render(clauses=list(clauses))
-    pdfkit.from_string(html, output_pdf)
-    if not Path(output_pdf).is_file():
-        raise RuntimeError("PDF could not be created")
+    clauses = list(clauses)
+    html = render_string(template, clauses=clauses) if template else render("sozlesme", clauses=clauses)
+    html_to_pdf(html, output_pdf)
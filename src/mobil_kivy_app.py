@@ -15,6 +15,7 @@ import datetime
 import threading
 
 from config import load_config
+from fault_matcher import fault_answer
 
 from speech_client import transcribe_mic
 from ask_llm import LLMClient
@@ -39,9 +40,6 @@ class MainWidget(BoxLayout):
         threading.Thread(target=self._process, daemon=True).start()
 
     def _process(self):
-        if not self.llm:
-            model_path = CFG.get("models", {}).get("llm", "models/finetuned-mistral.gguf")
-            self.llm = LLMClient(model_path)
         lang = CFG.get("language")
         text = transcribe_mic(lang=lang or "tr")
         if not lang:
@@ -64,6 +62,12 @@ class MainWidget(BoxLayout):
             items = ", ".join(f"{it['adet']} {it['urun']}" for it in q['kalemler'])
             return f"{items} toplam {q['toplam']} TL"
         self.last_quote = None
+        fault = fault_answer(text)
+        if fault:
+            return fault
+        if not self.llm:
+            model_path = CFG.get("models", {}).get("llm", "models/finetuned-mistral.gguf")
+            self.llm = LLMClient(model_path)
         answer = self.llm.ask(text)
         Cache.append('llm_responses', (text, answer))
         return answer
@@ -0,0 +1,164 @@
+"""Model contexts hosted in separate worker processes.
+
+Each worker process loads its own ``LLMClient``; the GGUF weights are
+memory-mapped, so all workers share one copy in the page cache.  The
+parent talks to a worker over a ``multiprocessing`` pipe through
+:class:`RemoteClient`, which has the same ``ask``/``generate`` methods (and
+their streaming variants) as ``LLMClient`` and can therefore be driven by the same
+:class:`~inference_queue.InferenceScheduler`: an idle worker thread takes
+the next queued prompt, so work always goes to a free (least-loaded)
+process.
+"""
+
+from __future__ import annotations
+
+from typing import Iterator
+import logging
+import multiprocessing
+import os
+
+from ask_llm import LLMClient, LLMError, answer_cache
+
+# Spawn instead of fork: the API server process already runs threads
+_MP = multiprocessing.get_context("spawn")
+
+
+def available_cpus() -> int:
+    """CPUs this process may run on (respects taskset/cgroup affinity)."""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:  # pragma: no cover - not available on macOS/Windows
+        return os.cpu_count() or 1
+
+
+def worker_threads(workers: int) -> int:
+    """Split the available CPUs evenly between ``workers`` model contexts."""
+    return max(1, available_cpus() // max(workers, 1))
+
+
+def _worker_main(conn, model_path: str, n_ctx: int, n_threads: int) -> None:
+    try:
+        client = LLMClient(model_path, n_ctx=n_ctx, n_threads=n_threads)
+    except Exception as exc:
+        conn.send(("error", str(exc)))
+        return
+    conn.send(("ready", None))
+    try:
+        _serve(conn, client)
+    finally:
+        # atexit handlers do not run in multiprocessing children
+        answer_cache.store.close()
+
+
+def _serve(conn, client: LLMClient) -> None:
+    while True:
+        try:
+            request = conn.recv()
+        except EOFError:
+            return
+        if request == "cancel":
+            # Arrived after the stream it was meant for had already finished
+            continue
+        method, prompt, max_tokens = request
+        try:
+            if method in ("ask", "generate"):
+                conn.send(("result", getattr(client, method)(prompt, max_tokens=max_tokens)))
+                continue
+            pieces = []
+            stream = getattr(client, method)(prompt, max_tokens=max_tokens)
+            for piece in stream:
+                pieces.append(piece)
+                conn.send(("token", piece))
+                if conn.poll() and conn.recv() == "cancel":
+                    stream.close()
+                    break
+            conn.send(("result", "".join(pieces)))
+        except Exception as exc:
+            conn.send(("error", str(exc)))
+
+
+class RemoteClient:
+    """``LLMClient`` look-alike whose model runs in a worker process.
+
+    Not thread-safe: like a ``Llama`` context it must be used by one thread
+    at a time, which the scheduler guarantees.
+    """
+
+    def __init__(self, model_path: str, n_ctx: int = 2048, n_threads: int = 4):
+        self.model_path = str(model_path)
+        self.n_ctx = n_ctx
+        self.n_threads = n_threads
+        self._start()
+
+    def _start(self) -> None:
+        self._conn, child = _MP.Pipe()
+        self._process = _MP.Process(
+            target=_worker_main,
+            args=(child, self.model_path, self.n_ctx, self.n_threads),
+            daemon=True,
+        )
+        self._process.start()
+        child.close()
+        kind, detail = self._conn.recv()
+        if kind != "ready":
+            self._process.join()
+            raise RuntimeError(f"Model worker failed to start: {detail}")
+        logging.info("Model worker %d ready (%d threads)", self._process.pid, self.n_threads)
+
+    def _recv(self):
+        try:
+            return self._conn.recv()
+        except (EOFError, OSError) as exc:
+            logging.error("Model worker %d died, restarting", self._process.pid)
+            self._start()
+            raise LLMError("Model worker crashed") from exc
+
+    def ask(self, prompt: str, max_tokens: int = 256) -> str:
+        return self._call("ask", prompt, max_tokens)
+
+    def generate(self, full_prompt: str, max_tokens: int = 256) -> str:
+        return self._call("generate", full_prompt, max_tokens)
+
+    def ask_stream(self, prompt: str, max_tokens: int = 256) -> Iterator[str]:
+        return self._stream("ask_stream", prompt, max_tokens)
+
+    def generate_stream(self, full_prompt: str, max_tokens: int = 256) -> Iterator[str]:
+        return self._stream("generate_stream", full_prompt, max_tokens)
+
+    def _call(self, method: str, prompt: str, max_tokens: int) -> str:
+        self._conn.send((method, prompt, max_tokens))
+        kind, value = self._recv()
+        if kind == "error":
+            raise LLMError(value)
+        return value
+
+    def _stream(self, method: str, prompt: str, max_tokens: int) -> Iterator[str]:
+        self._conn.send((method, prompt, max_tokens))
+        finished = False
+        try:
+            while True:
+                try:
+                    kind, value = self._recv()
+                except LLMError:
+                    finished = True
+                    raise
+                if kind == "token":
+                    yield value
+                elif kind == "error":
+                    finished = True
+                    raise LLMError(value)
+                else:
+                    finished = True
+                    return
+        finally:
+            if not finished:
+                # The consumer stopped early: cancel and drain the worker
+                self._conn.send("cancel")
+                while self._recv()[0] == "token":
+                    pass
+
+    def close(self) -> None:
+        self._conn.close()
+        self._process.join(timeout=5)
+        if self._process.is_alive():
+            self._process.terminate()
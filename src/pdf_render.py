@@ -0,0 +1,126 @@
+"""Shared Jinja2/wkhtmltopdf rendering for quotes, contracts and reports.
+
+Templates are registered once by name in a single ``Environment``, so each
+is compiled once per process and its bytecode is cached on disk for the next
+process.  PDFs are written by wkhtmltopdf through ``pdfkit``; the binary is
+located once instead of on every call, and :func:`render_pdfs` renders many
+documents concurrently while keeping at most ``PDF_WORKERS`` wkhtmltopdf
+processes alive.
+"""
+
+from __future__ import annotations
+
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+from functools import lru_cache
+from pathlib import Path
+from typing import Iterable, Iterator
+import logging
+import os
+import shutil
+import threading
+
+import jinja2
+import pdfkit
+
+from config import load_config
+
+CFG = load_config()
+ROOT_DIR = Path(__file__).resolve().parent.parent
+PATHS = CFG.get("paths", {})
+# Compiled template bytecode shared between processes
+TEMPLATE_CACHE_DIR = ROOT_DIR / PATHS.get("template_cache", "template_cache")
+
+
+def _default_workers() -> int:
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:  # pragma: no cover - not available on macOS/Windows
+        return os.cpu_count() or 1
+
+
+# Upper bound on concurrently running wkhtmltopdf processes
+PDF_WORKERS = int(os.getenv("PDF_WORKERS") or _default_workers())
+
+_TEMPLATES: dict[str, str] = {}
+
+
+def _bytecode_cache() -> jinja2.BytecodeCache | None:
+    try:
+        TEMPLATE_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    except OSError as exc:
+        logging.warning("Template bytecode cache disabled: %s", exc)
+        return None
+    return jinja2.FileSystemBytecodeCache(str(TEMPLATE_CACHE_DIR))
+
+
+_ENV = jinja2.Environment(loader=jinja2.DictLoader(_TEMPLATES), bytecode_cache=_bytecode_cache())
+
+
+def register_template(name: str, source: str) -> None:
+    """Make ``source`` available to :func:`render` as ``name``."""
+    _TEMPLATES[name] = source
+
+
+@lru_cache(maxsize=64)
+def _string_template(source: str) -> jinja2.Template:
+    return _ENV.from_string(source)
+
+
+def render(name: str, **context) -> str:
+    """Render the registered template ``name``."""
+    return _ENV.get_template(name).render(**context)
+
+
+def render_string(source: str, **context) -> str:
+    """Render an ad-hoc template, compiling each distinct source once."""
+    return _string_template(source).render(**context)
+
+
+@lru_cache(maxsize=1)
+def pdf_configuration():
+    """pdfkit configuration; without a path pdfkit runs ``which`` per call."""
+    binary = PATHS.get("wkhtmltopdf_binary") or shutil.which("wkhtmltopdf") or ""
+    return pdfkit.configuration(wkhtmltopdf=binary)
+
+
+def html_to_pdf(html: str, dest: str | Path, options: dict | None = None) -> str:
+    """Write ``html`` to the PDF file ``dest`` and return its path."""
+    dest = str(dest)
+    pdfkit.from_string(html, dest, options=options, configuration=pdf_configuration())
+    if not Path(dest).is_file():
+        raise RuntimeError(f"PDF could not be created: {dest}")
+    return dest
+
+
+def render_pdf(name: str, dest: str | Path, **context) -> str:
+    """Render the template ``name`` straight to the PDF file ``dest``."""
+    return html_to_pdf(render(name, **context), dest)
+
+
+_EXECUTOR: ThreadPoolExecutor | None = None
+_EXECUTOR_LOCK = threading.Lock()
+
+
+def _executor() -> ThreadPoolExecutor:
+    global _EXECUTOR
+    with _EXECUTOR_LOCK:
+        if _EXECUTOR is None:
+            # Threads suffice: the work happens in the wkhtmltopdf processes
+            _EXECUTOR = ThreadPoolExecutor(max_workers=max(1, PDF_WORKERS), thread_name_prefix="pdf")
+        return _EXECUTOR
+
+
+def submit_pdf(name: str, dest: str | Path, **context) -> Future:
+    """Queue :func:`render_pdf` on the shared renderer pool."""
+    return _executor().submit(render_pdf, name, dest, **context)
+
+
+def render_pdfs(jobs: Iterable[tuple[str, str | Path, dict]]) -> Iterator[tuple[int, Exception | None]]:
+    """Render ``(template, dest, context)`` jobs concurrently.
+
+    Yields ``(index, error)`` pairs in completion order; ``error`` is
+    ``None`` when the PDF was written.
+    """
+    futures = {submit_pdf(name, dest, **context): i for i, (name, dest, context) in enumerate(jobs)}
+    for future in as_completed(futures):
+        yield futures[future], future.exception()
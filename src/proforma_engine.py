@@ -1,44 +1,187 @@
 """Basit proforma teklifi hesaplama modulu.
 
 Fiyat listesi ``data/price_list.csv`` dosyasindan okunur. Dosya ``item,price``
-baslikli bir CSV olup, kod u run-time'da bu listeyi bellege aktarir.
+baslikli bir CSV olup istege bagli ``aliases`` sutununda ``|`` ile ayrilmis
+esanlamli adlar bulunabilir. ``PriceCatalogue`` urun adlarini Turkce ekleri
+(``kameralar``, ``paneli``) ve kucuk yazim hatalarini tolere ederek eslestirir;
+CSV degistiginde bir sonraki teklifte yeniden yuklenir.
 
 Modul ayrica teklif bilgilerini PDF'e d\u00f6kebilmek i\u00e7in yardimci fonksiyon
-saglar. PDF olusturmada ``jinja2`` ve ``pdfkit`` kullanilir.
+saglar. PDF'ler ortak ``pdf_render`` servisiyle olusturulur.
 """
 
 from dataclasses import dataclass
+from itertools import islice
 from pathlib import Path
 import csv
-from typing import Dict, List
+import difflib
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, Union
+import json
 import re
 import logging
+import os
+import threading
 
-from jinja2 import Template
-import pdfkit
+import numpy as np
 
-# Fiyatlar bu sozlukte tutulur ve uygulama acilirken CSV'den okunur.
-PRICE_LIST: Dict[str, float] = {}
+from config import load_config
+from pdf_render import register_template, render_pdf, submit_pdf
+from text_normalize import fold
+
+CFG = load_config()
 
 # CSV dosyasinin yolu.
-PRICE_CSV = Path(__file__).resolve().parent.parent / "data" / "price_list.csv"
+PRICE_CSV = Path(__file__).resolve().parent.parent / CFG.get("paths", {}).get(
+    "price_list", "data/price_list.csv"
+)
+
+# Cogul, iyelik ve hal ekleri; uzun olanlar once denenir.
+_SUFFIXES = sorted(
+    (
+        "lar", "ler", "lari", "leri", "larin", "lerin", "lara", "lere",
+        "larda", "lerde", "lardan", "lerden",
+        "si", "su", "nin", "nun", "in", "un", "i", "u",
+        "ya", "ye", "a", "e", "da", "de", "ta", "te",
+        "dan", "den", "tan", "ten",
+    ),
+    key=len,
+    reverse=True,
+)
+_STEM_MIN = 3
+# Eslesmeyen adlar icin kabul edilen en dusuk difflib benzerligi
+FUZZY_CUTOFF = 0.85
+# Distinct request names whose match is remembered
+RESOLVED_MAX = 100_000
+_NAME_RE = re.compile(r"[^\W_]+")
+
+
+def _stem(word: str) -> str:
+    """Strip Turkish plural and case suffixes from a folded word."""
+    stripped = True
+    while stripped:
+        stripped = False
+        for suffix in _SUFFIXES:
+            if word.endswith(suffix) and len(word) - len(suffix) >= _STEM_MIN:
+                word = word[: -len(suffix)]
+                stripped = True
+                break
+    return word
+
+
+def _name_keys(name: str) -> tuple[str, str]:
+    """Exact and stemmed lookup keys of a product name."""
+    parts = _NAME_RE.findall(fold(name))
+    return " ".join(parts), " ".join(_stem(p) for p in parts)
+
+
+class PriceCatalogue:
+    """Price list with a normalised name index, reloaded when the CSV changes.
+
+    Prices live in a NumPy array so ``create_quotes`` can price any number of
+    line items at once; index ``len(names)`` is a zero price for unknown items.
+    """
+
+    def __init__(self, csv_path: Path = PRICE_CSV):
+        self.csv_path = Path(csv_path)
+        self._lock = threading.Lock()
+        self._stamp: Optional[tuple] = None
+        self.names: List[str] = []
+        self.prices = np.zeros(1)
+        self._exact: Dict[str, int] = {}
+        self._stems: Dict[str, int] = {}
+        self._resolved: Dict[str, int] = {}
+        self.refresh()
+
+    def _file_stamp(self) -> Optional[tuple]:
+        try:
+            st = self.csv_path.stat()
+        except OSError:
+            return None
+        return st.st_mtime_ns, st.st_size
+
+    def refresh(self) -> bool:
+        """Reload the CSV if it changed since the last load."""
+        stamp = self._file_stamp()
+        if stamp == self._stamp:
+            return False
+        with self._lock:
+            if stamp != self._stamp:
+                self._load()
+                self._stamp = stamp
+        return True
+
+    def _load(self) -> None:
+        names: List[str] = []
+        prices: List[float] = []
+        exact: Dict[str, int] = {}
+        stems: Dict[str, int] = {}
+        if self.csv_path.exists():
+            with self.csv_path.open("r", encoding="utf-8") as fh:
+                for row in csv.DictReader(fh):
+                    try:
+                        name, price = row["item"], float(row["price"])
+                    except (KeyError, TypeError, ValueError):
+                        continue
+                    aliases = [a for a in (row.get("aliases") or "").split("|") if a.strip()]
+                    idx = len(names)
+                    names.append(name)
+                    prices.append(price)
+                    for alias in [name, *aliases]:
+                        key, stem = _name_keys(alias)
+                        exact.setdefault(key, idx)
+                        stems.setdefault(stem, idx)
+        self.names, self.prices = names, np.array(prices + [0.0])
+        self._exact, self._stems, self._resolved = exact, stems, {}
+        logging.info("Loaded %d prices from %s", len(names), self.csv_path)
 
+    def lookup(self, name: str) -> int:
+        """Row of ``name`` in the catalogue, or ``len(names)`` when unknown.
 
-def _load_prices(csv_path: Path) -> Dict[str, float]:
-    prices: Dict[str, float] = {}
-    if csv_path.exists():
-        with csv_path.open("r", encoding="utf-8") as fh:
-            reader = csv.DictReader(fh)
-            for row in reader:
-                try:
-                    prices[row["item"]] = float(row["price"])
-                except (KeyError, ValueError):
-                    continue
-    return prices
+        Callers hold ``_lock`` so the row matches ``prices``.
+        """
+        idx = self._resolved.get(name)
+        if idx is None:
+            if len(self._resolved) >= RESOLVED_MAX:
+                self._resolved.clear()
+            idx = self._resolved[name] = self._match(name)
+        return idx
+
+    def _match(self, name: str) -> int:
+        key, stem = _name_keys(name)
+        if key in self._exact:
+            return self._exact[key]
+        if stem in self._stems:
+            return self._stems[stem]
+        # Model numbers must match exactly: "urun501" is not "urun50"
+        if not any(c.isdigit() for c in stem):
+            close = difflib.get_close_matches(stem, self._stems, n=1, cutoff=FUZZY_CUTOFF)
+            if close:
+                return self._stems[close[0]]
+        logging.warning("No price for %r", name)
+        return len(self.names)
+
+    def price(self, name: str) -> float:
+        with self._lock:
+            return float(self.prices[self.lookup(name)])
+
+    def price_rows(self, names: List[str]) -> tuple:
+        """Catalogue rows and unit prices of ``names`` from one CSV version."""
+        with self._lock:
+            rows = np.fromiter((self.lookup(n) for n in names), dtype=np.int64, count=len(names))
+            return rows, self.prices[rows], self.names
 
 
-# CSV'den fiyatlari yukle
-PRICE_LIST.update(_load_prices(PRICE_CSV))
+_CATALOGUE: Optional[PriceCatalogue] = None
+
+
+def get_catalogue() -> PriceCatalogue:
+    """Shared catalogue for ``PRICE_CSV``, refreshed if the file changed."""
+    global _CATALOGUE
+    if _CATALOGUE is None:
+        _CATALOGUE = PriceCatalogue(PRICE_CSV)
+    else:
+        _CATALOGUE.refresh()
+    return _CATALOGUE
 
 
 @dataclass
@@ -47,8 +190,7 @@ class ProformaItem:
     quantity: int
 
     def total(self) -> float:
-        price = PRICE_LIST.get(self.name, 0)
-        return price * self.quantity
+        return get_catalogue().price(self.name) * self.quantity
 
 
 _REQ_RE = re.compile(r"(\d+)\s*(?:adet|tane)?\s*([\w_]+)")
@@ -68,18 +210,68 @@ def parse_request(request: str) -> List[ProformaItem]:
 
 def create_quote(request: str) -> Dict[str, object]:
     """Parse request and compute totals for each product."""
-    try:
-        items = parse_request(request)
-    except Exception as exc:
-        logging.error("proforma parse failed: %s", exc)
-        raise ValueError("Gecersiz istek") from exc
-    if not items:
-        raise ValueError("Urun belirtilmedi")
-    item_list = [
-        {"urun": it.name, "adet": it.quantity, "tutar": it.total()} for it in items
-    ]
-    toplam = sum(it["tutar"] for it in item_list)
-    return {"kalemler": item_list, "toplam": toplam}
+    return create_quotes([request])[0]
+
+
+def create_quotes(requests: Iterable[str]) -> List[Dict[str, object]]:
+    """Price many requests at once, e.g. every line of a tender.
+
+    Each distinct product name is matched once; the line and quote totals
+    are then computed for all items in a single NumPy pass.  Items missing
+    from the catalogue cost 0 and are listed under ``bilinmeyen``.
+    """
+    catalogue = get_catalogue()
+    parsed: List[List[ProformaItem]] = []
+    for request in requests:
+        try:
+            items = parse_request(request)
+        except Exception as exc:
+            logging.error("proforma parse failed: %s", exc)
+            raise ValueError("Gecersiz istek") from exc
+        if not items:
+            raise ValueError("Urun belirtilmedi")
+        parsed.append(items)
+
+    flat = [it for items in parsed for it in items]
+    rows, unit_prices, names = catalogue.price_rows([it.name for it in flat])
+    quantities = np.fromiter((it.quantity for it in flat), dtype=np.float64, count=len(flat))
+    owners = np.repeat(np.arange(len(parsed)), [len(items) for items in parsed])
+    line_totals = unit_prices * quantities
+    quote_totals = np.bincount(owners, weights=line_totals, minlength=len(parsed))
+
+    quotes: List[Dict[str, object]] = []
+    pos = 0
+    unit_list, line_list, row_list = unit_prices.tolist(), line_totals.tolist(), rows.tolist()
+    for items, toplam in zip(parsed, quote_totals.tolist()):
+        item_list = []
+        unknown = []
+        for it in items:
+            row = row_list[pos]
+            name = names[row] if row < len(names) else None
+            if name is None:
+                unknown.append(it.name)
+            item_list.append({
+                "urun": it.name,
+                "katalog": name,
+                "adet": it.quantity,
+                "birim_fiyat": unit_list[pos],
+                "tutar": line_list[pos],
+            })
+            pos += 1
+        quotes.append({"kalemler": item_list, "toplam": toplam, "bilinmeyen": unknown})
+    return quotes
+
+
+QUOTE_TEMPLATE = """
+<h1>Proforma Teklif</h1>
+<table border="1" cellspacing="0" cellpadding="4">
+{% for it in kalemler %}
+    <tr><td>{{ it.urun }}</td><td>{{ it.adet }}</td><td>{{ it.tutar }} TL</td></tr>
+{% endfor %}
+</table>
+<p><strong>Toplam: {{ toplam }} TL</strong></p>
+"""
+register_template("proforma", QUOTE_TEMPLATE)
 
 
 def quote_to_pdf(quote: Dict[str, object], dest: str) -> str:
@@ -92,26 +284,152 @@ def quote_to_pdf(quote: Dict[str, object], dest: str) -> str:
     dest : str
         Olusacak PDF dosyasi yolu.
     """
+    return render_pdf("proforma", dest, **quote)
 
-    template = Template(
-        """
-        <h1>Proforma Teklif</h1>
-        <table border="1" cellspacing="0" cellpadding="4">
-        {% for it in kalemler %}
-            <tr><td>{{ it.urun }}</td><td>{{ it.adet }}</td><td>{{ it.tutar }} TL</td></tr>
-        {% endfor %}
-        </table>
-        <p><strong>Toplam: {{ toplam }} TL</strong></p>
-        """
-    )
-    html = template.render(**quote)
-    pdfkit.from_string(html, dest)
-    return dest
+
+# Requests priced and rendered together in bulk mode
+BULK_BATCH = 256
+_SAFE_NAME_RE = re.compile(r"[^\w.-]+")
+
+
+def read_requests(source: Path) -> Iterator[Tuple[str, Union[str, ValueError]]]:
+    """Stream ``(id, request)`` pairs from a CSV or JSONL tender list.
+
+    CSV files need a ``request`` column, JSONL lines a ``request`` field;
+    an ``id`` column/field is optional and defaults to the record number.
+    A JSONL line that is not a JSON object yields a ``ValueError`` instead
+    of the request, so one bad line fails only its own record.
+    """
+    source = Path(source)
+    with source.open("r", encoding="utf-8", newline="") as fh:
+        if source.suffix.lower() in (".jsonl", ".ndjson"):
+            records: Iterable[object] = (_json_record(line) for line in fh if line.strip())
+        else:
+            records = csv.DictReader(fh)
+        for number, record in enumerate(records, 1):
+            if isinstance(record, ValueError):
+                yield str(number), record
+            else:
+                yield str(record.get("id") or number), record.get("request") or ""
+
+
+def _json_record(line: str) -> Union[dict, ValueError]:
+    try:
+        record = json.loads(line)
+    except ValueError as exc:
+        return ValueError(f"Gecersiz JSON satiri: {exc}")
+    if not isinstance(record, dict):
+        return ValueError("JSON satiri bir nesne degil")
+    return record
+
+
+def _price_batch(requests: List[str]) -> List[object]:
+    """Quotes for ``requests``; a failing request yields its ``ValueError``."""
+    try:
+        return create_quotes(requests)
+    except ValueError:
+        results: List[object] = []
+        for request in requests:
+            try:
+                results.append(create_quote(request))
+            except ValueError as exc:
+                results.append(exc)
+        return results
+
+
+def _write_json(path: Path, data: dict) -> None:
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.write_text(json.dumps(data), encoding="utf-8")
+    os.replace(tmp, path)
+
+
+def bulk_quotes(source: Path, out_dir: Path, pdf: bool = True, batch_size: int = BULK_BATCH) -> Dict[str, object]:
+    """Quote every request in ``source``, resuming an interrupted run.
+
+    Requests are streamed in batches of ``batch_size``: each batch is priced
+    with ``create_quotes``, its PDFs are rendered on the ``pdf_render`` pool
+    and one line per request is appended to ``manifest.jsonl``.  Only then
+    does ``checkpoint.json`` advance, recording how many requests and
+    manifest bytes are complete, so a rerun truncates any partial batch and
+    continues after the last finished one.  Memory use is bounded by the
+    batch size, not by the input.
+    """
+    source, out_dir = Path(source), Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    manifest_path = out_dir / "manifest.jsonl"
+    checkpoint_path = out_dir / "checkpoint.json"
+    stat = source.stat()
+    stamp = {"source": str(source.resolve()), "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+    state = {**stamp, "done": 0, "manifest_bytes": 0, "errors": 0, "toplam": 0.0}
+    if checkpoint_path.exists():
+        saved = json.loads(checkpoint_path.read_text(encoding="utf-8"))
+        if {k: saved.get(k) for k in stamp} != stamp:
+            raise ValueError(f"{checkpoint_path} baska bir girdiye ait; farkli bir klasor secin")
+        state = saved
+        logging.info("Resuming bulk quotes after %d requests", state["done"])
+
+    records = islice(read_requests(source), state["done"], None)
+    with manifest_path.open("ab") as manifest:
+        manifest.truncate(state["manifest_bytes"])
+        while True:
+            batch = list(islice(records, batch_size))
+            if not batch:
+                break
+            priced = iter(_price_batch([r for _, r in batch if isinstance(r, str)]))
+            quotes = [next(priced) if isinstance(r, str) else r for _, r in batch]
+            # Keyed by position and named after the record number, so
+            # repeated or clashing ids never share a PDF
+            renders = {}
+            for offset, ((request_id, _), quote) in enumerate(zip(batch, quotes)):
+                if pdf and isinstance(quote, dict):
+                    number = state["done"] + offset + 1
+                    dest = out_dir / f"{number:06d}-{_SAFE_NAME_RE.sub('_', request_id)}.pdf"
+                    renders[offset] = (dest, submit_pdf("proforma", dest, **quote))
+            lines = []
+            for offset, ((request_id, _), quote) in enumerate(zip(batch, quotes)):
+                entry: Dict[str, object] = {"id": request_id}
+                error: Optional[BaseException] = quote if isinstance(quote, Exception) else None
+                if error is None:
+                    entry.update(toplam=quote["toplam"], bilinmeyen=quote["bilinmeyen"])
+                    state["toplam"] += quote["toplam"]
+                    if offset in renders:
+                        dest, future = renders[offset]
+                        error = future.exception()
+                        entry["pdf"] = None if error else dest.name
+                if error is not None:
+                    entry["hata"] = str(error)
+                    state["errors"] += 1
+                lines.append(json.dumps(entry, ensure_ascii=False) + "\n")
+            manifest.write("".join(lines).encode("utf-8"))
+            manifest.flush()
+            os.fsync(manifest.fileno())
+            state["done"] += len(batch)
+            state["manifest_bytes"] = manifest.tell()
+            _write_json(checkpoint_path, state)
+            logging.info("Bulk quotes: %d done, %d errors", state["done"], state["errors"])
+    return {"islenen": state["done"], "hata": state["errors"], "toplam": state["toplam"]}
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Proforma teklif hesapla")
+    parser.add_argument("request", nargs="*", help="Ornek: '4 kamera, 1 dvr'")
+    parser.add_argument("--bulk", metavar="DOSYA", help="CSV/JSONL ihale listesini toplu teklife cevir")
+    parser.add_argument("--out", default="quotes", help="Toplu teklif cikti klasoru")
+    parser.add_argument("--no-pdf", action="store_true", help="Toplu modda PDF uretme")
+    parser.add_argument("--batch", type=int, default=BULK_BATCH, help="Bir seferde islenen istek sayisi")
+    args = parser.parse_args()
+
+    if args.bulk:
+        summary = bulk_quotes(Path(args.bulk), Path(args.out), pdf=not args.no_pdf, batch_size=args.batch)
+        print(json.dumps(summary, ensure_ascii=False))
+        return
+    if not args.request:
+        parser.error("istek veya --bulk gerekli")
+    print(create_quote(" ".join(args.request)))
 
 
 if __name__ == "__main__":
-    import sys
-    if len(sys.argv) < 2:
-        print("Usage: proforma_engine.py '<adet> <urun>'")
-        raise SystemExit(1)
-    print(create_quote(" ".join(sys.argv[1:])))
+    main()
@@ -1,39 +1,576 @@
-import sqlite3
+"""Two-tier cache of LLM answers: a bounded in-memory LRU in front of SQLite.
+
+Both tiers honour a TTL.  The memory tier is bounded by entry count and by
+the UTF-8 size of keys plus answers; the SQLite tier is pruned to its newest
+``db_max_entries`` rows (by last access) every ``PRUNE_EVERY`` inserts.
+SQLite writes are batched by a background thread, so an answer becomes
+visible to other processes shortly after ``set`` returns.
+"""
+
+from __future__ import annotations
+
+from collections import OrderedDict, defaultdict
 from pathlib import Path
+from typing import Callable, Iterable
+import atexit
+import logging
+import queue
+import sqlite3
+import threading
+import time
+import zlib
+
+import numpy as np
+
 from config import load_config
+from text_normalize import fault_codes
 
 CFG = load_config()
 DB_PATH = Path(__file__).resolve().parent.parent / CFG.get("paths", {}).get("prompt_cache", "prompt_cache.db")
+CACHE_CFG = CFG.get("answer_cache", {})
+MEMORY_ENTRIES = int(CACHE_CFG.get("memory_entries", 1024))
+MEMORY_BYTES = int(CACHE_CFG.get("memory_bytes", 8 * 1024 * 1024))
+# Seconds an answer stays valid; 0 keeps answers until they are evicted
+TTL_SECONDS = float(CACHE_CFG.get("ttl_seconds", 0))
+DB_MAX_ENTRIES = int(CACHE_CFG.get("db_max_entries", 100_000))
+# The SQLite tier is pruned after this many inserts
+PRUNE_EVERY = 100
+# Queued writes applied per transaction, and how long the writer waits to
+# fill a batch
+WRITE_BATCH = 256
+FLUSH_INTERVAL = 0.05
+# Host parameters per ``IN (...)`` lookup, below SQLite's default limit
+SQL_VARIABLES = 500
+# Look up near-duplicate keys when there is no exact match
+NEAR_DUPLICATE = bool(CACHE_CFG.get("near_duplicate", False))
+NEAR_THRESHOLD = float(CACHE_CFG.get("near_threshold", 0.8))
+PRAGMAS = (
+    "synchronous=NORMAL",
+    "busy_timeout=30000",
+    "temp_store=MEMORY",
+    "cache_size=-8192",
+    "mmap_size=67108864",
+)
+
+
+class MemoryCache:
+    """Thread-safe LRU mapping bounded by entries and bytes, with a TTL."""
+
+    def __init__(self, max_entries: int = MEMORY_ENTRIES, max_bytes: int = MEMORY_BYTES, ttl: float = TTL_SECONDS):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.size_bytes = 0
+        self._entries: OrderedDict[str, tuple[str, float, int]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: str) -> str | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires, size = entry
+            if expires and expires < time.time():
+                del self._entries[key]
+                self.size_bytes -= size
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: str, created: float | None = None) -> int:
+        """Store ``value`` and return how many entries were evicted.
+
+        The TTL runs from ``created`` (default: now), so an entry copied from
+        another tier keeps its original age.
+        """
+        size = len(key.encode("utf-8")) + len(value.encode("utf-8"))
+        expires = (time.time() if created is None else created) + self.ttl if self.ttl else 0.0
+        evicted = 0
+        with self._lock:
+            # Drop the previous answer even if the new one is too large to keep
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.size_bytes -= old[2]
+            if size > self.max_bytes:
+                return 0
+            self._entries[key] = (value, expires, size)
+            self.size_bytes += size
+            while len(self._entries) > self.max_entries or self.size_bytes > self.max_bytes:
+                _, (_, _, dropped) = self._entries.popitem(last=False)
+                self.size_bytes -= dropped
+                evicted += 1
+        return evicted
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.size_bytes = 0
 
 
 class PromptCache:
-    def __init__(self, db_path: Path = DB_PATH):
+    """Answers stored in SQLite in WAL mode.
+
+    Every thread keeps its own connection.  Writes (new answers and access
+    times) are queued and applied by a background writer thread in batches
+    of up to ``WRITE_BATCH``, one transaction per batch; ``flush`` waits for
+    the queue to drain.  Pruned row counts are passed to ``on_evict``, and
+    prompts left without any cached answer to ``on_remove``.
+    """
+
+    def __init__(self, db_path: Path = DB_PATH, max_entries: int = DB_MAX_ENTRIES, ttl: float = TTL_SECONDS):
         self.db_path = db_path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.on_evict: Callable[[int], None] | None = None
+        self.on_remove: Callable[[set[str]], None] | None = None
+        self._inserts = 0
+        self._local = threading.local()
+        self._connections: list[sqlite3.Connection] = []
+        self._lock = threading.Lock()
+        self._writes: queue.Queue = queue.Queue()
+        self._writer: threading.Thread | None = None
         self._ensure_db()
 
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # Autocommit; the writer opens explicit transactions per batch
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None, check_same_thread=False)
+            for pragma in PRAGMAS:
+                conn.execute(f"PRAGMA {pragma}")
+            self._local.conn = conn
+            with self._lock:
+                self._connections.append(conn)
+        return conn
+
     def _ensure_db(self) -> None:
         self.db_path.parent.mkdir(parents=True, exist_ok=True)
-        with sqlite3.connect(self.db_path) as conn:
-            conn.execute(
-                "CREATE TABLE IF NOT EXISTS cache (prompt TEXT PRIMARY KEY, answer TEXT)"
+        conn = self._connect()
+        conn.execute("PRAGMA journal_mode=WAL")
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(cache)")}
+        if columns and "version" not in columns:
+            self._migrate(conn, columns)
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache (prompt TEXT NOT NULL, version TEXT NOT NULL, answer TEXT, "
+            "created REAL NOT NULL, accessed REAL NOT NULL, hits INTEGER NOT NULL DEFAULT 0, "
+            "question TEXT, PRIMARY KEY (prompt, version))"
+        )
+        if "question" not in {row[1] for row in conn.execute("PRAGMA table_info(cache)")}:
+            conn.execute("ALTER TABLE cache ADD COLUMN question TEXT")
+        conn.execute("CREATE INDEX IF NOT EXISTS cache_accessed ON cache(accessed)")
+
+    @staticmethod
+    def _migrate(conn: sqlite3.Connection, columns: set[str]) -> None:
+        # Older tables hold one untagged answer per prompt; they keep serving
+        # as prompt history for ``top_prompts`` but never match a version.
+        now = time.time()
+        created = "created" if "created" in columns else str(now)
+        accessed = "accessed" if "accessed" in columns else str(now)
+        conn.execute("BEGIN")
+        conn.execute("ALTER TABLE cache RENAME TO cache_unversioned")
+        conn.execute(
+            "CREATE TABLE cache (prompt TEXT NOT NULL, version TEXT NOT NULL, answer TEXT, "
+            "created REAL NOT NULL, accessed REAL NOT NULL, hits INTEGER NOT NULL DEFAULT 0, "
+            "PRIMARY KEY (prompt, version))"
+        )
+        conn.execute(
+            f"INSERT INTO cache(prompt, version, answer, created, accessed) "
+            f"SELECT prompt, '', answer, {created}, {accessed} FROM cache_unversioned"
+        )
+        conn.execute("DROP TABLE cache_unversioned")
+        conn.execute("DROP INDEX IF EXISTS cache_accessed")
+        conn.execute("COMMIT")
+
+    def get(self, prompt: str, version: str = "") -> str | None:
+        return self.get_many([prompt], version).get(prompt)
+
+    def get_many(self, prompts: list[str], version: str = "") -> dict[str, str]:
+        """Return the answers among ``prompts`` cached for ``version``.
+
+        Answers stored for another version (an older model or document
+        index) are ignored; they are replaced by the next ``set`` or age out
+        through pruning.
+        """
+        return {prompt: answer for prompt, (answer, _) in self.get_entries(prompts, version).items()}
+
+    def get_entries(self, prompts: list[str], version: str = "") -> dict[str, tuple[str, float]]:
+        """Like ``get_many``, with the time each answer was stored."""
+        conn = self._connect()
+        now = time.time()
+        found: dict[str, tuple[str, float]] = {}
+        unique = list(dict.fromkeys(prompts))
+        for start in range(0, len(unique), SQL_VARIABLES - 1):
+            chunk = unique[start:start + SQL_VARIABLES - 1]
+            rows = conn.execute(
+                f"SELECT prompt, answer, created FROM cache "
+                f"WHERE version = ? AND prompt IN ({','.join('?' * len(chunk))})",
+                [version, *chunk],
             )
+            for prompt, answer, created in rows:
+                if not self.ttl or created >= now - self.ttl:
+                    found[prompt] = (answer, created)
+        self.touch(found, version)
+        return found
+
+    def touch(self, prompts: Iterable[str], version: str = "") -> None:
+        """Record a hit on ``prompts`` (access time and hit count)."""
+        now = time.time()
+        self._queue([("touch", prompt, version, None, now, None) for prompt in prompts])
 
-    def get(self, prompt: str) -> str | None:
-        with sqlite3.connect(self.db_path) as conn:
-            row = conn.execute(
-                "SELECT answer FROM cache WHERE prompt=?", (prompt,)
-            ).fetchone()
-            return row[0] if row else None
-
-    def set(self, prompt: str, answer: str) -> None:
-        with sqlite3.connect(self.db_path) as conn:
-            conn.execute(
-                "INSERT OR REPLACE INTO cache(prompt, answer) VALUES (?, ?)", (prompt, answer)
+    def set(self, prompt: str, answer: str, version: str = "", question: str | None = None) -> None:
+        """Queue one answer; ``question`` is the text as asked, when
+        ``prompt`` is a normalised key of it (see ``top_prompts``)."""
+        self._queue([("set", prompt, version, answer, time.time(), question)])
+
+    def set_many(self, items: Iterable[tuple[str, str]], version: str = "") -> None:
+        """Queue ``(prompt, answer)`` pairs for the background writer."""
+        now = time.time()
+        self._queue([("set", prompt, version, answer, now, None) for prompt, answer in items])
+
+    def _queue(self, writes: list[tuple]) -> None:
+        if not writes:
+            return
+        if self._writer is None:
+            with self._lock:
+                if self._writer is None:
+                    self._writer = threading.Thread(target=self._write_loop, name="prompt-cache-writer", daemon=True)
+                    self._writer.start()
+                    atexit.register(self.close)
+        for write in writes:
+            self._writes.put(write)
+
+    def _write_loop(self) -> None:
+        while True:
+            batch = [self._writes.get()]
+            deadline = time.monotonic() + FLUSH_INTERVAL
+            while batch[-1] is not None and len(batch) < WRITE_BATCH:
+                try:
+                    batch.append(self._writes.get(timeout=max(0.0, deadline - time.monotonic())))
+                except queue.Empty:
+                    break
+            writes = [w for w in batch if w is not None]
+            try:
+                if writes:
+                    self._apply(writes)
+            except sqlite3.Error as exc:
+                logging.error("Prompt cache write failed: %s", exc)
+            finally:
+                for _ in batch:
+                    self._writes.task_done()
+            if batch[-1] is None:
+                return
+
+    def _apply(self, writes: list[tuple]) -> None:
+        conn = self._connect()
+        inserts = [
+            (prompt, version, answer, now, now, question)
+            for kind, prompt, version, answer, now, question in writes
+            if kind == "set"
+        ]
+        touches = [(now, prompt, version) for kind, prompt, version, _, now, _ in writes if kind == "touch"]
+        conn.execute("BEGIN")
+        try:
+            conn.executemany(
+                "INSERT INTO cache(prompt, version, answer, created, accessed, question) VALUES (?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT(prompt, version) DO UPDATE SET "
+                "answer=excluded.answer, created=excluded.created, accessed=excluded.accessed, "
+                "question=COALESCE(excluded.question, question)",
+                inserts,
             )
+            conn.executemany("UPDATE cache SET accessed=?, hits=hits+1 WHERE prompt=? AND version=?", touches)
+        except sqlite3.Error:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+        before = self._inserts
+        self._inserts += len(inserts)
+        if self._inserts // PRUNE_EVERY > before // PRUNE_EVERY:
+            removed = self._prune(conn)
+            if removed and self.on_evict:
+                self.on_evict(removed)
+
+    def flush(self) -> None:
+        """Wait until every queued write has been applied."""
+        self._writes.join()
+
+    def keys(self) -> list[str]:
+        """Return every cached prompt, whatever its version."""
+        self.flush()
+        return [row[0] for row in self._connect().execute("SELECT DISTINCT prompt FROM cache")]
+
+    def top_prompts(self, n: int) -> list[str]:
+        """Return the ``n`` prompts served most often, across all versions.
+
+        Each is given as originally asked if that text was stored with it,
+        otherwise as the cache key.
+        """
+        self.flush()
+        rows = self._connect().execute(
+            "SELECT COALESCE(MAX(question), prompt) FROM cache GROUP BY prompt "
+            "ORDER BY SUM(hits) DESC, MAX(accessed) DESC LIMIT ?",
+            (n,),
+        )
+        return [row[0] for row in rows]
+
+    def prune(self) -> int:
+        """Drop expired rows and the least recently used rows over the limit."""
+        self.flush()
+        return self._prune(self._connect())
+
+    def _prune(self, conn: sqlite3.Connection) -> int:
+        # Rows are selected first so the prompts that disappear are known
+        doomed: list[tuple[int, str]] = []
+        cutoff = time.time() - self.ttl if self.ttl else None
+        if cutoff is not None:
+            doomed += conn.execute("SELECT rowid, prompt FROM cache WHERE created < ?", (cutoff,)).fetchall()
+        (count,) = conn.execute("SELECT COUNT(*) FROM cache").fetchone()
+        excess = count - len(doomed) - self.max_entries
+        if excess > 0:
+            live = "WHERE created >= ? " if cutoff is not None else ""
+            doomed += conn.execute(
+                f"SELECT rowid, prompt FROM cache {live}ORDER BY accessed LIMIT ?",
+                (cutoff, excess) if cutoff is not None else (excess,),
+            ).fetchall()
+        if not doomed:
+            return 0
+        conn.execute("BEGIN")
+        try:
+            for start in range(0, len(doomed), SQL_VARIABLES):
+                chunk = [rowid for rowid, _ in doomed[start:start + SQL_VARIABLES]]
+                conn.execute(f"DELETE FROM cache WHERE rowid IN ({','.join('?' * len(chunk))})", chunk)
+        except sqlite3.Error:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+        if self.on_remove:
+            gone = {prompt for _, prompt in doomed}
+            prompts = list(gone)
+            for start in range(0, len(prompts), SQL_VARIABLES):
+                chunk = prompts[start:start + SQL_VARIABLES]
+                rows = conn.execute(
+                    f"SELECT DISTINCT prompt FROM cache WHERE prompt IN ({','.join('?' * len(chunk))})", chunk
+                )
+                gone.difference_update(row[0] for row in rows)
+            if gone:
+                self.on_remove(gone)
+        return len(doomed)
 
     def backup(self, backup_path: str) -> None:
         """Copy the cache database to ``backup_path``."""
-        from shutil import copy2
+        self.flush()
+        target = sqlite3.connect(backup_path)
+        try:
+            self._connect().backup(target)
+        finally:
+            target.close()
+
+    def close(self) -> None:
+        """Apply pending writes, stop the writer and close all connections."""
+        with self._lock:
+            writer, self._writer = self._writer, None
+        if writer is not None:
+            self._writes.put(None)
+            writer.join()
+        with self._lock:
+            connections, self._connections = self._connections, []
+        for conn in connections:
+            conn.close()
+        self._local = threading.local()
+
+
+# Mersenne prime for the MinHash permutations; a * crc32 stays below 2**63
+_PRIME = (1 << 31) - 1
+
+
+class MinHashIndex:
+    """Find cached keys similar to a new key (MinHash with LSH banding).
+
+    Keys are compared by the Jaccard similarity of their character trigrams,
+    which absorbs small speech-to-text variations.  Only keys with the same
+    fault codes are candidates, so "kod 135" never answers "kod 136".
+    """
+
+    def __init__(self, threshold: float = NEAR_THRESHOLD, num_perm: int = 64, bands: int = 16):
+        rng = np.random.default_rng(0)
+        self.threshold = threshold
+        self.rows = num_perm // bands
+        self.bands = bands
+        self._a = rng.integers(1, _PRIME, num_perm, dtype=np.uint64)
+        self._b = rng.integers(0, _PRIME, num_perm, dtype=np.uint64)
+        self._signatures: dict[str, np.ndarray] = {}
+        self._buckets: defaultdict[tuple, set[str]] = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._signatures)
+
+    def _signature(self, key: str) -> np.ndarray | None:
+        """MinHash of the key's trigrams, or ``None`` for an empty key."""
+        if not key.strip():
+            return None
+        padded = f" {key} "
+        grams = {padded[i:i + 3] for i in range(len(padded) - 2)}
+        hashes = np.fromiter((zlib.crc32(g.encode("utf-8")) for g in grams), dtype=np.uint64, count=len(grams))
+        return ((self._a[:, None] * hashes[None, :] + self._b[:, None]) % _PRIME).min(axis=1).astype(np.uint32)
+
+    def _band_keys(self, key: str, signature: np.ndarray) -> list[tuple]:
+        codes = fault_codes(key)
+        return [
+            (codes, band, signature[band * self.rows:(band + 1) * self.rows].tobytes())
+            for band in range(self.bands)
+        ]
+
+    def add(self, key: str) -> None:
+        if key in self._signatures:
+            return
+        signature = self._signature(key)
+        if signature is None:
+            return
+        with self._lock:
+            self._signatures[key] = signature
+            for band_key in self._band_keys(key, signature):
+                self._buckets[band_key].add(key)
+
+    def remove(self, key: str) -> None:
+        """Forget ``key`` (e.g. after its answers were pruned)."""
+        with self._lock:
+            signature = self._signatures.pop(key, None)
+            if signature is None:
+                return
+            for band_key in self._band_keys(key, signature):
+                bucket = self._buckets.get(band_key)
+                if bucket is not None:
+                    bucket.discard(key)
+                    if not bucket:
+                        del self._buckets[band_key]
+
+    def find(self, key: str) -> str | None:
+        """Return the most similar other key above the threshold, if any."""
+        signature = self._signature(key)
+        if signature is None:
+            return None
+        with self._lock:
+            candidates = set().union(*(self._buckets.get(b, ()) for b in self._band_keys(key, signature)))
+            candidates.discard(key)
+            scored = [(float(np.mean(self._signatures[c] == signature)), c) for c in candidates]
+        if not scored:
+            return None
+        similarity, best = max(scored)
+        return best if similarity >= self.threshold else None
+
+
+class TieredCache:
+    """Look answers up in a ``MemoryCache`` first and ``PromptCache`` second.
+
+    Every answer is tagged with a ``version`` (see ``ask_llm.answer_version``)
+    and only served for the same version.  With a ``MinHashIndex`` as
+    ``near``, keys missing from both tiers are answered from the most similar
+    cached key instead.
+    ``on_event(tier, event, count)`` is called for ``hit``, ``miss`` and
+    ``eviction`` events of the ``memory``, ``sqlite`` and ``near`` tiers,
+    e.g. to feed Prometheus counters.
+    """
+
+    def __init__(
+        self,
+        memory: MemoryCache | None = None,
+        store: PromptCache | None = None,
+        on_event: Callable[[str, str, int], None] | None = None,
+        near: MinHashIndex | None = None,
+    ):
+        self.memory = memory if memory is not None else MemoryCache()
+        self.store = store if store is not None else PromptCache()
+        self.on_event = on_event
+        self.near = near
+        self._near_loaded = False
+        self._near_lock = threading.Lock()
+        self.store.on_evict = lambda count: self._emit("sqlite", "eviction", count)
+        if near is not None:
+            self.store.on_remove = self._forget_near
+
+    def _forget_near(self, prompts: set[str]) -> None:
+        for prompt in prompts:
+            self.near.remove(prompt)
+
+    def _emit(self, tier: str, event: str, count: int = 1) -> None:
+        if self.on_event and count:
+            self.on_event(tier, event, count)
+
+    def peek(self, prompt: str, version: str = "") -> str | None:
+        """Look in the memory tier only, without touching SQLite synchronously.
+
+        Cheap enough for an event loop; a miss is not reported, so follow it
+        with ``get`` (e.g. in a thread).
+        """
+        answer = self.memory.get(_memory_key(prompt, version))
+        if answer is not None:
+            self.store.touch([prompt], version)
+            self._emit("memory", "hit")
+        return answer
+
+    def get(self, prompt: str, version: str = "") -> str | None:
+        return self.get_many([prompt], version)[0]
+
+    def get_many(self, prompts: list[str], version: str = "") -> list[str | None]:
+        """Return the answer (or ``None``) cached for ``version`` for every
+        prompt, in order."""
+        answers = [self.memory.get(_memory_key(prompt, version)) for prompt in prompts]
+        missing = [prompt for prompt, answer in zip(prompts, answers) if answer is None]
+        # Keep SQLite's access times and hit counts (used by pruning and
+        # ``top_prompts``) current for answers served from memory
+        self.store.touch((prompt for prompt, answer in zip(prompts, answers) if answer is not None), version)
+        self._emit("memory", "hit", len(prompts) - len(missing))
+        self._emit("memory", "miss", len(missing))
+        if not missing:
+            return answers
+        entries = self.store.get_entries(missing, version)
+        self._emit("sqlite", "hit", sum(prompt in entries for prompt in missing))
+        self._emit("sqlite", "miss", sum(prompt not in entries for prompt in missing))
+        found = {}
+        for prompt, (answer, created) in entries.items():
+            # Promoted answers expire when the SQLite entry would
+            self._emit("memory", "eviction", self.memory.set(_memory_key(prompt, version), answer, created))
+            found[prompt] = answer
+        if self.near is not None:
+            found.update(self._near_answers([prompt for prompt in missing if prompt not in found], version))
+        return [answer if answer is not None else found.get(prompt) for prompt, answer in zip(prompts, answers)]
+
+    def _near_answers(self, prompts: list[str], version: str) -> dict[str, str]:
+        """Answer ``prompts`` from cached near-duplicates of them."""
+        if not prompts:
+            return {}
+        with self._near_lock:
+            if not self._near_loaded:
+                for key in self.store.keys():
+                    self.near.add(key)
+                self._near_loaded = True
+        similar = {prompt: self.near.find(prompt) for prompt in prompts}
+        found = {key: self.memory.get(_memory_key(key, version)) for key in similar.values() if key is not None}
+        found.update(self.store.get_many([key for key, answer in found.items() if answer is None], version))
+        answers = {prompt: found[key] for prompt, key in similar.items() if found.get(key) is not None}
+        self._emit("near", "hit", len(answers))
+        self._emit("near", "miss", len(prompts) - len(answers))
+        return answers
+
+    def set(self, prompt: str, answer: str, version: str = "", question: str | None = None) -> None:
+        """Cache ``answer``; see ``PromptCache.set`` for ``question``."""
+        self._remember(prompt, answer, version)
+        self.store.set(prompt, answer, version, question)
+
+    def set_many(self, items: Iterable[tuple[str, str]], version: str = "") -> None:
+        items = list(items)
+        for prompt, answer in items:
+            self._remember(prompt, answer, version)
+        self.store.set_many(items, version)
+
+    def _remember(self, prompt: str, answer: str, version: str) -> None:
+        self._emit("memory", "eviction", self.memory.set(_memory_key(prompt, version), answer))
+        if self.near is not None and self._near_loaded:
+            self.near.add(prompt)
 
-        copy2(self.db_path, backup_path)
 
+def _memory_key(prompt: str, version: str) -> str:
+    return f"{version}\x00{prompt}"
@@ -1,14 +1,14 @@
-from jinja2 import Template
+from pdf_render import register_template, render
 
-
-def generate_report(findings: dict) -> str:
-    """Convert inspection findings into a formatted report string."""
-    template = Template(
-        """
+REPORT_TEMPLATE = """
         <h1>Ariza Raporu</h1>
         {% for key, value in findings.items() %}
         <p><strong>{{ key }}:</strong> {{ value }}</p>
         {% endfor %}
         """
-    )
-    return template.render(findings=findings)
+register_template("ariza_raporu", REPORT_TEMPLATE)
+
+
+def generate_report(findings: dict) -> str:
+    """Convert inspection findings into a formatted report string."""
+    return render("ariza_raporu", findings=findings)
@@ -0,0 +1,36 @@
+"""Turkish-aware text normalisation shared by search and caching."""
+
+from __future__ import annotations
+
+import re
+
+# ``str.lower`` maps "I" to "i" and "İ" to "i" + combining dot; Turkish wants
+# "I" -> "ı" and "İ" -> "i".
+_TR_LOWER = str.maketrans({"I": "ı", "İ": "i"})
+# Manuals are mostly typed without Turkish characters, STT output uses them.
+_TR_ASCII = str.maketrans("ıçğöşüâîû", "icgosuaiu", "̇")
+_WORD_RE = re.compile(r"\w+")
+
+
+def fold(text: str) -> str:
+    """Lower-case ``text`` the Turkish way and strip its diacritics."""
+    return text.translate(_TR_LOWER).lower().translate(_TR_ASCII)
+
+
+def words(text: str) -> list[str]:
+    """Return the folded words of ``text`` without punctuation."""
+    return _WORD_RE.findall(fold(text))
+
+
+def cache_key(text: str) -> str:
+    """Key under which the answer to ``text`` is cached.
+
+    Case, Turkish characters, punctuation and spacing do not change the key,
+    so "Kod 135 ne demek?" and "kod 135 ne demek" share one answer.
+    """
+    return " ".join(words(text))
+
+
+def fault_codes(text: str) -> tuple[str, ...]:
+    """Return the sorted words of ``text`` that contain a digit."""
+    return tuple(sorted({w for w in words(text) if any(c.isdigit() for c in w)}))
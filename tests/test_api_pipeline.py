@@ -0,0 +1,187 @@
+import asyncio
+import json
+import os
+import sys
+import threading
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / 'src'))
+
+pytest.importorskip('fastapi')
+pytest.importorskip('llama_cpp')
+os.environ.setdefault('JWT_SECRET', 'test-secret')
+import api_server
+from ask_llm import LLMError
+from inference_queue import BULK, INTERACTIVE, InferenceScheduler, QueueFullError
+from prompt_cache import MemoryCache, PromptCache, TieredCache
+
+
+def _generate(ctx, full_prompt):
+    return f'cevap {full_prompt}'
+
+
+def _generate_stream(ctx, full_prompt, on_token):
+    pieces = []
+    for piece in ['cevap', f' {full_prompt}']:
+        if 'hata' in full_prompt and pieces:
+            raise LLMError('model failed')
+        pieces.append(piece)
+        if on_token(piece) is False:
+            break
+    return ''.join(pieces)
+
+
+class FakePool:
+    """``LLMPool`` stand-in running a fake model on a real scheduler."""
+
+    def __init__(self, max_queue=4, reserve=1):
+        self.scheduler = InferenceScheduler(['ctx'], max_queue=max_queue, reserve=reserve)
+
+    def submit_generate(self, full_prompt, max_tokens=256, priority=INTERACTIVE):
+        return self.scheduler.submit(_generate, full_prompt, priority=priority)
+
+    def submit_generate_many(self, full_prompts, max_tokens=256, priority=INTERACTIVE):
+        return self.scheduler.submit_many([(_generate, (p,)) for p in full_prompts], priority=priority)
+
+    def submit_generate_stream(self, full_prompt, on_token, max_tokens=256, priority=INTERACTIVE):
+        return self.scheduler.submit(_generate_stream, full_prompt, on_token, priority=priority)
+
+
+@pytest.fixture
+def pool(tmp_path, monkeypatch):
+    pool = FakePool()
+    monkeypatch.setattr(api_server, 'llm_client', pool)
+    monkeypatch.setattr(api_server, 'API_TOKEN', None)
+    monkeypatch.setattr(api_server, 'answer_cache', TieredCache(MemoryCache(), PromptCache(tmp_path / 'cache.db')))
+    monkeypatch.setattr(api_server, 'answer_version', lambda model_path: 'v1')
+    monkeypatch.setattr(api_server, '_version', None)
+    monkeypatch.setattr(api_server, 'VERSION_CHECK_INTERVAL', 60)
+    monkeypatch.setattr(api_server, 'fault_answer', lambda prompt: None)
+    monkeypatch.setattr(api_server, 'retrieval_prompt', lambda prompt: f'[{prompt}]')
+    yield pool
+    pool.scheduler.close()
+
+
+async def _body(response):
+    return ''.join([chunk async for chunk in response.body_iterator])
+
+
+def test_bulk_larger_than_the_queue_is_answered_in_order(pool):
+    # Endpoints are called directly, without the HTTP middleware stack
+    queries = [api_server.Query(prompt=f'soru {i}') for i in range(10)]
+    answers = asyncio.run(api_server.bulk_ask(queries, stream=False, authorization=None, x_api_key=None))
+    assert answers == [f'cevap [soru {i}]' for i in range(10)]
+    assert pool.scheduler.depth() == 0
+
+    queries.append(api_server.Query(prompt='soru 10'))
+
+    async def _stream():
+        return await _body(await api_server.bulk_ask(queries, stream=True, authorization=None, x_api_key=None))
+
+    lines = [json.loads(line) for line in asyncio.run(_stream()).splitlines()]
+    assert sorted(line['index'] for line in lines) == list(range(11))
+    assert {line['index']: line['answer'] for line in lines}[10] == 'cevap [soru 10]'
+
+
+def test_bulk_is_rejected_only_when_no_slot_is_free(pool):
+    gate = threading.Event()
+    pool.scheduler.submit(lambda ctx: gate.wait(5))
+    while pool.scheduler.depth():
+        pass
+    held = [pool.submit_generate('x', priority=BULK) for _ in range(3)]
+    with pytest.raises(QueueFullError):
+        asyncio.run(api_server.bulk_ask([api_server.Query(prompt='soru')], authorization=None, x_api_key=None))
+    # The reserved slot still takes an interactive question
+    fast = pool.submit_generate('acil', priority=INTERACTIVE)
+    gate.set()
+    assert fast.result(timeout=5) == 'cevap acil'
+    assert [f.result(timeout=5) for f in held] == ['cevap x'] * 3
+
+
+def test_cache_and_retrieval_stages_run_off_the_event_loop(pool, monkeypatch):
+    versions, retrievals = [], []
+
+    def answer_version(model_path):
+        versions.append(threading.current_thread())
+        return 'v1'
+
+    def retrieval_prompt(prompt):
+        retrievals.append(threading.current_thread())
+        return f'[{prompt}]'
+
+    monkeypatch.setattr(api_server, 'answer_version', answer_version)
+    monkeypatch.setattr(api_server, 'retrieval_prompt', retrieval_prompt)
+
+    async def _ask_twice():
+        first = await api_server._answer('kod 999 nedir')
+        # Served from the memory tier without reaching the model again
+        second = await api_server._answer('Kod 999 nedir?')
+        return threading.current_thread(), first, second
+
+    loop_thread, first, second = asyncio.run(_ask_twice())
+    assert first == second == 'cevap [kod 999 nedir]'
+    assert len(versions) == 1 and versions[0] is not loop_thread
+    assert len(retrievals) == 1 and retrievals[0] is not loop_thread
+
+
+def _events(body):
+    events = []
+    for frame in body.strip().split('\n\n'):
+        lines = frame.split('\n')
+        event = lines[0][len('event: '):] if lines[0].startswith('event: ') else None
+        events.append((event, json.loads(lines[-1][len('data: '):])))
+    return events
+
+
+def test_sse_stream_sends_tokens_then_the_answer(pool):
+    async def _stream(prompt):
+        return await _body(await api_server.ask_stream(api_server.Query(prompt=prompt), authorization=None, x_api_key=None))
+
+    assert _events(asyncio.run(_stream('soru'))) == [
+        (None, {'token': 'cevap'}),
+        (None, {'token': ' [soru]'}),
+        ('end', {'answer': 'cevap [soru]'}),
+    ]
+    # The cached answer comes back as a single piece
+    assert _events(asyncio.run(_stream('soru'))) == [
+        (None, {'token': 'cevap [soru]'}),
+        ('end', {'answer': 'cevap [soru]'}),
+    ]
+    assert _events(asyncio.run(_stream('hata'))) == [
+        (None, {'token': 'cevap'}),
+        ('error', {'detail': 'model failed'}),
+    ]
+
+
+class FakeWebSocket:
+    def __init__(self, messages):
+        self.messages = list(messages)
+        self.sent = []
+
+    async def accept(self):
+        pass
+
+    async def receive_text(self):
+        if not self.messages:
+            raise api_server.WebSocketDisconnect()
+        return self.messages.pop(0)
+
+    async def send_json(self, data):
+        self.sent.append(data)
+
+
+def test_websocket_frames_every_message(pool):
+    websocket = FakeWebSocket(['soru', 'hata', 'diger'])
+    asyncio.run(api_server.websocket_endpoint(websocket))
+    assert websocket.sent == [
+        {'token': 'cevap'},
+        {'token': ' [soru]'},
+        {'done': True, 'answer': 'cevap [soru]'},
+        {'token': 'cevap'},
+        {'error': 'model failed'},
+        {'token': 'cevap'},
+        {'token': ' [diger]'},
+        {'done': True, 'answer': 'cevap [diger]'},
+    ]
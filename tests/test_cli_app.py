@@ -0,0 +1,73 @@
+import json
+import subprocess
+import sys
+import textwrap
+from pathlib import Path
+
+import pytest
+
+SRC = Path(__file__).resolve().parents[1] / 'src'
+sys.path.insert(0, str(SRC))
+
+pytest.importorskip('yaml')
+
+
+def _run_cli(tmp_path, *argv):
+    """Run ``cli_app.main`` in a fresh interpreter and report what it imported."""
+    script = textwrap.dedent(f"""
+        import json, sys
+        sys.path.insert(0, {str(SRC)!r})
+        sys.argv = ['cli_app', *{list(argv)!r}]
+        import cli_app
+        cli_app.main()
+        print(json.dumps(sorted(sys.modules)))
+    """)
+    result = subprocess.run(
+        [sys.executable, '-c', script], cwd=tmp_path, capture_output=True, text=True, timeout=60
+    )
+    assert result.returncode == 0, result.stderr
+    *output, modules = result.stdout.strip().splitlines()
+    return output, set(json.loads(modules)), result.stderr
+
+
+def test_light_subcommands_skip_heavy_imports(tmp_path):
+    output, modules, _ = _run_cli(tmp_path, '--recommend', 'Bursa', 'fabrika')
+    assert output == ['Onerilen marka: X']
+    assert not modules & {'ask_llm', 'torch', 'llama_cpp', 'doc_search'}
+
+    spec = tmp_path / 'spec.txt'
+    spec.write_text('Bu ihalede 5 adet kamera ve 3 personel istenmektedir')
+    output, modules, _ = _run_cli(tmp_path, '--spec', str(spec))
+    assert json.loads('\n'.join(output))['kamera'] == 5
+    assert not modules & {'ask_llm', 'torch', 'llama_cpp', 'doc_search'}
+
+
+def test_profile_startup_reports_project_imports(tmp_path):
+    _, _, stderr = _run_cli(tmp_path, '--profile-startup', '--recommend', 'Bursa', 'fabrika')
+    names = [line.split()[-1] for line in stderr.splitlines()[1:]]
+    assert stderr.startswith('Import times (inclusive):')
+    assert {'config', 'fault_matcher'} <= set(names)
+    assert names[-1] == 'total'
+
+
+def test_import_profiler_times_nested_modules(tmp_path, monkeypatch):
+    (tmp_path / 'prof_outer.py').write_text('import prof_inner\n')
+    (tmp_path / 'prof_inner.py').write_text('import time\ntime.sleep(0.01)\n')
+    monkeypatch.syspath_prepend(str(tmp_path))
+    # cli_app sets up logs/ in the working directory on import
+    monkeypatch.chdir(tmp_path)
+    from cli_app import ImportProfiler
+
+    profiler = ImportProfiler()
+    profiler.start()
+    try:
+        import prof_outer  # noqa: F401
+    finally:
+        profiler.stop()
+    records = {name: (depth, seconds) for depth, name, seconds in profiler.records}
+    assert records['prof_outer'][0] == 0 and records['prof_inner'][0] == 1
+    assert records['prof_outer'][1] >= records['prof_inner'][1] >= 0.01
+    report = profiler.report().splitlines()
+    assert report[1].endswith(' prof_outer') and report[2].endswith('   prof_inner')
+    monkeypatch.delitem(sys.modules, 'prof_outer')
+    monkeypatch.delitem(sys.modules, 'prof_inner')
@@ -0,0 +1,69 @@
+import socket
+import sys
+import threading
+import time
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / 'src'))
+
+pytest.importorskip('yaml')
+import cli_daemon
+
+
+def _handler(query):
+    if query == 'boom':
+        raise ValueError('broken')
+    return f'cevap: {query}', {'items': []}
+
+
+def _start(path):
+    threading.Thread(target=cli_daemon.serve, args=('model.gguf', _handler, path), daemon=True).start()
+    for _ in range(100):
+        if path.exists():
+            break
+        time.sleep(0.01)
+
+
+def test_queries_go_to_the_resident_daemon(tmp_path):
+    path = tmp_path / 'run' / 'cli.sock'
+    assert cli_daemon.ask('kod 135', 'model.gguf', path) is None
+
+    _start(path)
+    assert oct(path.stat().st_mode & 0o777) == '0o600'
+    assert oct(path.parent.stat().st_mode & 0o777) == '0o700'
+    assert oct(cli_daemon._key_path(path).stat().st_mode & 0o777) == '0o600'
+    assert cli_daemon.ask('kod 135', 'model.gguf', path) == ('cevap: kod 135', {'items': []})
+    assert cli_daemon.ask('kod 135', 'other.gguf', path) is None
+    assert cli_daemon.ask('boom', 'model.gguf', path) is None
+    with pytest.raises(RuntimeError):
+        cli_daemon.serve('model.gguf', _handler, path)
+
+
+def test_stuck_client_times_out(tmp_path, monkeypatch):
+    monkeypatch.setattr(cli_daemon, 'REQUEST_TIMEOUT', 0.2)
+    path = tmp_path / 'run' / 'cli.sock'
+    _start(path)
+    stuck = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    stuck.connect(str(path))
+    start = time.monotonic()
+    assert cli_daemon.ask('kod 135', 'model.gguf', path) == ('cevap: kod 135', {'items': []})
+    assert time.monotonic() - start < 2
+    stuck.close()
+
+
+def test_untrusted_socket_or_key_is_refused(tmp_path):
+    path = tmp_path / 'run' / 'cli.sock'
+    _start(path)
+    path.parent.chmod(0o777)
+    assert cli_daemon.ask('kod 135', 'model.gguf', path) is None
+    path.parent.chmod(0o700)
+
+    # A peer that does not know the key gets no answer, and vice versa
+    key_path = cli_daemon._key_path(path)
+    key = key_path.read_bytes()
+    key_path.write_bytes(b'x' * 32)
+    assert cli_daemon.ask('kod 135', 'model.gguf', path) is None
+    key_path.write_bytes(key)
+    assert cli_daemon.ask('kod 135', 'model.gguf', path) == ('cevap: kod 135', {'items': []})
@@ -0,0 +1,123 @@
+import sys
+from pathlib import Path
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / 'src'))
+
+np = pytest.importorskip('numpy')
+pytest.importorskip('yaml')
+import doc_embed
+from doc_search import build_index, search
+
+# Toy semantic space: synonyms share a dimension
+CONCEPTS = {'haberlesmiyor': 0, 'iletisim': 0, 'kaybi': 0, 'aku': 1, 'batarya': 1, 'duman': 2}
+
+
+class FakeEmbedder:
+    name = 'fake'
+
+    def __init__(self):
+        self.calls = 0
+
+    def embed(self, texts):
+        self.calls += len(texts)
+        out = np.full((len(texts), 4), 0.01, dtype=np.float32)
+        for row, text in enumerate(texts):
+            for word in text.lower().split():
+                if word in CONCEPTS:
+                    out[row, CONCEPTS[word]] += 1
+        return out
+
+
+@pytest.fixture
+def docs_index(tmp_path):
+    docs = tmp_path / 'docs'
+    docs.mkdir()
+    (docs / 'a.txt').write_text('iletisim kaybi olursa kabloyu kontrol edin\n\naku voltajini olcun\n\nduman dedektoru temizligi\n')
+    return build_index(docs, tmp_path / 'index')
+
+
+def test_sync_store_reuses_unchanged_vectors(tmp_path, docs_index):
+    embedder = FakeEmbedder()
+    store = doc_embed.sync_store(docs_index, embedder, tmp_path / 'vectors')
+    assert store.vectors.dtype == np.float16
+    assert store.vectors.shape == (3, 4)
+    assert embedder.calls == 3
+
+    docs = tmp_path / 'docs'
+    (docs / 'b.txt').write_text('batarya degisimi\n')
+    index = build_index(docs, tmp_path / 'index')
+    store = doc_embed.sync_store(index, embedder, tmp_path / 'vectors')
+    assert embedder.calls == 4
+    ids, scores = store.search(embedder.embed(['aku'])[0], 2)
+    assert {index.passage(int(i)) for i in ids} == {'aku voltajini olcun', 'batarya degisimi'}
+
+
+def test_ivf_search_matches_brute_force(tmp_path, monkeypatch):
+    rng = np.random.default_rng(1)
+    data = rng.normal(size=(400, 8)).astype(np.float32)
+
+    class Index:
+        def __len__(self):
+            return len(data)
+
+        def passage(self, pid):
+            return str(pid)
+
+        def passages(self):
+            return (str(i) for i in range(len(data)))
+
+    class RowEmbedder:
+        name = 'rows'
+
+        def embed(self, texts):
+            return data[[int(t) for t in texts]]
+
+    monkeypatch.setattr(doc_embed, 'IVF_MIN_VECTORS', 100)
+    store = doc_embed.sync_store(Index(), RowEmbedder(), tmp_path / 'vectors')
+    assert store.centroids is not None
+    ids, _ = store.search(data[7], 1, nprobe=len(store.centroids))
+    assert ids[0] == 7
+    ids, _ = store.search(data[7], 5, nprobe=2)
+    assert 7 in ids
+
+
+def test_hybrid_search_finds_synonyms(tmp_path, monkeypatch, docs_index):
+    monkeypatch.setattr(doc_embed, 'get_embedder', FakeEmbedder)
+    monkeypatch.setattr(doc_embed, 'VECTORS_DIR', tmp_path / 'vectors')
+    assert search('panel haberlesmiyor', index=docs_index, mode='dense').startswith('iletisim kaybi')
+    hits = search('panel haberlesmiyor aku', k=2, index=docs_index, mode='hybrid')
+    assert {h.text.split()[0] for h in hits} == {'iletisim', 'aku'}
+
+
+def test_dense_search_embeds_one_question_at_a_time(tmp_path, monkeypatch, docs_index):
+    import threading
+    import time
+
+    class SingleThreadEmbedder(FakeEmbedder):
+        active = 0
+        overlaps = 0
+
+        def embed(self, texts):
+            SingleThreadEmbedder.active += 1
+            if SingleThreadEmbedder.active > 1:
+                SingleThreadEmbedder.overlaps += 1
+            time.sleep(0.005)
+            try:
+                return super().embed(texts)
+            finally:
+                SingleThreadEmbedder.active -= 1
+
+    embedder = SingleThreadEmbedder()
+    monkeypatch.setattr(doc_embed, 'get_embedder', lambda: embedder)
+    monkeypatch.setattr(doc_embed, 'VECTORS_DIR', tmp_path / 'vectors')
+    monkeypatch.setattr(doc_embed, '_STORE', None)
+    threads = [
+        threading.Thread(target=doc_embed.dense_search, args=(docs_index, 'aku bitti', 2)) for _ in range(8)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert SingleThreadEmbedder.overlaps == 0
+    assert embedder.calls == 3 + 8  # the store is embedded once
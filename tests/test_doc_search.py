@@ -14,3 +14,145 @@ def test_doc_search_fuzzy():
     sample.write_text('Panel acil durdugu anda baglantilari kontrol edin')
     result = search('panel durdu ne yapmali')
     assert 'baglantilari' in result
+
+
+def test_index_ranks_paragraph_chunks(tmp_path):
+    from doc_search import build_index
+
+    docs = tmp_path / 'docs'
+    docs.mkdir()
+    (docs / 'a.txt').write_text(
+        'kablo kontrol edin\n\nzone 3 offline ise\nloop 2 kablosunu kontrol edin\n'
+    )
+    (docs / 'sub').mkdir()
+    (docs / 'sub' / 'b.txt').write_text('panel sifresi 1234\n')
+    index = build_index(docs, tmp_path / 'index')
+    assert len(index) == 3
+    assert search('zone 3 offline', index=index) == 'zone 3 offline ise\nloop 2 kablosunu kontrol edin'
+    hits = search('panel sifresi nedir', k=2, index=index)
+    assert hits[0].text == 'panel sifresi 1234'
+    assert hits[0].source == 'sub/b.txt'
+    assert len(hits) == 1
+
+
+def test_bm25_prefers_rare_terms(tmp_path):
+    from doc_search import build_index
+
+    docs = tmp_path / 'docs'
+    docs.mkdir()
+    common = '\n\n'.join(f'panel kontrol {i}' for i in range(10))
+    (docs / 'a.txt').write_text(common + '\n\nakü degisimi panel kapaginin altindadir\n')
+    index = build_index(docs, tmp_path / 'index')
+    hits = search('panel akü', k=3, index=index)
+    assert hits[0].text.startswith('akü')
+    assert hits[0].score > hits[1].score >= hits[2].score
+
+
+def test_chunk_splits_long_paragraphs():
+    from doc_search import CHUNK_WORDS, _chunk
+
+    chunks = _chunk(' '.join(['kelime'] * (CHUNK_WORDS * 2 + 5)) + '\nson satir\n\n\nikinci paragraf')
+    assert [len(c.split()) for c in chunks] == [CHUNK_WORDS, CHUNK_WORDS, 7, 2]
+
+
+def test_load_index_rebuilds_when_docs_change(tmp_path):
+    from doc_search import build_index, load_index
+
+    docs = tmp_path / 'docs'
+    docs.mkdir()
+    (docs / 'a.txt').write_text('eski bilgi\n')
+    build_index(docs, tmp_path / 'index')
+    (docs / 'b.txt').write_text('yeni bilgi satiri\n')
+    index = load_index(docs, tmp_path / 'index')
+    assert len(index) == 2
+
+
+def test_update_index_only_retokenizes_changed_files(tmp_path, monkeypatch):
+    import doc_search
+    from doc_search import build_index, update_index
+
+    docs = tmp_path / 'docs'
+    docs.mkdir()
+    (docs / 'a.txt').write_text('alarm paneli sifirlama adimlari\n')
+    (docs / 'b.txt').write_text('eski sensor bilgisi\n')
+    (docs / 'c.txt').write_text('silinecek dosya\n')
+    build_index(docs, tmp_path / 'index')
+
+    (docs / 'b.txt').write_text('yeni duman sensoru montaji\n\nikinci paragraf\n')
+    (docs / 'c.txt').unlink()
+    read = []
+    original = doc_search._read_chunks
+    monkeypatch.setattr(doc_search, '_read_chunks', lambda p: read.append(p.name) or original(p))
+    index = update_index(docs, tmp_path / 'index')
+
+    assert read == ['b.txt']
+    assert sorted(index.manifest) == ['a.txt', 'b.txt']
+    assert list(index.passages()) == ['alarm paneli sifirlama adimlari', 'yeni duman sensoru montaji', 'ikinci paragraf']
+    assert search('alarm paneli sifirlama', index=index) == 'alarm paneli sifirlama adimlari'
+    assert search('duman sensoru', index=index) == 'yeni duman sensoru montaji'
+    assert 'eski' not in index.vocab
+    assert update_index(docs, tmp_path / 'index').manifest == index.manifest
+
+
+def test_refresh_index_only_swaps_on_change(tmp_path, monkeypatch):
+    import doc_search
+
+    docs = tmp_path / 'docs'
+    docs.mkdir()
+    (docs / 'a.txt').write_text('alarm paneli\n')
+    monkeypatch.setattr(doc_search, 'load_index', lambda: doc_search.update_index(docs, tmp_path / 'index'))
+    monkeypatch.setattr(doc_search, '_INDEX', None)
+
+    assert doc_search.refresh_index()
+    current = doc_search._INDEX
+    assert not doc_search.refresh_index()
+    assert doc_search._INDEX is current
+
+    (docs / 'b.txt').write_text('yeni duman sensoru\n')
+    assert doc_search.refresh_index()
+    assert doc_search._INDEX is not current
+    assert len(doc_search._INDEX) == 2
+
+
+def test_fuzzy_fallback_handles_turkish_typos(tmp_path):
+    from doc_search import build_index
+
+    docs = tmp_path / 'docs'
+    docs.mkdir()
+    (docs / 'a.txt').write_text(
+        'Akulerin voltajini olcun\n\nIletisim hatasinda panel kablolarini kontrol edin\n'
+    )
+    index = build_index(docs, tmp_path / 'index')
+    assert search('İLETİŞİM hatası', index=index).startswith('Iletisim')
+    hits = search('iletsim hatsinda', k=1, index=index)
+    assert hits[0].text.startswith('Iletisim')
+
+
+def test_fuzzy_matches_are_fused_with_a_stray_lexical_hit(tmp_path):
+    from doc_search import build_index
+
+    docs = tmp_path / 'docs'
+    docs.mkdir()
+    (docs / 'a.txt').write_text(
+        'Panel kapagini vidalari sokerek acin\n\nIletisim hatasinda kablolarini kontrol edin\n'
+    )
+    index = build_index(docs, tmp_path / 'index')
+    # Only "panel" is spelt right and it points at the wrong chunk
+    hits = search('iletsim hatsinda panel', k=2, index=index)
+    assert {hit.text.split()[0] for hit in hits} == {'Panel', 'Iletisim'}
+    assert search('panel kapagini acin', index=index).startswith('Panel')
+
+
+def test_filler_words_do_not_override_bm25(tmp_path):
+    from doc_search import build_index
+
+    docs = tmp_path / 'docs'
+    docs.mkdir()
+    (docs / 'a.txt').write_text(
+        'Aku degisimi icin paneli kapatin, eski akuyu cikarin ve yeni akunun kablolarini '
+        'kirmizi arti kutba gelecek sekilde baglayin\n\nSirene ne zaman bakim yapilir\n'
+    )
+    index = build_index(docs, tmp_path / 'index')
+    hits = search('akü degisimi nasil yapilir bana anlatir misin', k=2, index=index)
+    assert hits[0].text.startswith('Aku degisimi')
+    assert hits[0].score == search('aku degisimi', k=1, index=index)[0].score
@@ -0,0 +1,120 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / 'src'))
+
+pytest.importorskip('yaml')
+from fault_matcher import FaultEntry, FaultMatcher, get_matcher
+
+
+def _matcher():
+    return FaultMatcher([
+        FaultEntry('135', 'buton'),
+        FaultEntry('E-12', 'sensor kirli', ['duman sensoru kirli']),
+        FaultEntry('zone 3 offline', 'loop 2'),
+        FaultEntry('zone 3', 'bolge 3'),
+    ])
+
+
+def test_whole_words_only():
+    matcher = _matcher()
+    assert matcher.match('Kod 135 ne demek?').code == '135'
+    assert matcher.match('kod 1350 ne demek') is None
+
+
+def test_longest_code_and_aliases_win():
+    matcher = _matcher()
+    assert matcher.match('ZONE 3 OFFLINE oldu').code == 'zone 3 offline'
+    assert matcher.match('zone 3 arizasi').code == 'zone 3'
+    assert matcher.match('panelde duman sensörü kirli yaziyor').code == 'E-12'
+
+
+def test_compact_codes_from_speech():
+    matcher = _matcher()
+    assert matcher.match('e 12 hatasi').code == 'E-12'
+    assert matcher.match('E12 ne demek').code == 'E-12'
+    assert matcher.match('kod 0135').code == '135'
+    assert matcher.match('kod135 cikti').code == '135'
+
+
+def test_separate_numbers_are_not_joined():
+    matcher = FaultMatcher([FaultEntry('135', 'buton'), FaultEntry('212', 'dedektor')])
+    assert matcher.match('zone 2 12 dedektor var') is None
+    assert matcher.match('1 35 dakika once') is None
+    assert matcher.match('saat 13 5 te') is None
+
+
+def test_large_catalogue():
+    matcher = FaultMatcher([FaultEntry(f'F{i}', f'd{i}') for i in range(20000)])
+    assert matcher.match('panel F 19999 gosteriyor').description == 'd19999'
+    assert matcher.match('panel f7 gosteriyor').description == 'd7'
+
+
+def test_shipped_knowledge_file(tmp_path):
+    from fault_matcher import KNOWLEDGE_PATH
+
+    assert get_matcher(KNOWLEDGE_PATH, tmp_path / 'faults.db').match('Kod 227 ne anlama gelir').code == '227'
+
+
+def test_compiled_store_matches_like_the_automaton(tmp_path):
+    import json
+    from fault_matcher import FaultStore, build_fault_index
+
+    source = tmp_path / 'faults.json'
+    source.write_text(json.dumps([
+        {'code': '135', 'description': 'buton'},
+        {'code': 'zone 3 offline', 'description': 'loop 2'},
+        {'code': 'zone 3', 'description': 'bolge 3'},
+        {'brand': 'Esser', 'code': 'E-12', 'description': 'esser sensor'},
+        {'brand': 'Notifier', 'code': 'E-12', 'description': 'notifier sensor', 'aliases': ['kirli dedektor']},
+    ]), encoding='utf-8')
+    assert build_fault_index([source], tmp_path / 'faults.db') == 5
+    store = FaultStore(tmp_path / 'faults.db')
+    matcher = FaultMatcher.from_json(source)
+    for question in (
+        'Kod 135 ne demek?', 'kod 1350', 'ZONE 3 OFFLINE oldu', 'zone 3 arizasi', 'kod 0135', 'kod135',
+        '1 35 dakika once', 'saat 13 5 te',
+    ):
+        expected = matcher.match(question)
+        found = store.match(question)
+        assert (found and found.code) == (expected and expected.code)
+    assert store.match('ESSER panelde E 12').description == 'esser sensor'
+    assert store.match('notifier panelde e12').description == 'notifier sensor'
+    assert store.match('kirli dedektor uyarisi').brand == 'Notifier'
+    assert store.get('E-12', 'Esser').description == 'esser sensor'
+
+
+def test_stale_index_falls_back_to_json(tmp_path):
+    import json
+    import os
+    from fault_matcher import FaultStore, build_fault_index
+
+    source = tmp_path / 'faults.json'
+    source.write_text(json.dumps([{'code': '135', 'description': 'buton'}]), encoding='utf-8')
+    build_fault_index([source], tmp_path / 'faults.db')
+    assert isinstance(get_matcher(source, tmp_path / 'faults.db'), FaultStore)
+    os.utime(source, ns=(0, (tmp_path / 'faults.db').stat().st_mtime_ns + 1))
+    get_matcher.cache_clear()
+    assert isinstance(get_matcher(source, tmp_path / 'faults.db'), FaultMatcher)
+
+
+def test_index_tracks_every_source(tmp_path):
+    import json
+    import os
+    from fault_matcher import FaultStore, build_fault_index
+
+    knowledge = tmp_path / 'faults.json'
+    knowledge.write_text(json.dumps([{'code': '135', 'description': 'buton'}]), encoding='utf-8')
+    vendor = tmp_path / 'vendor.json'
+    vendor.write_text(json.dumps([{'brand': 'Esser', 'code': 'E-12', 'description': 'sensor'}]), encoding='utf-8')
+
+    build_fault_index([vendor], tmp_path / 'vendor.db')
+    assert isinstance(get_matcher(knowledge, tmp_path / 'vendor.db'), FaultMatcher)
+
+    build_fault_index([vendor, knowledge], tmp_path / 'faults.db')
+    assert isinstance(get_matcher(knowledge, tmp_path / 'faults.db'), FaultStore)
+    os.utime(vendor, ns=(0, vendor.stat().st_mtime_ns + 1))
+    get_matcher.cache_clear()
+    assert isinstance(get_matcher(knowledge, tmp_path / 'faults.db'), FaultMatcher)
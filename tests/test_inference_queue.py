@@ -0,0 +1,100 @@
+import sys
+import threading
+from pathlib import Path
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / 'src'))
+
+from inference_queue import BULK, INTERACTIVE, InferenceScheduler, QueueFullError
+
+
+def test_interactive_jobs_run_before_bulk():
+    gate = threading.Event()
+    order = []
+    scheduler = InferenceScheduler(['ctx'], max_queue=10)
+    blocker = scheduler.submit(lambda ctx: gate.wait(5))
+    while scheduler.depth():
+        pass
+    bulk = [scheduler.submit(lambda ctx, i=i: order.append(f'bulk{i}'), priority=BULK) for i in range(2)]
+    fast = scheduler.submit(lambda ctx: order.append(ctx), priority=INTERACTIVE)
+    gate.set()
+    for future in [blocker, fast, *bulk]:
+        future.result(timeout=5)
+    assert order == ['ctx', 'bulk0', 'bulk1']
+    scheduler.close()
+
+
+def test_full_queue_rejects_and_close_cancels():
+    gate = threading.Event()
+    waits = []
+    scheduler = InferenceScheduler(['ctx'], max_queue=1, on_wait=waits.append)
+    running = scheduler.submit(lambda ctx: gate.wait(5))
+    while scheduler.depth():
+        pass
+    queued = scheduler.submit(lambda ctx: 'never')
+    with pytest.raises(QueueFullError) as info:
+        scheduler.submit(lambda ctx: 'rejected')
+    assert info.value.retry_after >= 1
+    scheduler.close()
+    gate.set()
+    assert running.result(timeout=5) is True
+    assert queued.cancelled()
+    assert len(waits) == 1
+
+
+def test_job_errors_reach_the_caller():
+    scheduler = InferenceScheduler(['ctx'])
+    future = scheduler.submit(lambda ctx: 1 / 0)
+    with pytest.raises(ZeroDivisionError):
+        future.result(timeout=5)
+    scheduler.close()
+
+
+def _blocked_scheduler(**kwargs):
+    gate = threading.Event()
+    scheduler = InferenceScheduler(['ctx'], **kwargs)
+    scheduler.submit(lambda ctx: gate.wait(5))
+    while scheduler.depth():
+        pass
+    return scheduler, gate
+
+
+def test_cancelled_jobs_free_their_slots():
+    scheduler, gate = _blocked_scheduler(max_queue=2, reserve=0)
+    queued = [scheduler.submit(lambda ctx: 'x', priority=BULK) for _ in range(2)]
+    with pytest.raises(QueueFullError):
+        scheduler.submit(lambda ctx: 'x')
+    for future in queued:
+        future.cancel()
+    assert scheduler.depth() == 0
+    again = [scheduler.submit(lambda ctx: 'y') for _ in range(2)]
+    gate.set()
+    assert [f.result(timeout=5) for f in again] == ['y', 'y']
+    scheduler.close()
+
+
+def test_bulk_leaves_headroom_for_interactive():
+    scheduler, gate = _blocked_scheduler(max_queue=4, reserve=1)
+    assert scheduler.capacity(BULK) == 3
+    for _ in range(3):
+        scheduler.submit(lambda ctx: 'bulk', priority=BULK)
+    with pytest.raises(QueueFullError):
+        scheduler.submit(lambda ctx: 'bulk', priority=BULK)
+    fast = scheduler.submit(lambda ctx: 'fast', priority=INTERACTIVE)
+    assert scheduler.free(INTERACTIVE) == 0
+    gate.set()
+    assert fast.result(timeout=5) == 'fast'
+    scheduler.close()
+
+
+def test_submit_many_is_all_or_nothing():
+    scheduler, gate = _blocked_scheduler(max_queue=3, reserve=0)
+    scheduler.submit(lambda ctx: 0, priority=BULK)
+    jobs = [(lambda ctx, i: i, (i,)) for i in range(3)]
+    with pytest.raises(QueueFullError):
+        scheduler.submit_many(jobs, priority=BULK)
+    assert scheduler.depth() == 1
+    futures = scheduler.submit_many(jobs[:2], priority=BULK)
+    gate.set()
+    assert [f.result(timeout=5) for f in futures] == [0, 1]
+    scheduler.close()
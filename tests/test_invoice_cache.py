@@ -0,0 +1,51 @@
+import sys
+from datetime import date
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / 'src'))
+
+pytest.importorskip('yaml')
+from invoice_cache import InvoiceCache, file_digest, tree_fingerprint
+
+
+def test_results_are_keyed_by_content_and_version(tmp_path):
+    first = tmp_path / 'a.pdf'
+    resent = tmp_path / 'kopya.pdf'
+    first.write_bytes(b'%PDF fatura 1')
+    resent.write_bytes(b'%PDF fatura 1')
+    assert file_digest(first) == file_digest(resent)
+
+    cache = InvoiceCache(tmp_path / 'invoices.db')
+    cache.set(file_digest(first), 'v1', {'tutar': 120.5, 'tarih': date(2024, 5, 1)})
+    assert cache.get(file_digest(resent), 'v1') == {'tutar': 120.5, 'tarih': date(2024, 5, 1)}
+    assert cache.get(file_digest(resent), 'v2') is None
+    other = tmp_path / 'b.pdf'
+    other.write_bytes(b'%PDF fatura 2')
+    assert cache.get_many([file_digest(first), file_digest(other)], 'v1').keys() == {file_digest(first)}
+    cache.close()
+
+
+def test_template_changes_change_the_fingerprint(tmp_path):
+    import os
+
+    assert tree_fingerprint(None) == tree_fingerprint(tmp_path / 'yok') == 'none'
+    (tmp_path / 'firma.yml').write_text('issuer: A', encoding='utf-8')
+    before = tree_fingerprint(tmp_path)
+    (tmp_path / 'firma.yml').write_text('issuer: AB', encoding='utf-8')
+    os.utime(tmp_path / 'firma.yml', ns=(0, 10**9))
+    assert tree_fingerprint(tmp_path) != before
+
+
+def test_cache_is_bounded_and_drops_other_versions_first(tmp_path):
+    cache = InvoiceCache(tmp_path / 'invoices.db', max_entries=3)
+    cache.set(b'old', 'v1', {'n': 0})
+    cache.set_many([(bytes([i]), {'n': i}) for i in range(1, 4)], 'v2')
+    assert cache.prune('v2') == 1
+    assert cache.get(b'old', 'v1') is None
+    assert cache.get_many([bytes([i]) for i in range(1, 4)], 'v2').keys() == {b'\x01', b'\x02', b'\x03'}
+    cache.set(b'\x04', 'v2', {'n': 4})
+    assert cache.prune('v2') == 1
+    assert cache.get(b'\x01', 'v2') is None
+    cache.close()
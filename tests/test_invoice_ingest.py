@@ -0,0 +1,99 @@
+import json
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / 'src'))
+
+pytest.importorskip('yaml')
+import invoice_ingest
+from invoice_ingest import InvoiceIngestor, InvoiceQueue
+
+
+class FakeParser:
+    def __init__(self):
+        self.seen = []
+
+    def parse_many(self, paths):
+        for i, path in enumerate(paths):
+            self.seen.append(Path(path).name)
+            text = Path(path).read_text(encoding='utf-8')
+            yield i, ValueError('okunamadi') if text == 'bozuk' else {'metin': text}
+
+
+def test_inbox_files_are_parsed_once_and_retried(tmp_path, monkeypatch):
+    monkeypatch.setattr(invoice_ingest, 'MAX_ATTEMPTS', 2)
+    inbox, outbox = tmp_path / 'inbox', tmp_path / 'outbox'
+    inbox.mkdir()
+    (inbox / 'a.png').write_text('fatura a', encoding='utf-8')
+    (inbox / 'b.png').write_text('bozuk', encoding='utf-8')
+    (inbox / '.yukleniyor').write_text('yarim', encoding='utf-8')
+    queue = InvoiceQueue(tmp_path / 'queue.db')
+    parser = FakeParser()
+    ingestor = InvoiceIngestor(inbox, outbox, queue, parser=parser)
+
+    assert ingestor.scan() == 0  # sizes are not known to be stable yet
+    assert ingestor.scan() == 2
+    ingestor.run(once=True)
+    assert json.loads((outbox / 'a.png.json').read_text(encoding='utf-8'))['sonuc'] == {'metin': 'fatura a'}
+    assert json.loads((outbox / 'b.png.error.json').read_text(encoding='utf-8'))['hata'] == 'okunamadi'
+    assert sorted(parser.seen) == ['a.png', 'b.png', 'b.png']
+    assert queue.stats()['done'] == 1 and queue.stats()['failed'] == 1
+
+    # A restarted service does not parse unchanged files again
+    ingestor = InvoiceIngestor(inbox, outbox, queue, parser=parser)
+    ingestor.run(once=True)
+    assert len(parser.seen) == 3
+    queue.close()
+
+
+def test_running_jobs_are_recovered(tmp_path):
+    queue = InvoiceQueue(tmp_path / 'queue.db')
+    queue.enqueue([('x.png', 1, 1), ('y.png', 1, 1)])
+    assert [path for _, path, _ in queue.claim(1)] == ['x.png']
+    assert queue.recover() == 1
+    assert [(path, attempt) for _, path, attempt in queue.claim(5)] == [('x.png', 2), ('y.png', 1)]
+    queue.close()
+
+
+class CrashingParser(FakeParser):
+    def parse_many(self, paths):
+        for i, path in enumerate(paths):
+            if Path(path).read_text(encoding='utf-8') == 'patlak':
+                raise RuntimeError('parser coktu')
+            self.seen.append(Path(path).name)
+            yield i, {'metin': 'tamam'}
+
+
+def test_parser_crash_fails_the_rest_of_the_batch(tmp_path, monkeypatch):
+    monkeypatch.setattr(invoice_ingest, 'MAX_ATTEMPTS', 2)
+    inbox, outbox = tmp_path / 'inbox', tmp_path / 'outbox'
+    inbox.mkdir()
+    files = []
+    for name, text in (('a.png', 'fatura'), ('b.png', 'patlak'), ('c.png', 'fatura')):
+        (inbox / name).write_text(text, encoding='utf-8')
+        files.append((str(inbox / name), 1, 1))
+    queue = InvoiceQueue(tmp_path / 'queue.db')
+    queue.enqueue(files)
+    ingestor = InvoiceIngestor(inbox, outbox, queue, parser=CrashingParser())
+
+    assert ingestor.process_batch() == 3
+    assert (outbox / 'a.png.json').exists()
+    assert queue.stats()['running'] == 0 and queue.stats()['pending'] == 2
+    assert ingestor.process_batch() == 2
+    assert 'parser coktu' in json.loads((outbox / 'c.png.error.json').read_text(encoding='utf-8'))['hata']
+    assert queue.stats()['failed'] == 2 and queue.stats()['done'] == 1
+    queue.close()
+
+
+def test_jobs_out_of_attempts_are_not_claimed_again(tmp_path, monkeypatch):
+    monkeypatch.setattr(invoice_ingest, 'MAX_ATTEMPTS', 1)
+    queue = InvoiceQueue(tmp_path / 'queue.db')
+    queue.enqueue([('x.png', 1, 1), ('y.png', 1, 1)])
+    queue.claim(1)
+    # The process died while parsing x.png on its last attempt
+    assert queue.recover() == 0
+    assert [path for _, path, _ in queue.claim(5)] == ['y.png']
+    assert queue.stats()['failed'] == 1
+    queue.close()
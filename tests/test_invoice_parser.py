@@ -19,3 +19,52 @@ def test_missing_file():
     parser = InvoiceParser()
     with pytest.raises(FileNotFoundError):
         parser.parse_invoice('nofile.png')
+
+
+def test_parse_many_reports_errors_in_order(tmp_path):
+    parser = InvoiceParser()
+    broken = tmp_path / 'bozuk.png'
+    broken.write_bytes(b'not an image')
+    results = list(parser.parse_many(['nofile1.png', str(broken), 'nofile2.png']))
+    parser.close()
+    assert [i for i, _ in results] == [0, 1, 2]
+    assert isinstance(results[0][1], FileNotFoundError)
+    assert isinstance(results[1][1], Exception)
+    assert isinstance(results[2][1], FileNotFoundError)
+
+
+def test_parse_many_keeps_order_with_a_stubbed_ocr_pool(tmp_path, monkeypatch):
+    import invoice_parser
+
+    class FakePool:
+        def __init__(self):
+            self.calls = []
+
+        def map(self, fn, paths, langs):
+            paths, langs = list(paths), list(langs)
+            self.calls.append([Path(p).name for p in paths])
+            # Finish in reverse order; results must still line up
+            done = {p: fn(p, lang) for p, lang in reversed(list(zip(paths, langs)))}
+            return [done[p] for p in paths]
+
+        def shutdown(self, *args, **kwargs):
+            pass
+
+    monkeypatch.setattr(invoice_parser, 'ocr_file', lambda path, lang: {'text': Path(path).read_text()})
+    monkeypatch.setattr(invoice_parser, 'TESSERACT_WORKERS', 4)
+    parser = InvoiceParser(batch_size=1, cache=False)
+    if parser.use_donut:
+        pytest.skip('Donut is used on this machine')
+    pool = FakePool()
+    parser._pool = pool
+    for name, text in (('a.png', 'A'), ('a2.png', 'A'), ('b.png', 'B'), ('c.png', 'C')):
+        (tmp_path / name).write_text(text)
+    names = ['a.png', 'yok.png', 'a2.png', 'b.png', 'c.png']
+    results = list(parser.parse_many([str(tmp_path / n) for n in names]))
+
+    assert [i for i, _ in results] == [0, 1, 2, 3, 4]
+    assert results[0][1] == results[2][1] == {'text': 'A'}
+    assert isinstance(results[1][1], FileNotFoundError)
+    assert results[3][1] == {'text': 'B'} and results[4][1] == {'text': 'C'}
+    # The duplicate is parsed once; a lone file in a chunk skips the pool
+    assert pool.calls == [['a.png', 'b.png']]
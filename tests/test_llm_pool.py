@@ -0,0 +1,73 @@
+import logging
+import sys
+import threading
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / 'src'))
+
+pytest.importorskip('llama_cpp')
+import ask_llm
+from ask_llm import LLMError
+from prompt_cache import MemoryCache, PromptCache, TieredCache
+from text_normalize import cache_key
+
+
+class FakeClient:
+    """``LLMClient`` stand-in; two calls must overlap to get past the barrier."""
+
+    barrier = threading.Barrier(2, timeout=5)
+
+    def __init__(self, model_path, n_ctx=2048, n_threads=None):
+        self.n_threads = n_threads
+        self.threads = set()
+
+    def ask(self, prompt, max_tokens=256):
+        self.threads.add(threading.current_thread())
+        if prompt.startswith('hata'):
+            raise LLMError('model failed')
+        if prompt.endswith(' 0') or prompt.endswith(' 1'):
+            self.barrier.wait()
+        return f'cevap {prompt}'
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    monkeypatch.setattr(ask_llm, 'LLMClient', FakeClient)
+    pool = ask_llm.LLMPool('model.gguf', size=2, max_queue=3, mode='thread')
+    yield pool
+    pool.close()
+
+
+def test_prompts_fan_out_over_every_context(pool):
+    # The first two prompts only finish if both contexts run at once
+    futures = [pool.submit(f'soru {i}') for i in range(2)]
+    assert [f.result(timeout=5) for f in futures] == ['cevap soru 0', 'cevap soru 1']
+    assert all(len(client.threads) == 1 for client in pool._clients)
+    assert pool._clients[0].threads != pool._clients[1].threads
+
+
+def test_ask_many_larger_than_the_queue(pool):
+    prompts = [f'soru {i}' for i in range(20)]
+    answers = dict(pool.ask_many(prompts))
+    assert answers == {i: f'cevap soru {i}' for i in range(20)}
+    assert pool.scheduler.depth() == 0
+
+
+def test_prewarm_replays_questions_as_asked(tmp_path, monkeypatch, caplog):
+    cache = TieredCache(MemoryCache(), PromptCache(tmp_path / 'cache.db'))
+    monkeypatch.setattr(ask_llm, 'answer_cache', cache)
+    monkeypatch.setattr(ask_llm, 'answer_version', lambda model_path: model_path)
+    monkeypatch.setattr(ask_llm, 'LLMClient', FakeClient)
+    asked = []
+    monkeypatch.setattr(ask_llm, '_ask', lambda client, prompt, max_tokens: asked.append(prompt) or client.ask(prompt))
+    for question in ['Kod 135 ne demek?', 'Panel şifresi nedir?', 'hata verdi']:
+        cache.set(cache_key(question), 'eski', 'old.gguf', question=question)
+    # Already answered by the new model
+    cache.set(cache_key('Panel şifresi nedir?'), '1234', 'new.gguf')
+
+    with caplog.at_level(logging.INFO):
+        assert ask_llm.prewarm('new.gguf', 10, pool_size=1) == 1
+    assert sorted(asked) == ['Kod 135 ne demek?', 'hata verdi']
+    assert not [r for r in caplog.records if r.getMessage().startswith('Prewarmed')]
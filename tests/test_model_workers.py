@@ -0,0 +1,85 @@
+import multiprocessing
+import sys
+import threading
+import time
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / 'src'))
+
+pytest.importorskip('llama_cpp')
+import model_workers
+from ask_llm import LLMError
+
+
+class FakeClient:
+    """``LLMClient`` stand-in for the worker side of the pipe."""
+
+    def __init__(self):
+        self.closed = []
+
+    def generate(self, prompt, max_tokens=256):
+        if prompt == 'hata':
+            raise ValueError('model failed')
+        return f'cevap {prompt}'
+
+    def generate_stream(self, prompt, max_tokens=256):
+        sent = 0
+        try:
+            for sent in range(1, max_tokens + 1):
+                yield f'{sent} '
+                time.sleep(0.001)
+        finally:
+            self.closed.append((prompt, sent))
+
+
+@pytest.fixture
+def remote():
+    """``RemoteClient`` whose worker loop runs in a thread of this process."""
+    parent, child = multiprocessing.Pipe()
+    worker = FakeClient()
+    thread = threading.Thread(target=model_workers._serve, args=(child, worker), daemon=True)
+    thread.start()
+    client = model_workers.RemoteClient.__new__(model_workers.RemoteClient)
+    client._conn = parent
+    client._process = SimpleNamespace(pid=0)
+    yield client, worker
+    parent.close()
+    thread.join(timeout=5)
+    assert not thread.is_alive()
+
+
+def test_generate_and_errors_cross_the_pipe(remote):
+    client, _ = remote
+    assert client.generate('soru') == 'cevap soru'
+    with pytest.raises(LLMError, match='model failed'):
+        client.generate('hata')
+    assert client.generate('diger') == 'cevap diger'
+
+
+def test_stream_runs_to_completion(remote):
+    client, worker = remote
+    assert list(client.generate_stream('soru', max_tokens=3)) == ['1 ', '2 ', '3 ']
+    assert worker.closed == [('soru', 3)]
+
+
+def test_closing_a_stream_cancels_and_drains_the_worker(remote):
+    client, worker = remote
+    stream = client.generate_stream('uzun', max_tokens=10000)
+    assert next(stream) == '1 '
+    stream.close()
+    # The worker stopped early and nothing is left in the pipe
+    assert worker.closed and worker.closed[0][1] < 10000
+    assert not client._conn.poll()
+    assert client.generate('soru') == 'cevap soru'
+
+
+def test_cancel_after_the_stream_finished_is_ignored(remote):
+    client, _ = remote
+    assert list(client.generate_stream('soru', max_tokens=1)) == ['1 ']
+    # A cancel that lost the race with the end of the stream
+    client._conn.send('cancel')
+    assert client.generate('diger') == 'cevap diger'
+    assert list(client.generate_stream('sonra', max_tokens=2)) == ['1 ', '2 ']
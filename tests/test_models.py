@@ -1,10 +1,13 @@
 import sys
 from pathlib import Path
+from types import SimpleNamespace
 import pytest
 
 sys.path.insert(0, str(Path(__file__).resolve().parents[1] / 'src'))
 
+np = pytest.importorskip('numpy')
 pytest.importorskip('llama_cpp')
+import ask_llm
 from ask_llm import LLMClient
 
 
@@ -12,3 +15,67 @@ def test_llm_response_quality():
     client = LLMClient()
     response = client.ask('Yangin butonu ariza kodu nedir?')
     assert '135' in response
+
+
+def test_prompt_starts_with_static_prefix():
+    from ask_llm import FEW_SHOT_PREFIX
+
+    prompt = LLMClient._build_prompt(None, 'Kod 9 nedir?', 'Zone 3 offline')
+    assert prompt.startswith(FEW_SHOT_PREFIX + 'Bilgi: Zone 3 offline')
+    assert prompt.endswith('Soru: Kod 9 nedir?\nCevap:')
+
+
+class FakeLlama:
+    """``Llama`` stand-in tracking the evaluated tokens and state loads."""
+
+    def __init__(self, **kwargs):
+        self.input_ids = np.zeros(0, dtype=np.intc)
+        self.n_tokens = 0
+        self.evals = self.loads = 0
+
+    def tokenize(self, text):
+        return list(text)
+
+    def reset(self):
+        self.n_tokens = 0
+
+    def eval(self, tokens):
+        self.evals += 1
+        self.input_ids = np.concatenate([self.input_ids[:self.n_tokens], np.array(tokens, dtype=np.intc)])
+        self.n_tokens = len(self.input_ids)
+
+    def save_state(self):
+        return SimpleNamespace(input_ids=self.input_ids.copy(), n_tokens=self.n_tokens)
+
+    def load_state(self, state):
+        self.loads += 1
+        self.input_ids = state.input_ids.copy()
+        self.n_tokens = state.n_tokens
+
+
+def test_prefix_state_is_saved_and_reused(tmp_path, monkeypatch):
+    monkeypatch.setattr(ask_llm, 'Llama', FakeLlama)
+    monkeypatch.setattr(ask_llm, 'STATE_DIR', tmp_path / 'state')
+    model = tmp_path / 'model.gguf'
+    model.write_bytes(b'gguf')
+    prefix = list(ask_llm.FEW_SHOT_PREFIX.encode('utf-8'))
+
+    client = LLMClient(model)
+    assert client._llm.evals == 1 and client._llm.loads == 0
+    assert client._prefix_state_path().exists()
+
+    # Still resident after a prompt that extends the prefix: nothing to load
+    client._llm.eval(list(b'Soru: Kod 9?'))
+    client._restore_prefix()
+    assert client._llm.loads == 0
+
+    # Another prompt replaced the prefix: the saved state comes back
+    client._llm.reset()
+    client._llm.eval(list(b'baska bir prompt'))
+    client._restore_prefix()
+    assert client._llm.loads == 1
+    assert client._llm.input_ids[:len(prefix)].tolist() == prefix
+
+    # A second context loads the saved state instead of evaluating again
+    other = LLMClient(model)
+    assert other._llm.evals == 0 and other._llm.loads == 1
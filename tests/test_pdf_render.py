@@ -0,0 +1,50 @@
+import sys
+import threading
+import time
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / 'src'))
+
+pytest.importorskip('jinja2')
+pytest.importorskip('pdfkit')
+import pdf_render
+
+
+def test_registered_and_adhoc_templates():
+    pdf_render.register_template('test_liste', '{% for x in items %}<{{ x }}>{% endfor %}')
+    assert pdf_render.render('test_liste', items=[1, 2]) == '<1><2>'
+    assert pdf_render.render_string('Merhaba {{ ad }}', ad='Ali') == 'Merhaba Ali'
+    assert pdf_render._string_template('Merhaba {{ ad }}') is pdf_render._string_template('Merhaba {{ ad }}')
+
+
+def test_batch_rendering_bounds_concurrency(tmp_path, monkeypatch):
+    running = []
+    peak = []
+    lock = threading.Lock()
+
+    def fake_from_string(html, dest, options=None, configuration=None):
+        with lock:
+            running.append(dest)
+            peak.append(len(running))
+        time.sleep(0.01)
+        if 'bozuk' not in html:
+            Path(dest).write_text(html, encoding='utf-8')
+        with lock:
+            running.remove(dest)
+
+    monkeypatch.setattr(pdf_render.pdfkit, 'from_string', fake_from_string)
+    monkeypatch.setattr(pdf_render, 'pdf_configuration', lambda: None)
+    monkeypatch.setattr(pdf_render, 'PDF_WORKERS', 3)
+    monkeypatch.setattr(pdf_render, '_EXECUTOR', None)
+    pdf_render.register_template('test_belge', '<p>{{ metin }}</p>')
+
+    jobs = [('test_belge', tmp_path / f'{i}.pdf', {'metin': 'bozuk' if i == 7 else str(i)}) for i in range(20)]
+    results = dict(pdf_render.render_pdfs(jobs))
+    assert sorted(results) == list(range(20))
+    assert isinstance(results.pop(7), RuntimeError)
+    assert not any(results.values())
+    assert (tmp_path / '3.pdf').read_text(encoding='utf-8') == '<p>3</p>'
+    assert max(peak) <= 3
+    pdf_render._executor().shutdown()
@@ -16,3 +16,104 @@ def test_parse_request_flexible():
     items = parse_request("5 adet kamera, 2 tane dvr")
     assert any(it.name == "kamera" and it.quantity == 5 for it in items)
     assert any(it.name == "dvr" and it.quantity == 2 for it in items)
+
+def test_catalogue_matching_and_batch(tmp_path):
+    import os
+    import proforma_engine
+    from proforma_engine import PriceCatalogue, create_quotes
+
+    csv_path = tmp_path / "prices.csv"
+    csv_path.write_text(
+        "item,price,aliases\nkamera,100,cam\ndvr,250,\nduman_dedektoru,40,\nurun50,5,\n",
+        encoding="utf-8",
+    )
+    proforma_engine._CATALOGUE = PriceCatalogue(csv_path)
+    try:
+        quotes = create_quotes(["4 kameralar, 2 DVR", "3 duman_dedektorleri 2 cam", "1 kamere 1 urun501"])
+        assert [q["toplam"] for q in quotes] == [900.0, 320.0, 100.0]
+        assert quotes[1]["kalemler"][0]["katalog"] == "duman_dedektoru"
+        assert quotes[2]["bilinmeyen"] == ["urun501"]
+
+        csv_path.write_text("item,price\nkamera,120\n", encoding="utf-8")
+        os.utime(csv_path, ns=(0, csv_path.stat().st_mtime_ns + 10**9))
+        assert create_quotes(["1 kamera"])[0]["toplam"] == 120.0
+    finally:
+        proforma_engine._CATALOGUE = None
+
+
+def test_bulk_quotes_resume_after_interruption(tmp_path, monkeypatch):
+    import json
+    import proforma_engine
+    from proforma_engine import PriceCatalogue, bulk_quotes
+
+    prices = tmp_path / "prices.csv"
+    prices.write_text("item,price\nkamera,100\ndvr,250\n", encoding="utf-8")
+    monkeypatch.setattr(proforma_engine, "_CATALOGUE", PriceCatalogue(prices))
+    source = tmp_path / "ihale.jsonl"
+    lines = [{"id": f"T{i}", "request": f"{i} kamera, 1 dvr"} for i in range(1, 10)]
+    lines[4]["request"] = ""
+    source.write_text("\n".join(json.dumps(line) for line in lines), encoding="utf-8")
+
+    real_price_batch = proforma_engine._price_batch
+    calls = []
+
+    def interrupted(requests):
+        calls.append(requests)
+        if len(calls) == 3:
+            raise KeyboardInterrupt
+        return real_price_batch(requests)
+
+    out = tmp_path / "out"
+    monkeypatch.setattr(proforma_engine, "_price_batch", interrupted)
+    with pytest.raises(KeyboardInterrupt):
+        bulk_quotes(source, out, pdf=False, batch_size=2)
+    with (out / "manifest.jsonl").open("a", encoding="utf-8") as fh:
+        fh.write('{"id": "yarim')
+
+    monkeypatch.setattr(proforma_engine, "_price_batch", real_price_batch)
+    summary = bulk_quotes(source, out, pdf=False, batch_size=2)
+    manifest = [json.loads(line) for line in (out / "manifest.jsonl").read_text(encoding="utf-8").splitlines()]
+    assert [m["id"] for m in manifest] == [f"T{i}" for i in range(1, 10)]
+    assert manifest[4]["hata"] == "Urun belirtilmedi"
+    assert manifest[0]["toplam"] == 350.0
+    assert summary == {"islenen": 9, "hata": 1, "toplam": 100.0 * (45 - 5) + 250.0 * 8}
+
+
+def test_bulk_quotes_record_bad_lines_and_keep_pdfs_apart(tmp_path, monkeypatch):
+    import json
+    import os
+    from concurrent.futures import Future
+    import proforma_engine
+    from proforma_engine import PriceCatalogue, bulk_quotes
+
+    prices = tmp_path / "prices.csv"
+    prices.write_text("item,price\nkamera,100\n", encoding="utf-8")
+    monkeypatch.setattr(proforma_engine, "_CATALOGUE", PriceCatalogue(prices))
+    rendered = []
+
+    def fake_pdf(kind, dest, **context):
+        rendered.append(dest.name)
+        future = Future()
+        future.set_result(dest)
+        return future
+
+    monkeypatch.setattr(proforma_engine, "submit_pdf", fake_pdf)
+    source = tmp_path / "ihale.jsonl"
+    source.write_text(
+        '{"id": "A", "request": "1 kamera"}\n{bozuk\n[1, 2]\n{"id": "A", "request": "2 kamera"}\n',
+        encoding="utf-8",
+    )
+    out = tmp_path / "out"
+    summary = bulk_quotes(source, out, batch_size=3)
+    manifest = [json.loads(line) for line in (out / "manifest.jsonl").read_text(encoding="utf-8").splitlines()]
+    assert [m["id"] for m in manifest] == ["A", "2", "3", "A"]
+    assert "Gecersiz JSON" in manifest[1]["hata"] and "nesne" in manifest[2]["hata"]
+    assert [manifest[0]["pdf"], manifest[3]["pdf"]] == ["000001-A.pdf", "000004-A.pdf"]
+    assert sorted(rendered) == ["000001-A.pdf", "000004-A.pdf"]
+    assert summary == {"islenen": 4, "hata": 2, "toplam": 300.0}
+
+    # Same size, different content: the checkpoint no longer applies
+    source.write_text(source.read_text(encoding="utf-8").replace("1 kamera", "3 kamera"), encoding="utf-8")
+    os.utime(source, ns=(0, source.stat().st_mtime_ns + 1))
+    with pytest.raises(ValueError):
+        bulk_quotes(source, out)
@@ -0,0 +1,207 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / 'src'))
+
+pytest.importorskip('yaml')
+import prompt_cache
+from prompt_cache import MemoryCache, PromptCache, TieredCache
+
+
+def test_memory_cache_is_bounded_by_entries_and_bytes():
+    cache = MemoryCache(max_entries=2, max_bytes=1000)
+    cache.set('a', '1')
+    cache.set('b', '2')
+    cache.get('a')
+    assert cache.set('c', '3') == 1
+    assert cache.get('b') is None and cache.get('a') == '1'
+
+    cache = MemoryCache(max_entries=10, max_bytes=10)
+    cache.set('a', 'xxxx')
+    cache.set('b', 'yyyy')
+    assert cache.set('c', 'zzzz') == 1
+    assert cache.size_bytes == 10 and len(cache) == 2
+
+    # Replacing with a value too large to keep must not leave the old one
+    cache.set('c', 'z' * 20)
+    assert cache.get('c') is None
+    assert cache.size_bytes == 5 and len(cache) == 1
+
+
+def test_ttl_expires_both_tiers(tmp_path, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(prompt_cache.time, 'time', lambda: now[0])
+    memory = MemoryCache(ttl=60)
+    store = PromptCache(tmp_path / 'cache.db', ttl=60)
+    memory.set('q', 'a')
+    store.set('q', 'a')
+    store.flush()
+    now[0] += 61
+    assert memory.get('q') is None
+    assert store.get('q') is None
+    assert store.prune() == 1
+
+
+def test_promoted_answers_keep_their_age(tmp_path, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(prompt_cache.time, 'time', lambda: now[0])
+    cache = TieredCache(MemoryCache(ttl=60), PromptCache(tmp_path / 'cache.db', ttl=60))
+    cache.set('q', 'a')
+    cache.store.flush()
+    cache.memory.clear()
+    now[0] += 50
+    # Promoted from SQLite into memory with its original creation time
+    assert cache.get('q') == 'a'
+    now[0] += 11
+    assert cache.memory.get(prompt_cache._memory_key('q', '')) is None
+    assert cache.get('q') is None
+
+
+def test_sqlite_tier_keeps_recently_used_rows(tmp_path, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(prompt_cache.time, 'time', lambda: now[0])
+    store = PromptCache(tmp_path / 'cache.db', max_entries=2)
+    for prompt in ('a', 'b', 'c'):
+        now[0] += 1
+        store.set(prompt, prompt.upper())
+        store.flush()
+    now[0] += 1
+    store.get('a')
+    store.flush()
+    assert store.prune() == 1
+    assert store.get('b') is None
+    assert store.get('a') == 'A' and store.get('c') == 'C'
+
+
+def test_tiered_cache_reports_events(tmp_path):
+    events = []
+    cache = TieredCache(
+        MemoryCache(max_entries=1),
+        PromptCache(tmp_path / 'cache.db'),
+        on_event=lambda tier, event, count: events.append((tier, event, count)),
+    )
+    assert cache.get('q1') is None
+    cache.set('q1', 'a1')
+    cache.set('q2', 'a2')
+    cache.store.flush()
+    assert cache.get('q1') == 'a1'
+    assert events == [
+        ('memory', 'miss', 1),
+        ('sqlite', 'miss', 1),
+        ('memory', 'eviction', 1),
+        ('memory', 'miss', 1),
+        ('sqlite', 'hit', 1),
+        ('memory', 'eviction', 1),
+    ]
+
+
+def test_batched_writes_and_bulk_lookup(tmp_path):
+    store = PromptCache(tmp_path / 'cache.db')
+    store.set_many((f'q{i}', f'a{i}') for i in range(1000))
+    store.set('q1', 'new')
+    store.flush()
+    found = store.get_many([f'q{i}' for i in range(0, 1200, 2)])
+    assert len(found) == 500 and found['q0'] == 'a0'
+    assert store.get('q1') == 'new'
+
+    store.backup(str(tmp_path / 'copy.db'))
+    copy = PromptCache(tmp_path / 'copy.db')
+    assert copy.get('q999') == 'a999'
+    store.close()
+    copy.close()
+
+
+def test_tiered_get_many_keeps_order(tmp_path):
+    cache = TieredCache(MemoryCache(), PromptCache(tmp_path / 'cache.db'))
+    cache.set_many([('a', '1'), ('b', '2')])
+    cache.store.flush()
+    cache.memory.clear()
+    cache.memory.set('b', '2')
+    assert cache.get_many(['x', 'b', 'a']) == [None, '2', '1']
+
+
+def test_cache_key_ignores_case_punctuation_and_turkish_letters():
+    from text_normalize import cache_key, fault_codes
+
+    assert cache_key('Kod 135 ne demek?') == cache_key('  kod 135   NE DEMEK ')
+    assert cache_key('İletişim KAYBI') == cache_key('iletisim kaybı') == 'iletisim kaybi'
+    assert fault_codes('Kod 135 ve zone 3 E12') == ('135', '3', 'e12')
+
+
+def test_near_duplicates_need_the_same_fault_codes(tmp_path):
+    from prompt_cache import MinHashIndex
+
+    store = PromptCache(tmp_path / 'cache.db')
+    store.set('kod 135 yangin butonu ne demek', 'buton')
+    cache = TieredCache(MemoryCache(), store, near=MinHashIndex(threshold=0.6))
+    assert cache.get('kod 135 yangin butonu ne demektir') == 'buton'
+    assert cache.get('kod 136 yangin butonu ne demek') is None
+    cache.set('kod 227 alarm paneli', 'panel')
+    assert cache.get('kod 227 alarm paneli nedir') == 'panel'
+
+
+def test_near_index_skips_empty_keys_and_forgets_pruned_ones(tmp_path, monkeypatch):
+    from prompt_cache import MinHashIndex
+
+    now = [1000.0]
+    monkeypatch.setattr(prompt_cache.time, 'time', lambda: now[0])
+    near = MinHashIndex(threshold=0.6)
+    near.add('')
+    assert len(near) == 0 and near.find('') is None
+
+    store = PromptCache(tmp_path / 'cache.db', ttl=60)
+    cache = TieredCache(MemoryCache(ttl=60), store, near=near)
+    cache.set('', 'bos')
+    cache.set('kod 227 alarm paneli', 'panel')
+    assert cache.get('kod 227 alarm paneli nedir') == 'panel'
+    assert 'kod 227 alarm paneli' in near._signatures
+    now[0] += 61
+    assert store.prune() == 2
+    assert len(near) == 0 and not near._buckets
+
+
+def test_answers_are_only_served_for_their_version(tmp_path):
+    cache = TieredCache(MemoryCache(), PromptCache(tmp_path / 'cache.db'))
+    cache.set('kod 135', 'eski', 'model-a:docs-1')
+    cache.set('kod 135', 'yeni', 'model-b:docs-1')
+    assert cache.get('kod 135', 'model-a:docs-1') == 'eski'
+    assert cache.get('kod 135', 'model-a:docs-2') is None
+    cache.store.flush()
+    cache.memory.clear()
+    assert cache.get_many(['kod 135', 'kod 227'], 'model-b:docs-1') == ['yeni', None]
+
+
+def test_unversioned_database_is_migrated(tmp_path):
+    import sqlite3
+
+    path = tmp_path / 'cache.db'
+    with sqlite3.connect(path) as conn:
+        conn.execute('CREATE TABLE cache (prompt TEXT PRIMARY KEY, answer TEXT)')
+        conn.execute("INSERT INTO cache VALUES ('kod 135', 'buton')")
+    store = PromptCache(path)
+    assert store.get('kod 135', 'model-a:docs-1') is None
+    assert store.get('kod 135') == 'buton'
+    assert store.top_prompts(5) == ['kod 135']
+
+
+def test_top_prompts_return_the_question_as_asked(tmp_path):
+    import sqlite3
+
+    path = tmp_path / 'cache.db'
+    with sqlite3.connect(path) as conn:
+        # Versioned table from before questions were stored
+        conn.execute(
+            'CREATE TABLE cache (prompt TEXT NOT NULL, version TEXT NOT NULL, answer TEXT, '
+            'created REAL NOT NULL, accessed REAL NOT NULL, hits INTEGER NOT NULL DEFAULT 0, '
+            'PRIMARY KEY (prompt, version))'
+        )
+        conn.execute("INSERT INTO cache VALUES ('panel sifresi', 'v1', '1234', 1.0, 1.0, 0)")
+    cache = TieredCache(MemoryCache(), PromptCache(path))
+    cache.set('kod 135 ne demek', 'buton', 'v1', question='Kod 135 ne demek?')
+    # A later answer without the question keeps the stored text
+    cache.store.set_many([('kod 135 ne demek', 'buton')], 'v2')
+    cache.store.set('kod 135 ne demek', 'yangin butonu', 'v1')
+    cache.store.touch(['kod 135 ne demek'], 'v1')
+    assert cache.store.top_prompts(5) == ['Kod 135 ne demek?', 'panel sifresi']